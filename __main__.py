@@ -9,6 +9,8 @@ from typing import Dict, List
 import logging
 import hashlib
 
+import workflow
+
 
 logging.basicConfig(level=logging.INFO)
 
@@ -17,6 +19,8 @@ load_dotenv()
 # Constants
 RUNTIME = "python3.12"
 BUCKET_NAME = "sec-filings-2341180373"
+# Default CIK universe, uploaded to UNIVERSE_KEY; an execution can point
+# `universe_key` at any other list in the bucket (e.g. the Russell 3000)
 CIK_LIST = [
     "320193",  # Apple Inc
     "789019",  # Microsoft
@@ -24,6 +28,12 @@ CIK_LIST = [
     "1326801",  # Meta
     "1652044",  # Alphabet
 ]
+UNIVERSE_KEY = "universe/default.txt"
+# Companies per shard, and shards in flight at once in the Map state
+SHARD_SIZE = int(os.environ.get("SHARD_SIZE", "50"))
+SHARD_CONCURRENCY = int(os.environ.get("SHARD_CONCURRENCY", "4"))
+# SEC's 10 requests/second applies to all concurrent shards together
+EDGAR_TOTAL_RPS = 9
 
 COMMON_ENV_VARS = {
     "S3_BUCKET": os.environ["S3_BUCKET"],
@@ -34,6 +44,11 @@ COMMON_ENV_VARS = {
     "DB_NAME": os.environ["DB_NAME"],
     "DB_USER": os.environ["DB_USER"],
     "DB_PASSWORD": os.environ["DB_PASSWORD"],
+    # Route connections through Neon's PgBouncer endpoint
+    "DB_POOLER": os.environ.get("DB_POOLER", "false"),
+    "UNIVERSE_KEY": UNIVERSE_KEY,
+    "SHARD_SIZE": str(SHARD_SIZE),
+    "EDGAR_MAX_RPS": str(EDGAR_TOTAL_RPS / SHARD_CONCURRENCY),
 }
 
 # Create S3 bucket
@@ -44,6 +59,15 @@ sec_filings_bucket = aws.s3.Bucket(
     force_destroy=True,
 )
 
+# Default CIK universe read by shard-planner
+cik_universe_object = aws.s3.BucketObject(
+    "cik-universe-object",
+    bucket=sec_filings_bucket.id,
+    key=UNIVERSE_KEY,
+    content="\n".join(CIK_LIST) + "\n",
+    content_type="text/plain",
+)
+
 # Upload Lambda Layer to S3
 base_layer_object = aws.s3.BucketObject(
     "base-layer-object",
@@ -178,16 +202,30 @@ aws.iam.RolePolicyAttachment(
 
 
 
+# Shared modules bundled into every Lambda archive rather than deployed on their own
+SHARED_MODULES = ["common"]
+
 # Get Lambda function names from subdirectories
 LAMBDA_FUNCTIONS = [
-    name for name in os.listdir("./src") if os.path.isdir(os.path.join("./src", name))
+    name
+    for name in os.listdir("./src")
+    if os.path.isdir(os.path.join("./src", name)) and name not in SHARED_MODULES
 ]
 print(f"Lambdas found: {str(LAMBDA_FUNCTIONS)}")
 
 lambda_functions = {}
 for function_name in LAMBDA_FUNCTIONS:
     # Create the Lambda function
-    memory_size = 256 if function_name == "embeddings" else 128
+    # filings-ingest holds several documents in flight across its pipeline stages
+    memory_size = {
+        "embeddings": 256,
+        "filings-ingest": 512,
+        "company-bulk": 1024,
+        "backfill": 512,
+    }.get(function_name, 128)
+    # company-bulk streams the whole multi-GB submissions archive in one call;
+    # backfill pages through as many companies' history as fits, then resumes
+    timeout = {"company-bulk": 900, "backfill": 900}.get(function_name, 300)
     lambda_function = aws.lambda_.Function(
         f"{function_name}-lambda",
         name=function_name,
@@ -197,11 +235,15 @@ for function_name in LAMBDA_FUNCTIONS:
         code=pulumi.AssetArchive(
             {
                 ".": pulumi.FileArchive(f"./src/{function_name}"),
+                **{
+                    module: pulumi.FileArchive(f"./src/{module}")
+                    for module in SHARED_MODULES
+                },
             }
         ),
         layers=[base_layer.arn],
         environment={"variables": COMMON_ENV_VARS},
-        timeout=300,
+        timeout=timeout,
         memory_size=memory_size,
     )
 
@@ -211,8 +253,11 @@ for function_name in LAMBDA_FUNCTIONS:
             "sentiment-sqs-trigger",
             event_source_arn=sqs_queue.arn,
             function_name=lambda_function.arn,
-            batch_size=1,
-            maximum_batching_window_in_seconds=0,
+            # Up to 100 messages per invocation, gathered for at most 5 seconds;
+            # the handler reports failed records so only those are retried
+            batch_size=100,
+            maximum_batching_window_in_seconds=5,
+            function_response_types=["ReportBatchItemFailures"],
             scaling_config={
                 "maximum_concurrency": 5,
             },
@@ -225,134 +270,7 @@ for function_name in LAMBDA_FUNCTIONS:
 # Define the entire state machine
 state_machine_definition = pulumi.Output.all(
     **{k: v.arn for k, v in lambda_functions.items()}
-).apply(
-    lambda arns: json.dumps(
-        {
-            "Comment": "SEC Filings Workflow",
-            "StartAt": "CompanyIngest",
-            "States": {
-                "CompanyIngest": {
-                    "Type": "Task",
-                    "Resource": arns["company-ingest"],
-                    "Next": "CompanyProc",
-                    "Parameters": {
-                        "cik_list": CIK_LIST,
-                    },
-                    "Retry": [
-                        {
-                            "ErrorEquals": ["States.TaskFailed"],
-                            "IntervalSeconds": 30,
-                            "MaxAttempts": 2,
-                            "BackoffRate": 2.0,
-                        }
-                    ],
-                    "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "ErrorHandler"}],
-                },
-                "CompanyProc": {
-                    "Type": "Task",
-                    "Resource": arns["company-proc"],
-                    "Next": "FilingsIngest",
-                    "Parameters": {
-                        "cik_list": CIK_LIST,
-                    },
-                    "Retry": [
-                        {
-                            "ErrorEquals": ["States.TaskFailed"],
-                            "IntervalSeconds": 30,
-                            "MaxAttempts": 2,
-                            "BackoffRate": 2.0,
-                        }
-                    ],
-                    "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "ErrorHandler"}],
-                },
-                "FilingsIngest": {
-                    "Type": "Task",
-                    "Resource": arns["filings-ingest"],
-                    "Next": "ParallelProcessing",
-                    "Retry": [
-                        {
-                            "ErrorEquals": ["States.TaskFailed"],
-                            "IntervalSeconds": 30,
-                            "MaxAttempts": 2,
-                            "BackoffRate": 2.0,
-                        }
-                    ],
-                    "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "ErrorHandler"}],
-                },
-                "ParallelProcessing": {
-                    "Type": "Parallel",
-                    "Branches": [
-                        {
-                            "StartAt": "Embeddings",
-                            "States": {
-                                "Embeddings": {
-                                    "Type": "Task",
-                                    "Resource": arns["embeddings"],
-                                    "Parameters": {"file_names.$": "$.file_names"},
-                                    "End": True,
-                                    "Retry": [
-                                        {
-                                            "ErrorEquals": ["States.TaskFailed"],
-                                            "IntervalSeconds": 30,
-                                            "MaxAttempts": 2,
-                                            "BackoffRate": 2.0,
-                                        }
-                                    ],
-                                }
-                            },
-                        },
-                        {
-                            "StartAt": "FilingsQueue",
-                            "States": {
-                                "FilingsQueue": {
-                                    "Type": "Task",
-                                    "Resource": "arn:aws:states:::lambda:invoke.waitForTaskToken",
-                                    "Parameters": {
-                                        "FunctionName": arns["filings-queue"],
-                                        "Payload": {
-                                            "batch_id.$": "$.batch_id",
-                                            "task_token.$": "$$.Task.Token",
-                                        },
-                                    },
-                                    "End": True,
-                                    "Retry": [
-                                        {
-                                            "ErrorEquals": ["States.TaskFailed"],
-                                            "IntervalSeconds": 30,
-                                            "MaxAttempts": 2,
-                                            "BackoffRate": 2.0,
-                                        }
-                                    ],
-                                }
-                            },
-                        },
-                    ],
-                    "Next": "FinalReport",
-                    "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "ErrorHandler"}],
-                },
-                "FinalReport": {
-                    "Type": "Task",
-                    "Resource": arns["final-report"],
-                    "End": True,
-                    "Retry": [
-                        {
-                            "ErrorEquals": ["States.TaskFailed"],
-                            "IntervalSeconds": 30,
-                            "MaxAttempts": 2,
-                            "BackoffRate": 2.0,
-                        }
-                    ],
-                    "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "ErrorHandler"}],
-                },
-                "ErrorHandler": {
-                    "Type": "Task",
-                    "Resource": arns["error-handler"],
-                    "End": True,
-                },
-            },
-        }
-    )
-)
+).apply(lambda arns: json.dumps(workflow.definition(arns, SHARD_CONCURRENCY)))
 
 state_machine = aws.sfn.StateMachine(
     "sec-filings-workflow",
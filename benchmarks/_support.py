@@ -0,0 +1,75 @@
+"""Helpers shared by the benchmark scripts.
+
+Handlers live in hyphenated directories, so they are loaded by path. Database
+benchmarks run against a scratch `bench` schema built from POSTGRES.md on the
+Postgres pointed to by BENCH_DATABASE_URL (or the usual DB_* variables).
+"""
+
+import importlib.util
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import psycopg2
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+
+def load_handler(function_name):
+    path = SRC / function_name / "handler.py"
+    module_name = f"{function_name.replace('-', '_')}_handler"
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def connect():
+    if "BENCH_DATABASE_URL" in os.environ:
+        return psycopg2.connect(os.environ["BENCH_DATABASE_URL"])
+    return psycopg2.connect(
+        host=os.environ["DB_HOST"],
+        database=os.environ["DB_NAME"],
+        user=os.environ["DB_USER"],
+        password=os.environ["DB_PASSWORD"],
+    )
+
+
+def schema_sql():
+    return re.findall(r"```\n(.*?)```", (ROOT / "POSTGRES.md").read_text(), re.S)
+
+
+def reset_schema(conn, schema="bench"):
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"SET search_path TO {schema}, public")
+        for block in schema_sql():
+            cur.execute(block)
+    conn.commit()
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+
+
+def report(rows, columns):
+    widths = [
+        max(len(str(c)), *(len(str(r[i])) for r in rows)) for i, c in enumerate(columns)
+    ]
+    print("  ".join(str(c).rjust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(row, widths)))
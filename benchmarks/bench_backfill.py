@@ -0,0 +1,121 @@
+"""Filings/sec of the history backfill, and resuming one that ran out of time.
+
+DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... \\
+    python benchmarks/bench_backfill.py --companies 20 --pages 4 --page-filings 2000
+
+Each of --companies companies has a submissions document listing --pages
+older pages of --page-filings rows (two years each, one row in five a
+10-K/10-Q/8-K), served by fake_edgar under the EDGAR rate limit. Runs the
+backfill handler's run_backfill:
+
+- stopped after half the companies, as when an invocation runs out of time,
+  then resumed under the same backfill id;
+- again under that id, with nothing left to load;
+- with a date range covering only the newest page, so older pages are
+  skipped without being fetched.
+"""
+
+import argparse
+import os
+
+os.environ["PGOPTIONS"] = "-c search_path=bench,public"
+os.environ.setdefault("S3_BUCKET", "bench-filings")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=4, help="older pages each")
+    parser.add_argument("--page-filings", type=int, default=2000)
+    parser.add_argument("--filings", type=int, default=20, help="recent 10-K/Q/8-Ks")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--edgar-rps", type=float, default=9)
+    args = parser.parse_args()
+
+    # Read by the handler and common.edgar at import time
+    os.environ["EDGAR_MAX_RPS"] = str(args.edgar_rps)
+    os.environ["BACKFILL_WORKERS"] = str(args.workers)
+
+    import fake_edgar
+    from _support import connect, load_handler, report, reset_schema
+    from common import backfill, edgar
+    from fixtures import history_years
+
+    handler = load_handler("backfill")
+    server, documents = fake_edgar.serve(
+        filings=args.filings,
+        history_pages=args.pages,
+        page_filings=args.page_filings,
+    )
+    fake_edgar.route(edgar.get_session(), server)
+    ciks = [str(100001 + n) for n in range(args.companies)]
+
+    conn = connect()
+    reset_schema(conn)
+    conn.close()
+
+    everything = backfill.options({"start_date": "1990-01-01"})
+    newest_page = backfill.options(
+        {"start_date": f"{min(history_years(1))}-01-01", "end_date": "2024-12-31"}
+    )
+
+    def stop_after(companies):
+        # Asked once before each company is started
+        asked = iter(range(companies + 1))
+        return lambda: next(asked, companies) >= companies
+
+    rows = []
+
+    def run(label, backfill_id, options, out_of_time=lambda: False):
+        requests_before = documents.stats["requests"]
+        complete, failed, stats = handler.run_backfill(
+            ciks, backfill_id, options, out_of_time
+        )
+        rows.append(
+            (
+                label,
+                "yes" if complete else "no",
+                stats["companies_started"],
+                documents.stats["requests"] - requests_before,
+                stats["pages_done_before"],
+                stats["pages_out_of_range"],
+                f"{stats['filings']:,}",
+                f"{stats['bytes'] / 1e6:,.1f}",
+                f"{stats['elapsed_s']:.2f}",
+                f"{stats['filings_per_s']:,.0f}",
+            )
+        )
+        return failed
+
+    failed = run("first half", "bench", everything, stop_after(args.companies // 2))
+    failed += run("resumed", "bench", everything)
+    failed += run("again", "bench", everything)
+    failed += run("newest page only", "bench-range", newest_page)
+    server.shutdown()
+
+    conn = connect()
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM company_filings")
+        stored = cur.fetchone()[0]
+    conn.close()
+
+    report(
+        rows,
+        [
+            "run",
+            "complete",
+            "companies",
+            "EDGAR requests",
+            "pages done before",
+            "pages out of range",
+            "filings",
+            "MB",
+            "seconds",
+            "filings/s",
+        ],
+    )
+    print(f"\n{stored:,} filings in company_filings, {len(failed)} companies failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Chunk shape and throughput: fixed character slices versus the token chunker.
+
+    python benchmarks/bench_chunking.py [filing.txt ...]
+
+Without arguments a synthetic 10-K is generated and run through filings-ingest's
+text extractor, so the input looks like what the embeddings stage reads from
+S3. Token counts use the embedding model's tokenizer for both methods.
+"""
+
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+from _support import Timer, load_handler, report
+from fixtures import make_10k_html
+
+embeddings = load_handler("embeddings")
+
+
+def char_slices(text, chunk_size=7200):
+    # The original chunker: a cut every 7,200 characters
+    return [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+def shape(token_counts, size_mb):
+    token_counts = sorted(token_counts)
+    return {
+        "chunks_per_mb": len(token_counts) / size_mb,
+        "mean": statistics.mean(token_counts),
+        "p5": token_counts[int(0.05 * len(token_counts))],
+        "p95": token_counts[int(0.95 * len(token_counts))],
+        "max": token_counts[-1],
+        "stdev": statistics.pstdev(token_counts),
+    }
+
+
+def main(paths):
+    if not paths:
+        fixture = Path(tempfile.gettempdir()) / "bench_10k.txt"
+        if not fixture.exists():
+            filings_ingest = load_handler("filings-ingest")
+            html = make_10k_html(30)
+            fixture.write_text(
+                filings_ingest.extract_text(filings_ingest.iter_chunks(html))
+            )
+        paths = [str(fixture)]
+
+    encoder = embeddings.get_encoder()
+    rows = []
+    for path in paths:
+        text = Path(path).read_text()
+        size_mb = len(text.encode("utf-8")) / 1e6
+        pieces = [text[i : i + 65536] for i in range(0, len(text), 65536)]
+
+        with Timer() as timer:
+            slices = char_slices(text)
+        counts = [len(encoder.encode_ordinary(chunk)) for chunk in slices]
+        results = [("slice 7200 chars", timer.elapsed, shape(counts, size_mb))]
+
+        with Timer() as timer:
+            chunks = list(embeddings.chunk_text(pieces))
+        label = f"tokens {embeddings.CHUNK_TOKENS}/{embeddings.CHUNK_OVERLAP}"
+        counts = [tokens for _, tokens in chunks]
+        results.append((label, timer.elapsed, shape(counts, size_mb)))
+
+        for label, elapsed, stats in results:
+            rows.append(
+                (
+                    Path(path).name,
+                    label,
+                    f"{size_mb:.1f}",
+                    f"{stats['chunks_per_mb']:.0f}",
+                    f"{stats['mean']:.0f}",
+                    stats["p5"],
+                    stats["p95"],
+                    stats["max"],
+                    f"{stats['stdev']:.0f}",
+                    f"{size_mb / elapsed:.1f}" if elapsed else "-",
+                )
+            )
+    report(
+        rows,
+        [
+            "file",
+            "method",
+            "MB",
+            "chunks/MB",
+            "tokens/chunk",
+            "p5",
+            "p95",
+            "max",
+            "stdev",
+            "MB/s",
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
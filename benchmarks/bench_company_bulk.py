@@ -0,0 +1,176 @@
+"""Companies/sec: per-CIK company-ingest + company-proc versus company-bulk.
+
+DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... \\
+    python benchmarks/bench_company_bulk.py --companies 100 --others 20000
+python benchmarks/bench_company_bulk.py --archive submissions.zip --companies 500
+
+The per-CIK path fetches one submissions document per company from the fake
+EDGAR under the SEC rate limit (--edgar-rps), stores it in S3 and parses it
+back out. The bulk path downloads one submissions.zip holding the universe
+amid --others companies outside it and streams it straight into Postgres.
+With --archive, a local archive (EDGAR's real one, or any fixture) is
+streamed from disk instead, and the universe is the first --companies CIKs
+found in it. Peak memory is tracemalloc's, so it covers Python allocations.
+"""
+
+import argparse
+import os
+import re
+import time
+import tracemalloc
+import zipfile
+
+os.environ["PGOPTIONS"] = "-c search_path=bench,public"
+os.environ.setdefault("S3_BUCKET", "bench-filings")
+
+
+def measure(run):
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = run()
+    finally:
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def archive_ciks(path, count):
+    """The first `count` company CIKs in a submissions.zip."""
+    pattern = re.compile(r"CIK(\d{10})\.json")
+    ciks = []
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            match = pattern.fullmatch(name)
+            if match:
+                ciks.append(str(int(match.group(1))))
+                if len(ciks) == count:
+                    break
+    return ciks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--companies", type=int, default=100)
+    parser.add_argument(
+        "--others", type=int, default=20000, help="archive companies outside them"
+    )
+    parser.add_argument("--filings", type=int, default=20, help="10-K/10-Q/8-Ks each")
+    parser.add_argument("--edgar-rps", type=float, default=9)
+    parser.add_argument("--archive", help="stream this local submissions.zip")
+    args = parser.parse_args()
+
+    # Read by common.edgar at import time
+    os.environ["EDGAR_MAX_RPS"] = str(args.edgar_rps)
+
+    import fake_aws
+    import fake_edgar
+    from _support import connect, load_handler, report, reset_schema
+    from common import edgar
+
+    company_ingest = load_handler("company-ingest")
+    company_proc = load_handler("company-proc")
+    company_bulk = load_handler("company-bulk")
+    s3, _, _ = fake_aws.install()
+
+    def reset():
+        conn = connect()
+        reset_schema(conn)
+        conn.close()
+
+    rows = []
+    if args.archive:
+        ciks = archive_ciks(args.archive, args.companies)
+        reset()
+
+        def stream_file():
+            with open(args.archive, "rb") as raw:
+                return company_bulk.ingest_archive(raw, set(ciks))
+
+        (saved, failed, stats), elapsed, peak = measure(stream_file)
+        size_mb = os.path.getsize(args.archive) / 1e6
+        rows.append(
+            (
+                "bulk (local file)",
+                saved,
+                f"{stats['members']:,}",
+                f"{size_mb:,.0f}",
+                f"{elapsed:.2f}",
+                f"{saved / elapsed:,.1f}",
+                f"{peak:.1f}",
+            )
+        )
+        report(
+            rows,
+            ["path", "companies", "members", "MB", "seconds", "companies/s", "peak MB"],
+        )
+        return
+
+    ciks = [str(100001 + n) for n in range(args.companies)]
+    server, documents = fake_edgar.serve(
+        filings=args.filings, bulk_ciks=ciks, bulk_others=args.others
+    )
+    fake_edgar.route(edgar.get_session(), server)
+    archive_mb = len(documents.get(fake_edgar.BULK_SUBMISSIONS_PATH)) / 1e6
+
+    reset()
+
+    def per_cik():
+        ingested = company_ingest.lambda_handler({"cik_list": ciks}, None)
+        return company_proc.lambda_handler({"cik_list": ingested["cik_list"]}, None)
+
+    requests_before = documents.stats["requests"]
+    result, elapsed, peak = measure(per_cik)
+    rows.append(
+        (
+            f"per-CIK ({args.edgar_rps:g} req/s)",
+            result["companies"],
+            documents.stats["requests"] - requests_before,
+            f"{documents.stats['bytes'] / 1e6:,.1f}",
+            f"{elapsed:.2f}",
+            f"{result['companies'] / elapsed:,.1f}",
+            f"{peak:.1f}",
+        )
+    )
+
+    reset()
+    bytes_before = documents.stats["bytes"]
+    requests_before = documents.stats["requests"]
+    result, elapsed, peak = measure(
+        lambda: company_bulk.lambda_handler({"cik_list": ciks}, None)
+    )
+    saved = result["stats"]["saved"]
+    rows.append(
+        (
+            "bulk",
+            saved,
+            documents.stats["requests"] - requests_before,
+            f"{(documents.stats['bytes'] - bytes_before) / 1e6:,.1f}",
+            f"{elapsed:.2f}",
+            f"{saved / elapsed:,.1f}",
+            f"{peak:.1f}",
+        )
+    )
+    server.shutdown()
+
+    report(
+        rows,
+        [
+            "path",
+            "companies",
+            "EDGAR requests",
+            "MB",
+            "seconds",
+            "companies/s",
+            "peak MB",
+        ],
+    )
+    print(
+        f"\nArchive: {archive_mb:.1f} MB, {args.companies:,} companies in the "
+        f"universe and {args.others:,} outside it"
+    )
+
+
+if __name__ == "__main__":
+    main()
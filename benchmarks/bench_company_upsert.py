@@ -0,0 +1,113 @@
+"""Rows/sec for company-proc's bulk upsert versus the old row-by-row path.
+
+BENCH_DATABASE_URL=postgresql://... python benchmarks/bench_company_upsert.py
+"""
+
+import random
+import string
+from datetime import date, timedelta
+
+from _support import Timer, connect, report, reset_schema
+
+from common import companies as company_store
+
+FILINGS_PER_COMPANY = 20
+
+
+def make_companies(filing_count):
+    companies = []
+    company_count = max(1, filing_count // FILINGS_PER_COMPANY)
+    for c in range(company_count):
+        cik = str(1000000 + c)
+        facts = {
+            "cik": cik,
+            "sic": "3571",
+            "sic_description": "Electronic Computers",
+            "owner_org": "06 Technology",
+            "name": f"Company {c}",
+            "tickers": ["".join(random.choices(string.ascii_uppercase, k=4))],
+            "exchanges": ["Nasdaq"],
+            "ein": "942404110",
+            "description": "",
+            "website": "",
+            "category": "Large accelerated filer",
+            "state_of_incorporation": "CA",
+        }
+        filings = []
+        per_company = min(FILINGS_PER_COMPANY, filing_count - c * FILINGS_PER_COMPANY)
+        for f in range(per_company):
+            filings.append(
+                {
+                    "form": random.choice(["10-K", "10-Q", "8-K"]),
+                    "filing_date": (date(2024, 1, 1) - timedelta(days=f)).isoformat(),
+                    "accession_number": f"0000{cik}-24-{f:06d}",
+                    "primary_doc": f"doc{f}.htm",
+                }
+            )
+        companies.append((cik, facts, filings))
+    return companies
+
+
+def row_by_row(cur, companies):
+    # The pre-bulk path: one INSERT ... ON CONFLICT round trip per row
+    for cik, facts, filings in companies:
+        cur.execute(
+            """
+            INSERT INTO company_facts (cik, entity_name, tickers, last_updated)
+            VALUES (%s, %s, %s, now())
+            ON CONFLICT (cik) DO UPDATE
+            SET entity_name = EXCLUDED.entity_name, tickers = EXCLUDED.tickers,
+                last_updated = EXCLUDED.last_updated
+            """,
+            (facts["cik"], facts["name"], facts["tickers"]),
+        )
+        for filing in filings:
+            cur.execute(
+                """
+                INSERT INTO company_filings (
+                    cik, form, filing_date, accession_number, primary_doc, archive_url
+                )
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (cik, accession_number) DO UPDATE
+                SET archive_url = EXCLUDED.archive_url
+                """,
+                (
+                    cik,
+                    filing["form"],
+                    filing["filing_date"],
+                    filing["accession_number"],
+                    filing["primary_doc"],
+                    company_store.get_archive_url(cik, filing),
+                ),
+            )
+
+
+def main():
+    conn = connect()
+    rows = []
+    for filing_count in (10, 1_000, 10_000):
+        companies = make_companies(filing_count)
+        total_rows = len(companies) + filing_count
+        for name, writer in (
+            ("row-by-row", row_by_row),
+            ("bulk", company_store.save_companies),
+        ):
+            reset_schema(conn)
+            with conn.cursor() as cur, Timer() as t:
+                writer(cur, companies)
+                conn.commit()
+            rows.append(
+                (
+                    name,
+                    filing_count,
+                    total_rows,
+                    f"{t.elapsed:.3f}",
+                    f"{total_rows / t.elapsed:,.0f}",
+                )
+            )
+    conn.close()
+    report(rows, ["path", "filings", "rows", "seconds", "rows/s"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Embedding throughput under simulated rate limits: fixed versus adaptive concurrency.
+
+    python benchmarks/bench_embedding_engine.py
+
+Runs the embeddings handler's EmbeddingBatcher against benchmarks/fake_openai.py.
+"fixed 5" pins concurrency at the old thread pool's five workers with no token
+budget; "adaptive" is the default AIMD engine given the scenario's TPM.
+"""
+
+import math
+
+import openai
+from _support import Timer, load_handler, report
+
+import fake_openai
+
+embeddings = load_handler("embeddings")
+
+CHUNKS = 1000
+CHUNK_TOKENS = 1000
+REQUEST_TOKENS = 10_000
+
+SCENARIOS = {
+    "quiet": {},
+    "6 concurrent": {"max_concurrency": 6},
+    "tpm 600k": {"tpm": 600_000},
+}
+
+
+def make_inputs():
+    text = "x" * (CHUNK_TOKENS * 4 - 4)
+    return [(n, text, CHUNK_TOKENS) for n in range(CHUNKS)]
+
+
+def main():
+    rows = []
+    inputs = make_inputs()
+    for scenario, limits in SCENARIOS.items():
+        tpm = limits.get("tpm", 0)
+        engines = {
+            "fixed 5": dict(
+                concurrency=5,
+                min_concurrency=5,
+                max_concurrency=5,
+                tokens_per_minute=10**12,
+                latency_target=math.inf,
+            ),
+            "adaptive": dict(tokens_per_minute=tpm or embeddings.TOKENS_PER_MINUTE),
+        }
+        for name, options in engines.items():
+            server, served = fake_openai.serve(
+                latency=0.2, per_1k_tokens=0.05, **limits
+            )
+            client = openai.AsyncOpenAI(
+                api_key="fake",
+                base_url=f"http://127.0.0.1:{server.server_port}/v1",
+                max_retries=0,
+            )
+            batcher = embeddings.EmbeddingBatcher(
+                client, max_tokens=REQUEST_TOKENS, **options
+            )
+            with Timer() as t:
+                result = batcher.embed(inputs)
+            server.shutdown()
+            stats = batcher.report()
+            rows.append(
+                (
+                    scenario,
+                    name,
+                    f"{len(result)}/{CHUNKS}",
+                    f"{t.elapsed:.1f}",
+                    f"{len(result) * CHUNK_TOKENS / t.elapsed / 1000:,.0f}",
+                    served.stats["rate_limited"],
+                    stats["concurrency"]["peak"],
+                    stats["concurrency"]["final"],
+                )
+            )
+    report(
+        rows,
+        [
+            "scenario",
+            "engine",
+            "embedded",
+            "seconds",
+            "k tokens/s",
+            "429s",
+            "peak in flight",
+            "final limit",
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
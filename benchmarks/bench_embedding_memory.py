@@ -0,0 +1,94 @@
+"""Peak memory and serialization time: float lists and JSON versus float32 buffers.
+
+    python benchmarks/bench_embedding_memory.py
+
+Starts from the base64 payloads the embeddings API returns and follows each
+representation to the bytes sent to Postgres: Python float lists serialized
+with json.dumps (the old path), and one float32 array per file streamed
+through the binary COPY encoder. Peak memory is traced allocation above the
+payloads themselves, measured in a second run since tracing slows allocation.
+"""
+
+import base64
+import json
+import random
+import time
+import tracemalloc
+from array import array
+
+from _support import report
+
+from common import vectors
+
+DIM = 1536
+CHUNKS_PER_FILE = 40
+
+
+def make_payloads(file_count, seed=0):
+    rng = random.Random(seed)
+    pool = [
+        base64.b64encode(array("f", (rng.uniform(-0.1, 0.1) for _ in range(DIM))))
+        for _ in range(64)
+    ]
+    return [
+        [pool[rng.randrange(len(pool))] for _ in range(CHUNKS_PER_FILE)]
+        for _ in range(file_count)
+    ]
+
+
+def as_lists(payloads):
+    # What the SDK hands back by default, held for every file at once
+    files = [
+        [array("f", base64.b64decode(p)).tolist() for p in payload]
+        for payload in payloads
+    ]
+    started = time.perf_counter()
+    serialized = [
+        (f, i, json.dumps(embedding))
+        for f, embeddings in enumerate(files)
+        for i, embedding in enumerate(embeddings)
+    ]
+    return time.perf_counter() - started, sum(len(s) for _, _, s in serialized)
+
+
+def as_buffers(payloads):
+    files = [
+        array("f", b"".join(base64.b64decode(p) for p in payload))
+        for payload in payloads
+    ]
+    started = time.perf_counter()
+    stream = vectors.CopyStream(
+        (f, i, row)
+        for f, embeddings in enumerate(files)
+        for i, row in enumerate(vectors.rows(embeddings, DIM))
+    )
+    size = 0
+    while block := stream.read(1 << 20):
+        size += len(block)
+    return time.perf_counter() - started, size
+
+
+def main():
+    rows = []
+    for file_count in (10, 50, 100):
+        payloads = make_payloads(file_count)
+        for name, method in (("lists + json", as_lists), ("float32", as_buffers)):
+            seconds, size = method(payloads)
+            tracemalloc.start()
+            method(payloads)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rows.append(
+                (
+                    name,
+                    file_count * CHUNKS_PER_FILE,
+                    f"{peak / 1e6:.1f}",
+                    f"{seconds:.3f}",
+                    f"{size / 1e6:.1f}",
+                )
+            )
+    report(rows, ["representation", "vectors", "peak MB", "serialize s", "wire MB"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Run-report time at thousands of companies: rows into Python versus set-based SQL.
+
+DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... python benchmarks/bench_final_report.py [companies]
+
+Builds a run in the scratch `bench` schema (four filings and two embedding
+chunks per company) and times final-report's handler against loading every
+filing row and counting in Python. Uploads go to an in-memory stand-in for S3.
+"""
+
+import gzip
+import io
+import json
+import os
+import sys
+from collections import Counter
+
+os.environ["PGOPTIONS"] = "-c search_path=bench,public"
+os.environ.setdefault("S3_BUCKET", "bench")
+
+from _support import Timer, connect, load_handler, report, reset_schema  # noqa: E402
+
+final_report = load_handler("final-report")
+from common import shards  # noqa: E402
+
+BATCH_ID = "bench-run"
+FORMS = ("10-K", "10-Q", "10-Q", "8-K")
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+def populate(conn, companies):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO company_facts (cik, entity_name)
+            SELECT n::text, 'Company ' || n FROM generate_series(1, %s) AS n
+            """,
+            (companies,),
+        )
+        cur.execute(
+            """
+            INSERT INTO company_filings
+                (cik, form, filing_date, accession_number, sentiment, embedding_status)
+            SELECT c::text,
+                   (%s::text[])[k],
+                   DATE '2024-01-01' + (c + k) %% 365,
+                   c || '-' || k,
+                   (ARRAY['POSITIVE', 'NEGATIVE', 'NEUTRAL', 'MIXED', NULL])[1 + (c * k) %% 5],
+                   CASE WHEN (c + k) %% 20 <> 0 THEN 'done' ELSE 'pending' END
+            FROM generate_series(1, %s) AS c, generate_series(1, 4) AS k
+            """,
+            (list(FORMS), companies),
+        )
+        cur.execute(
+            """
+            INSERT INTO filing_embeddings (filing_id, chunk_index, embedding)
+            SELECT f.id, i, array_fill(0.01, ARRAY[1536])::vector
+            FROM company_filings f, generate_series(0, 1) AS i
+            WHERE f.embedding_status = 'done'
+            """
+        )
+        cur.execute(
+            "INSERT INTO filing_batches (batch_id, expected) VALUES (%s, %s)",
+            (BATCH_ID, companies * 4),
+        )
+        cur.execute(
+            """
+            INSERT INTO filing_batch_items (batch_id, cik, accession_number, status)
+            SELECT %s, cik, accession_number,
+                   CASE WHEN sentiment IS NULL THEN 'failed' ELSE 'done' END
+            FROM company_filings
+            """,
+            (BATCH_ID,),
+        )
+        cur.execute("ANALYZE")
+    conn.commit()
+
+
+def rows_into_python(conn):
+    # Every filing of the run and its chunk count, summarized client-side
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT f.cik, c.entity_name, f.form, f.embedding_status, f.sentiment,
+                   i.status, (SELECT count(*) FROM filing_embeddings e
+                              WHERE e.filing_id = f.id)
+            FROM filing_batch_items i
+            JOIN company_filings f
+              ON f.cik = i.cik AND f.accession_number = i.accession_number
+            LEFT JOIN company_facts c ON c.cik = f.cik
+            WHERE i.batch_id = %s
+            """,
+            (BATCH_ID,),
+        )
+        rows = cur.fetchall()
+    by_company_form = Counter()
+    sentiments = Counter()
+    chunks = 0
+    for cik, name, form, embedding_status, sentiment, status, chunk_count in rows:
+        by_company_form[(cik, form)] += 1
+        sentiments[sentiment] += 1
+        chunks += chunk_count
+    body = gzip.compress(
+        json.dumps(
+            {
+                "company_forms": [[*k, v] for k, v in by_company_form.items()],
+                "sentiments": {str(k): v for k, v in sentiments.items()},
+                "chunks": chunks,
+            }
+        ).encode()
+    )
+    return len(rows), len(body)
+
+
+def main(companies):
+    conn = connect()
+    reset_schema(conn)
+    with Timer() as t:
+        populate(conn, companies)
+    print(f"Populated {companies:,} companies in {t.elapsed:.1f}s")
+
+    s3 = FakeS3()
+    final_report.boto3.client = lambda service: s3
+    # What shard-report leaves for the run's one shard
+    shards.write_stats(
+        s3, "bench", "bench", 0, {"shard": 0, "batch_id": BATCH_ID, "failed_files": []}
+    )
+    rows = []
+    with Timer() as t:
+        loaded, size = rows_into_python(conn)
+    rows.append(("rows into python", f"{loaded:,}", f"{t.elapsed:.2f}", size))
+
+    with Timer() as t:
+        result = final_report.lambda_handler(
+            {"run_id": "bench", "shards": [{"shard": 0, "batch_id": BATCH_ID}]}, None
+        )
+    rows.append(
+        (
+            "final-report",
+            "-",
+            f"{t.elapsed:.2f}",
+            sum(len(body) for body in s3.objects.values()),
+        )
+    )
+    conn.close()
+    report(rows, ["method", "rows to client", "seconds", "bytes written"])
+    print(json.dumps(result["totals"]))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
@@ -0,0 +1,87 @@
+"""Throughput and peak RSS: regex cleanup versus filings-ingest's TextExtractor.
+
+    python benchmarks/bench_html_extract.py [real-filing.htm ...]
+
+Without arguments a synthetic inline XBRL 10-K is generated. Each measurement
+runs in a fresh subprocess so peak RSS belongs to that extractor alone.
+"""
+
+import html
+import json
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from _support import load_handler, report
+from fixtures import make_10k_html
+
+
+def regex_clean(content):
+    # The original cleanup: three full-size string passes over the document
+    clean_content = html.unescape(content.decode("utf-8"))
+    text_content = re.sub("<[^<]+?>", "", clean_content)
+    return re.sub(r"\s+", " ", text_content).strip()
+
+
+def run_one(method, path):
+    content = Path(path).read_bytes()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if method == "regex":
+        text = regex_clean(content)
+    else:
+        filings_ingest = load_handler("filings-ingest")
+        text = filings_ingest.extract_text(filings_ingest.iter_chunks(content))
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(
+        json.dumps(
+            {
+                "seconds": elapsed,
+                "rss_growth_mb": (peak - baseline) / 1024,
+                "text_mb": len(text) / 1e6,
+            }
+        )
+    )
+
+
+def main(paths):
+    if not paths:
+        fixture = Path(tempfile.gettempdir()) / "bench_10k.htm"
+        if not fixture.exists():
+            fixture.write_bytes(make_10k_html(30))
+        paths = [str(fixture)]
+
+    rows = []
+    for path in paths:
+        size_mb = Path(path).stat().st_size / 1e6
+        for method in ("regex", "extractor"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", method, path],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output)
+            rows.append(
+                (
+                    Path(path).name,
+                    method,
+                    f"{size_mb:.1f}",
+                    f"{size_mb / result['seconds']:.1f}",
+                    f"{result['rss_growth_mb']:.0f}",
+                    f"{result['text_mb']:.1f}",
+                )
+            )
+    report(rows, ["file", "method", "MB", "MB/s", "RSS growth MB", "text MB"])
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--run"]:
+        run_one(sys.argv[2], sys.argv[3])
+    else:
+        main(sys.argv[1:])
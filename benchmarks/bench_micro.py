@@ -0,0 +1,316 @@
+"""Micro-benchmarks of the per-document hot functions, checked against a baseline.
+
+    python benchmarks/bench_micro.py --save /tmp/before.json
+    # ...change something...
+    python benchmarks/bench_micro.py --baseline /tmp/before.json
+
+Fixtures are generated once into the temp directory and reused: a 40,000-row
+submissions JSON, a 30 MB inline XBRL 10-K (and the text filings-ingest
+extracts from it) and 4,000 embeddings of 1,536 float32 values. Each case is
+timed over repeated runs, reporting the best as ops/s, then run once more
+under tracemalloc for the peak it allocates and what it leaves allocated.
+
+With --baseline, a case whose ops/s dropped or whose peak memory grew by more
+than --tolerance is flagged, and the exit status is 1. Timings only compare
+on the same machine and Python, so save the baseline there too.
+"""
+
+import argparse
+import base64
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+
+from _support import load_handler, report
+from fixtures import make_10k_html, make_submissions
+
+from common import submissions, vectors
+
+FIXTURES = Path(tempfile.gettempdir())
+SUBMISSION_ROWS = 40_000
+DOCUMENT_MB = 30
+EMBEDDING_COUNT = 4_000
+EMBEDDING_DIMENSIONS = 1536
+
+CASES = {}
+
+
+def case(name):
+    """Register a setup function returning `(run, input_bytes)` as `name`.
+
+    `input_bytes` is the size MB/s is computed from, or None when the input is
+    already parsed.
+    """
+
+    def register(setup):
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+def cached(name, build):
+    path = FIXTURES / name
+    if not path.exists():
+        path.write_bytes(build())
+    return path.read_bytes()
+
+
+def submissions_text():
+    return cached(
+        "bench_submissions.json",
+        lambda: make_submissions(SUBMISSION_ROWS).encode(),
+    ).decode()
+
+
+def document():
+    return cached("bench_10k.htm", lambda: make_10k_html(DOCUMENT_MB))
+
+
+def document_text():
+    def extract():
+        filings_ingest = load_handler("filings-ingest")
+        text = filings_ingest.extract_text(filings_ingest.iter_chunks(document()))
+        return text.encode("utf-8")
+
+    return cached("bench_10k.txt", extract).decode("utf-8")
+
+
+def embeddings():
+    """EMBEDDING_COUNT float32 vectors as one buffer of native-order bytes."""
+
+    def generate():
+        rng = random.Random(0)
+        values = array("f", (rng.gauss(0, 0.03) for _ in range(EMBEDDING_DIMENSIONS)))
+        # Rotating one random vector keeps generation quick; the values' bit
+        # patterns are what serialization cost depends on
+        return b"".join(
+            (values[i:] + values[:i]).tobytes() for i in range(EMBEDDING_COUNT)
+        )
+
+    return cached("bench_embeddings.f32", generate)
+
+
+@case("submissions.parse_submissions")
+def parse_submissions():
+    text = submissions_text()
+    return lambda: submissions.parse_submissions(text), len(text)
+
+
+@case("submissions.get_recent_filings")
+def get_recent_filings():
+    company_data = json.loads(submissions_text())
+    return lambda: submissions.get_recent_filings(company_data), None
+
+
+@case("submissions.get_company_facts")
+def get_company_facts():
+    company_data = json.loads(submissions_text())
+    return lambda: submissions.get_company_facts(company_data), None
+
+
+@case("filings-ingest.extract_text")
+def extract_text():
+    filings_ingest = load_handler("filings-ingest")
+    content = document()
+    return (
+        lambda: filings_ingest.extract_text(filings_ingest.iter_chunks(content)),
+        len(content),
+    )
+
+
+@case("embeddings.chunk_text")
+def chunk_text():
+    embeddings_handler = load_handler("embeddings")
+    text = document_text()
+    pieces = [text[i : i + 65536] for i in range(0, len(text), 65536)]
+    return lambda: list(embeddings_handler.chunk_text(pieces)), len(text)
+
+
+@case("embeddings.decode_vectors")
+def decode_vectors():
+    # The API's base64 payloads to the float32 bytes the handler keeps
+    buffer = embeddings()
+    width = 4 * EMBEDDING_DIMENSIONS
+    payloads = [
+        base64.b64encode(buffer[i : i + width]).decode()
+        for i in range(0, len(buffer), width)
+    ]
+    return lambda: [base64.b64decode(payload) for payload in payloads], len(buffer)
+
+
+@case("vectors.CopyStream")
+def copy_stream():
+    buffer = embeddings()
+    rows = vectors.rows(buffer, EMBEDDING_DIMENSIONS)
+
+    def run():
+        stream = vectors.CopyStream((1, i, row) for i, row in enumerate(rows))
+        while stream.read(1 << 20):
+            pass
+
+    return run, len(buffer)
+
+
+@case("vectors.json_text")
+def json_text():
+    # Reference point: the same vectors as the JSON float lists the API and
+    # pgvector's text format would use
+    buffer = embeddings()
+    values = array("f", buffer)
+    lists = [
+        values[i : i + EMBEDDING_DIMENSIONS].tolist()
+        for i in range(0, len(values), EMBEDDING_DIMENSIONS)
+    ]
+    return lambda: [json.dumps(vector) for vector in lists], len(buffer)
+
+
+def measure(run, input_bytes, repeat, min_time):
+    run()  # warm up: handler caches, tokenizer, first-touch allocations
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat or time.perf_counter() - started < min_time:
+        begin = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - begin)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = run()
+    peak = tracemalloc.get_traced_memory()[1] - before
+    del result
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "runs": len(times),
+        "ops_per_s": round(1 / best, 3),
+        "best_ms": round(best * 1000, 3),
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "mb_per_s": round(input_bytes / 1e6 / best, 2) if input_bytes else None,
+        "input_mb": round(input_bytes / 1e6, 2) if input_bytes else None,
+        "peak_mb": round(peak / 1e6, 2),
+        "retained_kb": round(retained / 1e3, 1),
+    }
+
+
+def regressions(result, before, tolerance):
+    """Reasons `result` is worse than `before` by more than `tolerance`."""
+    reasons = []
+    speed = result["ops_per_s"] / before["ops_per_s"] - 1
+    if speed < -tolerance:
+        reasons.append(f"ops/s {speed:+.0%}")
+    # Small peaks move by allocator noise; ignore changes under 1 MB
+    growth = result["peak_mb"] - before["peak_mb"]
+    if growth > 1 and growth > tolerance * before["peak_mb"]:
+        reasons.append(f"peak +{growth:.1f} MB")
+    return reasons
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="match", help="only cases containing this")
+    parser.add_argument("--repeat", type=int, default=5, help="minimum runs per case")
+    parser.add_argument(
+        "--min-time", type=float, default=1.0, help="minimum seconds per case"
+    )
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a saved results file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="slowdown or peak growth flagged as a regression (fraction)",
+    )
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("environment") != environment():
+            print(
+                "warning: baseline was recorded on "
+                f"{baseline.get('environment')}; timings may not compare",
+                file=sys.stderr,
+            )
+
+    results, rows, flagged = {}, [], []
+    for name, setup in CASES.items():
+        if args.match and args.match not in name:
+            continue
+        run, input_bytes = setup()
+        result = results[name] = measure(run, input_bytes, args.repeat, args.min_time)
+        before = baseline.get("cases", {}).get(name)
+        if before:
+            reasons = regressions(result, before, args.tolerance)
+            change = f"{result['ops_per_s'] / before['ops_per_s'] - 1:+.0%}"
+            if reasons:
+                flagged.append((name, reasons))
+        else:
+            reasons, change = [], "-"
+        rows.append(
+            (
+                name,
+                f"{result['input_mb']:.1f}" if input_bytes else "-",
+                f"{result['ops_per_s']:,.2f}",
+                f"{result['mb_per_s']:,.1f}" if input_bytes else "-",
+                f"{result['median_ms']:,.2f}",
+                f"{result['peak_mb']:,.2f}",
+                f"{result['retained_kb']:,.0f}",
+                change,
+                "REGRESSED" if reasons else "",
+            )
+        )
+
+    report(
+        rows,
+        [
+            "case",
+            "input MB",
+            "ops/s",
+            "MB/s",
+            "median ms",
+            "peak MB",
+            "retained KB",
+            "vs baseline",
+            "",
+        ],
+    )
+
+    if args.save:
+        Path(args.save).write_text(
+            json.dumps(
+                {
+                    "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "environment": environment(),
+                    "cases": results,
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+
+    for name, reasons in flagged:
+        print(f"regression: {name}: {', '.join(reasons)}", file=sys.stderr)
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,493 @@
+"""The whole pipeline, run in-process against local stand-ins.
+
+DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... \\
+    python benchmarks/bench_pipeline.py --companies 20 --filings 4
+
+Executes workflow.definition(), the state machine __main__.py deploys:
+PlanShards, then per shard in a Map state CompanyIngest, CompanyProc,
+(with --backfill) Backfill, FilingsIngest, the parallel Embeddings and
+FilingsQueue branches and ShardReport, then FinalReport. AWS calls go to
+fake_aws (S3, SQS, Step Functions task tokens), EDGAR requests to fake_edgar,
+OpenAI to fake_openai, and Postgres to the scratch `bench` schema. A thread plays the
+sentiment queue's event source mapping, handing the sentiment Lambda batches
+of up to 100 messages and re-queueing reported failures.
+
+Each Lambda is its own container in AWS but shares module state here, so
+invocations run one at a time. Per-function busy time and peak memory
+(traced Python allocations, the part memory_size has to cover) are therefore
+clean, and Parallel and Map states only overlap their waits (task tokens,
+the sentiment queue), not their Lambda work.
+Retry intervals are not slept. Pass --no-trace-memory for timings without
+tracemalloc's overhead.
+"""
+
+import argparse
+import json
+import re
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["PGOPTIONS"] = "-c search_path=bench,public"
+os.environ.setdefault("S3_BUCKET", "bench-filings")
+os.environ.setdefault("SQS_URL", "https://sqs.local/000000000000/sentiment")
+os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+FUNCTIONS = [
+    "shard-planner",
+    "company-bulk",
+    "company-ingest",
+    "company-proc",
+    "backfill",
+    "filings-ingest",
+    "embeddings",
+    "filings-queue",
+    "sentiment",
+    "shard-report",
+    "final-report",
+    "error-handler",
+]
+WAIT_FOR_TASK_TOKEN = "arn:aws:states:::lambda:invoke.waitForTaskToken"
+# The sentiment queue's event source mapping in __main__.py
+SENTIMENT_BATCH_SIZE = 100
+SENTIMENT_BATCH_WINDOW_S = 0.2
+FUNCTION_TIMEOUT_S = 300
+
+
+class TaskFailed(Exception):
+    def __init__(self, error, cause):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+class Context:
+    """The LambdaContext attributes the handlers use."""
+
+    def __init__(self, function_name):
+        self.function_name = function_name
+        self.deadline = time.monotonic() + FUNCTION_TIMEOUT_S
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+class Lambdas:
+    """Invokes handlers one at a time, recording busy time and peak memory."""
+
+    def __init__(self, handlers, trace_memory):
+        self.handlers = handlers
+        self.trace_memory = trace_memory
+        self.lock = threading.Lock()
+        self.stats = {
+            name: {"invocations": 0, "errors": 0, "seconds": 0.0, "peak_mb": 0.0}
+            for name in handlers
+        }
+
+    def invoke(self, name, event):
+        stats = self.stats[name]
+        with self.lock:
+            if self.trace_memory:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            try:
+                # Payloads cross a JSON boundary in AWS too
+                result = self.handlers[name].lambda_handler(
+                    json.loads(json.dumps(event)), Context(name)
+                )
+                return json.loads(json.dumps(result, default=str))
+            except Exception as e:
+                stats["errors"] += 1
+                raise TaskFailed(type(e).__name__, str(e))
+            finally:
+                stats["invocations"] += 1
+                stats["seconds"] += time.perf_counter() - started
+                if self.trace_memory:
+                    peak = (tracemalloc.get_traced_memory()[1] - baseline) / 1e6
+                    stats["peak_mb"] = max(stats["peak_mb"], peak)
+
+
+def resolve(template, data, context):
+    """Step Functions Parameters: keys ending in ".$" are paths into the input."""
+    if isinstance(template, dict):
+        resolved = {}
+        for key, value in template.items():
+            if key.endswith(".$"):
+                resolved[key[:-2]] = select(value, data, context)
+            else:
+                resolved[key] = resolve(value, data, context)
+        return resolved
+    return template
+
+
+def select(path, data, context):
+    """The value at a JSONPath like "$.results[0].stats" or "$$.Task.Token"."""
+    value, path = (context, path[3:]) if path.startswith("$$.") else (data, path[2:])
+    for name, index in re.findall(r"([^.\[\]]+)|\[(\d+)\]", path):
+        value = value[int(index)] if index else value[name]
+    return value
+
+
+def place(data, result, path):
+    """Apply a state's ResultPath, like "$.results" or "$.company.ingest"."""
+    if path is None or path == "$":
+        return result
+    merged = dict(data)
+    target = merged
+    *parents, name = path[2:].split(".")
+    for parent in parents:
+        target[parent] = dict(target.get(parent) or {})
+        target = target[parent]
+    target[name] = result
+    return merged
+
+
+def choose(state, data, context):
+    """The Next of a Choice state's first matching rule, else its Default."""
+    for rule in state["Choices"]:
+        try:
+            value = select(rule["Variable"], data, context)
+        except (KeyError, IndexError, TypeError):
+            continue
+        for operator in ("StringEquals", "BooleanEquals", "NumericEquals"):
+            if operator in rule and value == rule[operator]:
+                return rule["Next"]
+        if "IsNull" in rule and (value is None) == rule["IsNull"]:
+            return rule["Next"]
+    return state["Default"]
+
+
+def matches(rule, error):
+    names = rule["ErrorEquals"]
+    return (
+        "States.ALL" in names
+        or error in names
+        or ("States.TaskFailed" in names and error != "States.Timeout")
+    )
+
+
+class Execution:
+    def __init__(self, definition, arns, lambdas, sfn, name="bench"):
+        self.definition = definition
+        self.functions = {arn: name for name, arn in arns.items()}
+        self.lambdas = lambdas
+        self.sfn = sfn
+        self.context = {"Execution": {"Name": name}}
+        self.states = []
+
+    def run(self, data):
+        return self._run(self.definition, data, self.context)
+
+    def _run(self, machine, data, context):
+        name = machine["StartAt"]
+        while True:
+            state = machine["States"][name]
+            started = time.perf_counter()
+            try:
+                if state["Type"] == "Choice":
+                    next_state = choose(state, data, context)
+                    self.states.append((name, 0.0))
+                    name = next_state
+                    continue
+                data = self._attempt(name, state, data, context)
+                next_state = state.get("Next")
+            except TaskFailed as e:
+                catch = next(
+                    (rule for rule in state.get("Catch", []) if matches(rule, e.error)),
+                    None,
+                )
+                if catch is None:
+                    raise
+                error = {"Error": e.error, "Cause": e.cause}
+                data = place(data, error, catch.get("ResultPath"))
+                next_state = catch["Next"]
+            self.states.append((name, time.perf_counter() - started))
+            if state.get("End") or next_state is None:
+                return data
+            name = next_state
+
+    def _attempt(self, name, state, data, context):
+        attempts = {id(rule): 0 for rule in state.get("Retry", [])}
+        while True:
+            try:
+                return self._state(state, data, context)
+            except TaskFailed as e:
+                rule = next(
+                    (r for r in state.get("Retry", []) if matches(r, e.error)), None
+                )
+                if rule is None or attempts[id(rule)] >= rule.get("MaxAttempts", 3):
+                    raise
+                attempts[id(rule)] += 1
+                print(f"{name}: retrying after {e.error}: {e.cause}")
+
+    def _branches(self, runs, workers):
+        """Run (machine, data, context) triples on `workers` threads, in order."""
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(self._run, *run) for run in runs]
+            return [future.result() for future in futures]
+
+    def _state(self, state, data, context):
+        if state["Type"] == "Pass":
+            result = (
+                resolve(state["Parameters"], data, context)
+                if "Parameters" in state
+                else state.get("Result", data)
+            )
+            return place(data, result, state.get("ResultPath"))
+
+        if state["Type"] == "Parallel":
+            results = self._branches(
+                [(machine, data, context) for machine in state["Branches"]],
+                len(state["Branches"]),
+            )
+            return place(data, results, state.get("ResultPath"))
+
+        if state["Type"] == "Map":
+            items = select(state.get("ItemsPath", "$"), data, context)
+            runs = []
+            for index, item in enumerate(items):
+                item_context = {
+                    **context,
+                    "Map": {"Item": {"Index": index, "Value": item}},
+                }
+                if "ItemSelector" in state:
+                    item = resolve(state["ItemSelector"], data, item_context)
+                runs.append((state["ItemProcessor"], item, item_context))
+            results = self._branches(runs, state.get("MaxConcurrency") or len(runs))
+            return place(data, results, state.get("ResultPath"))
+
+        if state["Resource"] == WAIT_FOR_TASK_TOKEN:
+            token = self.sfn.new_token()
+            parameters = resolve(
+                state["Parameters"], data, {**context, "Task": {"Token": token}}
+            )
+            self.lambdas.invoke(
+                self.functions[parameters["FunctionName"]], parameters["Payload"]
+            )
+            outcome = self.sfn.wait(token, state.get("TimeoutSeconds"))
+            if outcome is None:
+                raise TaskFailed("States.Timeout", "task token was not returned")
+            status, value = outcome
+            if status == "failure":
+                raise TaskFailed(*value)
+            result = json.loads(value)
+        else:
+            event = (
+                resolve(state["Parameters"], data, context)
+                if "Parameters" in state
+                else data
+            )
+            result = self.lambdas.invoke(self.functions[state["Resource"]], event)
+        return place(data, result, state.get("ResultPath"))
+
+
+class SentimentConsumer(threading.Thread):
+    """The sentiment queue's event source mapping."""
+
+    def __init__(self, sqs, lambdas):
+        super().__init__(daemon=True)
+        self.sqs = sqs
+        self.lambdas = lambdas
+        self.stopping = threading.Event()
+        self.batches = 0
+
+    def run(self):
+        queue_url = os.environ["SQS_URL"]
+        while not self.stopping.is_set():
+            records = self.sqs.receive(
+                queue_url, SENTIMENT_BATCH_SIZE, SENTIMENT_BATCH_WINDOW_S
+            )
+            if not records:
+                continue
+            self.batches += 1
+            try:
+                response = self.lambdas.invoke("sentiment", {"Records": records})
+                failed = {f["itemIdentifier"] for f in response["batchItemFailures"]}
+            except TaskFailed:
+                failed = {record["messageId"] for record in records}
+            self.sqs.release(
+                queue_url,
+                [record for record in records if record["messageId"] in failed],
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument(
+        "--filings", type=int, default=4, help="10-K/10-Q/8-Ks kept per company"
+    )
+    parser.add_argument("--document-mb", type=float, default=0.2)
+    parser.add_argument("--shard-size", type=int, default=5)
+    parser.add_argument("--shard-concurrency", type=int, default=4)
+    parser.add_argument("--mode", choices=["per-cik", "bulk"], default="per-cik")
+    parser.add_argument(
+        "--bulk-others",
+        type=int,
+        default=1000,
+        help="companies outside the universe in the bulk archive",
+    )
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="load each company's older submissions pages first",
+    )
+    parser.add_argument(
+        "--history-pages",
+        type=int,
+        default=2,
+        help="older submissions pages per company",
+    )
+    parser.add_argument(
+        "--edgar-rps", type=float, default=9, help="EDGAR rate limit (SEC allows 10)"
+    )
+    parser.add_argument("--openai-latency", type=float, default=0.05)
+    parser.add_argument("--fixtures", help="directory of recorded EDGAR responses")
+    parser.add_argument("--metrics", help="also write handler spans to this file")
+    parser.add_argument("--no-trace-memory", action="store_true")
+    args = parser.parse_args()
+
+    # Read by the handlers and common modules at import time
+    os.environ["FILINGS_PER_COMPANY"] = str(args.filings)
+    os.environ["EDGAR_MAX_RPS"] = str(args.edgar_rps)
+    if args.metrics:
+        os.environ["METRICS_FILE"] = args.metrics
+
+    import fake_aws
+    import fake_edgar
+    import fake_openai
+    from _support import ROOT, connect, load_handler, report, reset_schema
+
+    sys.path.insert(0, str(ROOT))
+    import workflow
+    from common import edgar
+
+    conn = connect()
+    reset_schema(conn)
+    conn.close()
+
+    s3, sqs, sfn = fake_aws.install()
+    ciks = [str(100001 + n) for n in range(args.companies)]
+    edgar_server, documents = fake_edgar.serve(
+        filings=args.filings,
+        document_mb=args.document_mb,
+        fixtures=args.fixtures,
+        bulk_ciks=ciks,
+        bulk_others=args.bulk_others,
+        history_pages=args.history_pages,
+    )
+    fake_edgar.route(edgar.get_session(), edgar_server)
+    if args.mode == "bulk":
+        # Build the archive up front so the run does not time its generation
+        documents.get(fake_edgar.BULK_SUBMISSIONS_PATH)
+    openai_server, openai_limits = fake_openai.serve(
+        latency=args.openai_latency, per_1k_tokens=0.001
+    )
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{openai_server.server_port}/v1"
+
+    handlers = {name: load_handler(name) for name in FUNCTIONS}
+    arns = {
+        name: f"arn:aws:lambda:local:000000000000:function:{name}" for name in FUNCTIONS
+    }
+    universe_key = "universe/bench.txt"
+    s3.put_object(
+        Bucket=os.environ["S3_BUCKET"],
+        Key=universe_key,
+        Body="\n".join(ciks).encode(),
+    )
+
+    if not args.no_trace_memory:
+        tracemalloc.start()
+    lambdas = Lambdas(handlers, not args.no_trace_memory)
+    consumer = SentimentConsumer(sqs, lambdas)
+    consumer.start()
+    execution = Execution(
+        workflow.definition(arns, args.shard_concurrency), arns, lambdas, sfn
+    )
+    started = time.perf_counter()
+    try:
+        output = execution.run(
+            {
+                "universe_key": universe_key,
+                "shard_size": args.shard_size,
+                "mode": args.mode,
+                "backfill": args.backfill,
+            }
+        )
+    finally:
+        elapsed = time.perf_counter() - started
+        consumer.stopping.set()
+        consumer.join()
+        edgar_server.shutdown()
+        openai_server.shutdown()
+
+    totals = output.get("totals", {}) if isinstance(output, dict) else {}
+    filings = totals.get("filings", 0)
+    # Per-shard states run once per shard; their time is summed over shards
+    units = {
+        "PlanShards": ("companies", args.companies),
+        "CompanyBulk": ("companies", args.companies),
+        "ProcessShards": ("filings", filings),
+        "CompanyIngest": ("companies", args.companies),
+        "CompanyProc": ("companies", args.companies),
+        "Backfill": ("companies", args.companies),
+        "FilingsIngest": ("filings", filings),
+        "ParallelProcessing": ("filings", filings),
+        "FinalReport": ("filings", filings),
+    }
+    runs, seconds = {}, {}
+    for name, elapsed_s in execution.states:
+        runs[name] = runs.get(name, 0) + 1
+        seconds[name] = seconds.get(name, 0) + elapsed_s
+    rows = []
+    for name in runs:
+        unit, count = units.get(name, ("", 0))
+        rows.append(
+            (
+                name,
+                runs[name],
+                f"{seconds[name]:.2f}",
+                f"{count / seconds[name]:,.1f} {unit}/s"
+                if count and seconds[name]
+                else "-",
+            )
+        )
+    rows.append(("total", 1, f"{elapsed:.2f}", f"{filings / elapsed:,.1f} filings/s"))
+    report(rows, ["state", "runs", "wall s", "throughput"])
+    print()
+
+    report(
+        [
+            (
+                name,
+                stats["invocations"],
+                stats["errors"],
+                f"{stats['seconds']:.2f}",
+                f"{stats['peak_mb']:.1f}" if not args.no_trace_memory else "-",
+            )
+            for name, stats in lambdas.stats.items()
+            if stats["invocations"]
+        ],
+        ["function", "invocations", "errors", "busy s", "peak MB"],
+    )
+    print()
+
+    print(f"Run: {json.dumps(totals)}, {output.get('failed_shards', 0)} failed shards")
+    print(
+        f"EDGAR: {documents.stats['requests']} requests, "
+        f"{documents.stats['bytes'] / 1e6:.1f} MB; "
+        f"S3: {json.dumps(s3.stats)}; "
+        f"OpenAI: {json.dumps(openai_limits.stats)}; "
+        f"sentiment: {consumer.batches} batches, "
+        f"{len(sqs.dead_letters)} dead-lettered"
+    )
+    if args.metrics:
+        print(f"Handler spans: python benchmarks/metrics_report.py {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Messages/sec through the sentiment handler at different SQS batch sizes.
+
+DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... python benchmarks/bench_sentiment_batch.py
+
+The handler writes through common.db, so this benchmark uses the DB_* variables
+(not BENCH_DATABASE_URL) and points the handler's connection at the scratch
+`bench` schema. Batch size 1 matches the old event source mapping. Filing text
+comes from an in-memory stand-in for S3, so the figures exclude S3 latency.
+"""
+
+import json
+import os
+
+os.environ["PGOPTIONS"] = "-c search_path=bench,public"
+
+from _support import Timer, connect, load_handler, report, reset_schema  # noqa: E402
+
+sentiment = load_handler("sentiment")
+
+MESSAGES = 2000
+TEXT = (
+    "Item 1. Business. Our strong results improved margins. "
+    "Item 1A. Risk Factors. Adverse conditions may cause losses and delays. "
+) * 10
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+
+    def iter_chunks(self, size):
+        for i in range(0, len(self.data), size):
+            yield self.data[i : i + size]
+
+
+class FakeS3:
+    def __init__(self, data):
+        self.data = data
+
+    def get_object(self, Bucket, Key):
+        return {"Body": FakeBody(self.data)}
+
+
+def make_records(count):
+    return [
+        {
+            "messageId": f"m-{n}",
+            "body": json.dumps(
+                {
+                    "cik": str(1000 + n % 50),
+                    "accession_number": f"acc-{n}",
+                    "bucket": "bench",
+                    "key": f"filings/acc-{n}.txt",
+                }
+            ),
+        }
+        for n in range(count)
+    ]
+
+
+def main():
+    conn = connect()
+    reset_schema(conn)
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO company_filings (cik, form, accession_number)
+            SELECT (1000 + n %% 50)::text, '10-K', 'acc-' || n
+            FROM generate_series(0, %s) AS n
+            """,
+            (MESSAGES - 1,),
+        )
+    conn.commit()
+
+    s3 = FakeS3(TEXT.encode())
+    sentiment.get_s3 = lambda: s3
+    records = make_records(MESSAGES)
+    rows = []
+    for batch_size in (1, 10, 100):
+        failed = 0
+        with Timer() as t:
+            for start in range(0, MESSAGES, batch_size):
+                event = {"Records": records[start : start + batch_size]}
+                failed += len(
+                    sentiment.lambda_handler(event, None)["batchItemFailures"]
+                )
+        rows.append(
+            (
+                batch_size,
+                MESSAGES // batch_size,
+                failed,
+                f"{t.elapsed:.2f}",
+                f"{MESSAGES / t.elapsed:,.0f}",
+            )
+        )
+    conn.close()
+    report(rows, ["batch size", "invocations", "failed", "seconds", "messages/s"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Single-core throughput of the lexicon sentiment scorer.
+
+    python benchmarks/bench_sentiment_score.py [filing.txt ...]
+
+Without arguments a synthetic 10-K is generated and run through filings-ingest's
+text extractor, as in bench_chunking.py. "per-word loop" is the textbook
+version (regex tokens, a dictionary lookup per word); "count_text" is the
+handler's streaming counter, fed 1 MiB pieces as it reads them from S3.
+"""
+
+import re
+import sys
+import tempfile
+from functools import partial
+from pathlib import Path
+
+from _support import Timer, load_handler, report
+from fixtures import make_10k_html
+
+sentiment = load_handler("sentiment")
+
+
+def per_word_loop(text, lexicon):
+    tally = sentiment.new_tally()
+    for word in re.findall(r"[a-z]+", text.lower()):
+        tally["words"] += 1
+        for category in lexicon.get(word, ()):
+            tally[category] += 1
+    return tally, {}
+
+
+def main(paths):
+    if not paths:
+        fixture = Path(tempfile.gettempdir()) / "bench_10k.txt"
+        if not fixture.exists():
+            filings_ingest = load_handler("filings-ingest")
+            html = make_10k_html(30)
+            fixture.write_text(
+                filings_ingest.extract_text(filings_ingest.iter_chunks(html))
+            )
+        paths = [str(fixture)]
+
+    lexicon = sentiment.load_lexicon()
+    rows = []
+    for path in paths:
+        text = Path(path).read_text()
+        size_mb = len(text.encode("utf-8")) / 1e6
+        pieces = [
+            text[i : i + sentiment.READ_SIZE]
+            for i in range(0, len(text), sentiment.READ_SIZE)
+        ]
+        for name, score in (
+            ("per-word loop", partial(per_word_loop, text, lexicon)),
+            ("count_text", partial(sentiment.count_text, pieces, lexicon)),
+        ):
+            with Timer() as t:
+                document, sections = score()
+            rows.append(
+                (
+                    Path(path).name,
+                    name,
+                    f"{size_mb:.1f}",
+                    f"{t.elapsed:.2f}",
+                    f"{size_mb / t.elapsed:.1f}",
+                    f"{document['words']:,}",
+                    sentiment.describe(document)["Sentiment"],
+                    len(sections),
+                )
+            )
+    report(
+        rows,
+        ["file", "method", "MB", "seconds", "MB/s", "words", "label", "sections"],
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
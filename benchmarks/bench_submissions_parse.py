@@ -0,0 +1,64 @@
+"""Parse time and peak memory: json.loads versus company-proc's lazy parser.
+
+python benchmarks/bench_submissions_parse.py
+"""
+
+import json
+import tracemalloc
+
+from _support import Timer, report
+from fixtures import make_submissions
+
+from common import submissions
+
+
+def full_parse(text):
+    company_data = json.loads(text)
+    return (
+        submissions.get_company_facts(company_data),
+        submissions.get_recent_filings(company_data),
+    )
+
+
+def measure(parse, text, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        with Timer() as t:
+            result = parse(text)
+        best = min(best, t.elapsed)
+
+    tracemalloc.start()
+    parse(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def main():
+    rows = []
+    for filing_count in (1_000, 10_000, 40_000):
+        for wanted_every in (10, 5_000):
+            text = make_submissions(filing_count, wanted_every=wanted_every)
+            size_mb = len(text) / 1e6
+            expected, *_ = measure(full_parse, text, repeat=1)
+            for name, parse in (
+                ("json.loads", full_parse),
+                ("lazy", submissions.parse_submissions),
+            ):
+                result, best, peak = measure(parse, text)
+                assert result == expected, name
+                rows.append(
+                    (
+                        name,
+                        filing_count,
+                        wanted_every,
+                        f"{size_mb:.1f}",
+                        f"{best * 1000:.1f}",
+                        f"{peak / 1e6:.1f}",
+                    )
+                )
+    report(rows, ["parser", "filings", "wanted 1/n", "MB", "best ms", "peak MB"])
+
+
+if __name__ == "__main__":
+    main()
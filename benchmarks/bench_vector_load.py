@@ -0,0 +1,90 @@
+"""Vectors/sec for the binary COPY loader versus the old JSON executemany path.
+
+BENCH_DATABASE_URL=postgresql://... python benchmarks/bench_vector_load.py
+
+Both paths write the same rows once; the old path's quadratic re-writes are not
+reproduced, so the gap shown is the per-row cost alone. The executemany path is
+skipped at 100k chunks unless --all is passed (it takes minutes).
+"""
+
+import json
+import random
+import sys
+from array import array
+
+from _support import Timer, connect, report, reset_schema
+
+from common.vectors import copy_embeddings
+
+DIM = 1536
+CHUNKS_PER_FILING = 40
+
+
+def make_filings(cur, chunk_count):
+    filing_count = -(-chunk_count // CHUNKS_PER_FILING)
+    cur.execute(
+        """
+        INSERT INTO company_filings (cik, form, accession_number)
+        SELECT '1', '10-K', 'a' || n FROM generate_series(1, %s) AS n
+        RETURNING id
+        """,
+        (filing_count,),
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def make_rows(filing_ids, chunk_count, vectors):
+    # A small pool of vectors keeps 100k rows from needing gigabytes of memory
+    for n in range(chunk_count):
+        filing_id = filing_ids[n // CHUNKS_PER_FILING]
+        yield filing_id, n % CHUNKS_PER_FILING, vectors[n % len(vectors)]
+
+
+def json_executemany(cur, filing_ids, rows):
+    # The old write path, minus the repeated batches
+    cur.executemany(
+        """
+        INSERT INTO filing_embeddings (filing_id, chunk_index, embedding)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (filing_id, chunk_index) DO UPDATE
+        SET embedding = EXCLUDED.embedding
+        """,
+        [(f, i, json.dumps(v.tolist())) for f, i, v in rows],
+    )
+
+
+def main(run_all):
+    rng = random.Random(0)
+    vectors = [
+        array("f", (rng.uniform(-0.1, 0.1) for _ in range(DIM))) for _ in range(64)
+    ]
+    conn = connect()
+    rows = []
+    for chunk_count in (100, 10_000, 100_000):
+        for name, writer in (
+            ("json executemany", json_executemany),
+            ("binary copy", copy_embeddings),
+        ):
+            if writer is json_executemany and chunk_count > 10_000 and not run_all:
+                continue
+            reset_schema(conn)
+            with conn.cursor() as cur:
+                filing_ids = make_filings(cur, chunk_count)
+                conn.commit()
+                with Timer() as t:
+                    writer(cur, filing_ids, make_rows(filing_ids, chunk_count, vectors))
+                    conn.commit()
+            rows.append(
+                (
+                    name,
+                    chunk_count,
+                    f"{t.elapsed:.2f}",
+                    f"{chunk_count / t.elapsed:,.0f}",
+                )
+            )
+    conn.close()
+    report(rows, ["path", "chunks", "seconds", "vectors/s"])
+
+
+if __name__ == "__main__":
+    main("--all" in sys.argv[1:])
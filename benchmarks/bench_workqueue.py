@@ -0,0 +1,148 @@
+"""Claiming the filings backlog: the old OR select versus SKIP LOCKED leases.
+
+DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... \\
+    python benchmarks/bench_workqueue.py --filings 500000 --pending 20000 --workers 8
+
+Fills company_filings in the scratch `bench` schema with --filings rows, the
+last --pending of them (the newest, as after a nightly company load) not
+yet ingested. Times the select filings-ingest used to run against a claim of the
+same backlog, then has --workers threads, each on its own connection, claim
+--batch filings at a time until the backlog is empty, and checks that no
+filing was handed out twice.
+"""
+
+import argparse
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+
+os.environ["PGOPTIONS"] = "-c search_path=bench,public"
+
+from _support import Timer, connect, report, reset_schema  # noqa: E402
+from common import workqueue  # noqa: E402
+
+OLD_SELECT = """
+    SELECT cik, accession_number, form, archive_url
+    FROM company_filings
+    WHERE (embedding_status <> 'done' OR sentiment_status <> 'done')
+"""
+
+
+def populate(conn, filings, pending, companies=5000):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO company_filings
+                (cik, form, accession_number, archive_url,
+                 ingest_status, embedding_status, sentiment_status)
+            SELECT (n %% %s)::text, '10-K', n::text, 'https://example.com/' || n,
+                   status, status, status
+            FROM generate_series(1, %s) AS n,
+                 LATERAL (
+                     SELECT CASE WHEN n > %s THEN 'pending' ELSE 'done' END
+                 ) AS s (status)
+            """,
+            (companies, filings, filings - pending),
+        )
+        cur.execute("ANALYZE company_filings")
+    conn.commit()
+
+
+def release_all(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE company_filings SET lease_owner = NULL, "
+            "lease_expires_at = '-infinity', attempts = 0 WHERE lease_owner IS NOT NULL"
+        )
+    conn.commit()
+
+
+def drain(workers, batch):
+    """Claim the whole backlog from `workers` threads; returns (claims, seconds)."""
+    claimed = Counter()
+    lock = threading.Lock()
+
+    def work():
+        conn = connect()
+        owner = str(uuid.uuid4())
+        while True:
+            with conn.cursor() as cur:
+                rows = workqueue.claim(cur, "ingest", owner, batch, 3600)
+            conn.commit()
+            if not rows:
+                break
+            with lock:
+                claimed.update((cik, accession) for cik, accession, _, _ in rows)
+        conn.close()
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return claimed, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filings", type=int, default=500000)
+    parser.add_argument("--pending", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+
+    conn = connect()
+    reset_schema(conn)
+    populate(conn, args.filings, args.pending)
+
+    rows = []
+    with conn.cursor() as cur:
+        # Without the partial index, as the old select ran
+        cur.execute("SET enable_bitmapscan = off")
+        cur.execute("SET enable_indexscan = off")
+        with Timer() as timer:
+            cur.execute(OLD_SELECT)
+            count = len(cur.fetchall())
+        rows.append(("old select (seq scan)", count, f"{timer.elapsed * 1000:.1f}"))
+        cur.execute("RESET enable_bitmapscan")
+        cur.execute("RESET enable_indexscan")
+        with Timer() as timer:
+            count = len(workqueue.claim(cur, "ingest", "bench", None, 3600))
+        rows.append(("claim all (partial index)", count, f"{timer.elapsed * 1000:.1f}"))
+        conn.rollback()
+        with Timer() as timer:
+            count = len(workqueue.claim(cur, "ingest", "bench", args.batch, 3600))
+        rows.append(
+            (
+                f"claim {args.batch} (partial index)",
+                count,
+                f"{timer.elapsed * 1000:.1f}",
+            )
+        )
+        conn.rollback()
+    report(rows, ["query", "filings", "ms"])
+    print()
+
+    rows = []
+    for workers in sorted({1, args.workers}):
+        release_all(conn)
+        claimed, elapsed = drain(workers, args.batch)
+        duplicates = sum(1 for n in claimed.values() if n > 1)
+        rows.append(
+            (
+                workers,
+                sum(claimed.values()),
+                duplicates,
+                f"{elapsed:.2f}",
+                f"{sum(claimed.values()) / elapsed:,.0f}",
+            )
+        )
+    report(rows, ["workers", "claimed", "duplicates", "seconds", "claims/s"])
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
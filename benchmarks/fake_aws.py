@@ -0,0 +1,183 @@
+"""In-memory stand-ins for the S3, SQS and Step Functions calls the handlers make.
+
+    s3, sqs, sfn = fake_aws.install()
+
+install() points boto3.client at one shared instance of each, so every
+handler in the process sees the same bucket, queue and task tokens. Only the
+operations the pipeline uses are implemented, with boto3's request and
+response shapes.
+"""
+
+import io
+import itertools
+import threading
+import time
+from collections import deque
+
+import boto3
+from botocore.exceptions import ClientError
+
+
+def _missing(operation, code):
+    return ClientError({"Error": {"Code": code, "Message": "Not Found"}}, operation)
+
+
+class Body:
+    """The parts of botocore's StreamingBody the handlers read through."""
+
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+    def iter_chunks(self, chunk_size=1024):
+        while chunk := self._stream.read(chunk_size):
+            yield chunk
+
+    def iter_lines(self, chunk_size=1024, keepends=False):
+        yield from (
+            line.rstrip(b"\r\n") if not keepends else line for line in self._stream
+        )
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.stats = {"get": 0, "put": 0, "head": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def put_object(self, Bucket, Key, Body, Metadata=None, **kwargs):
+        data = Body if isinstance(Body, bytes) else bytes(Body)
+        with self.lock:
+            self.objects[(Bucket, Key)] = (data, dict(Metadata or {}))
+            self.stats["put"] += 1
+            self.stats["bytes_in"] += len(data)
+        return {}
+
+    def get_object(self, Bucket, Key):
+        with self.lock:
+            if (Bucket, Key) not in self.objects:
+                raise _missing("GetObject", "NoSuchKey")
+            data, metadata = self.objects[(Bucket, Key)]
+            self.stats["get"] += 1
+            self.stats["bytes_out"] += len(data)
+        return {"Body": Body(data), "ContentLength": len(data), "Metadata": metadata}
+
+    def head_object(self, Bucket, Key):
+        with self.lock:
+            self.stats["head"] += 1
+            if (Bucket, Key) not in self.objects:
+                raise _missing("HeadObject", "404")
+            data, metadata = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(data), "Metadata": metadata}
+
+
+class FakeSQS:
+    """One standard queue per URL, with receive counts and a dead-letter queue."""
+
+    def __init__(self, max_receives=3):
+        self.max_receives = max_receives
+        self.queues = {}
+        self.dead_letters = []
+        self.ids = itertools.count()
+        self.lock = threading.Condition()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self.lock:
+            queue = self.queues.setdefault(QueueUrl, deque())
+            for entry in Entries:
+                queue.append(
+                    {
+                        "messageId": f"msg-{next(self.ids)}",
+                        "body": entry["MessageBody"],
+                        "attributes": {"ApproximateReceiveCount": "0"},
+                        "messageAttributes": {
+                            name: {"stringValue": value.get("StringValue")}
+                            for name, value in entry.get(
+                                "MessageAttributes", {}
+                            ).items()
+                        },
+                    }
+                )
+            self.lock.notify_all()
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+    def receive(self, queue_url, max_messages, wait):
+        """Up to `max_messages` records, waiting up to `wait` seconds to fill the batch."""
+        deadline = time.monotonic() + wait
+        with self.lock:
+            queue = self.queues.setdefault(queue_url, deque())
+            while len(queue) < max_messages:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.lock.wait(remaining)
+            records = [queue.popleft() for _ in range(min(max_messages, len(queue)))]
+        for record in records:
+            count = int(record["attributes"]["ApproximateReceiveCount"]) + 1
+            record["attributes"]["ApproximateReceiveCount"] = str(count)
+        return records
+
+    def release(self, queue_url, records):
+        """Return failed records to the queue, or to the dead letters when exhausted."""
+        with self.lock:
+            for record in records:
+                if int(record["attributes"]["ApproximateReceiveCount"]) >= (
+                    self.max_receives
+                ):
+                    self.dead_letters.append(record)
+                else:
+                    self.queues[queue_url].append(record)
+            self.lock.notify_all()
+
+
+class FakeSFN:
+    class exceptions:
+        class TaskTimedOut(Exception):
+            pass
+
+        class InvalidToken(Exception):
+            pass
+
+    def __init__(self):
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def new_token(self):
+        with self.lock:
+            token = f"token-{len(self.tokens)}"
+            self.tokens[token] = {"done": threading.Event(), "result": None}
+        return token
+
+    def _finish(self, token, result):
+        with self.lock:
+            task = self.tokens.get(token)
+            if task is None:
+                raise self.exceptions.InvalidToken(token)
+            if task["done"].is_set():
+                raise self.exceptions.TaskTimedOut(token)
+            task["result"] = result
+            task["done"].set()
+        return {}
+
+    def send_task_success(self, taskToken, output):
+        return self._finish(taskToken, ("success", output))
+
+    def send_task_failure(self, taskToken, error=None, cause=None):
+        return self._finish(taskToken, ("failure", (error, cause)))
+
+    def wait(self, token, timeout=None):
+        """("success", output) or ("failure", (error, cause)); None on timeout."""
+        task = self.tokens[token]
+        if not task["done"].wait(timeout):
+            return None
+        return task["result"]
+
+
+def install(max_receives=3):
+    """Route boto3.client to fresh shared fakes; returns (s3, sqs, sfn)."""
+    s3, sqs, sfn = FakeS3(), FakeSQS(max_receives), FakeSFN()
+    clients = {"s3": s3, "sqs": sqs, "stepfunctions": sfn}
+    boto3.client = lambda service_name, *args, **kwargs: clients[service_name]
+    return s3, sqs, sfn
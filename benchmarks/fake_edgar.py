@@ -0,0 +1,197 @@
+"""A local EDGAR: submissions JSON and filing documents over HTTP.
+
+    python benchmarks/fake_edgar.py --port 8098 --filings 4 --document-mb 0.2
+
+Serves /submissions/CIK##########.json (listing `history_pages` older
+/submissions/CIK##########-submissions-###.json pages of `page_filings`
+rows each), /Archives/edgar/data/... and the bulk
+/Archives/edgar/daily-index/bulkdata/submissions.zip (for the CIKs passed as
+`bulk_ciks`, amid `bulk_others` companies outside them). A file
+under `--fixtures` with the same path (recorded from the real EDGAR) is served
+as is; anything else is generated with benchmarks/fixtures.py, deterministic
+per CIK and document. route() points common.edgar's session at the server, so
+handlers keep requesting the real data.sec.gov and www.sec.gov URLs.
+"""
+
+import argparse
+import re
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from requests.adapters import HTTPAdapter
+
+from fixtures import (
+    make_10k_html,
+    make_submissions,
+    make_submissions_page,
+    make_submissions_zip,
+)
+
+EDGAR_HOSTS = ("https://data.sec.gov", "https://www.sec.gov")
+BULK_SUBMISSIONS_PATH = "/Archives/edgar/daily-index/bulkdata/submissions.zip"
+# Only one submissions row in this many is a 10-K/10-Q/8-K, as for large filers
+WANTED_EVERY = 5
+_HISTORY_PAGE = re.compile(r"/submissions/CIK(\d{10})-submissions-(\d{3})\.json")
+
+
+class Documents:
+    def __init__(
+        self,
+        filings,
+        document_mb,
+        fixtures=None,
+        bulk_ciks=(),
+        bulk_others=0,
+        history_pages=1,
+        page_filings=2000,
+    ):
+        self.filings = filings
+        self.history_pages = history_pages
+        self.page_filings = page_filings
+        self.document_mb = document_mb
+        self.fixtures = Path(fixtures) if fixtures else None
+        self.bulk_ciks = list(bulk_ciks)
+        self.bulk_others = bulk_others
+        self._archive = None
+        self.stats = {"requests": 0, "bytes": 0, "recorded": 0}
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        """Response bytes for a request path, or None for a 404."""
+        if self.fixtures and (self.fixtures / path.lstrip("/")).is_file():
+            with self.lock:
+                self.stats["recorded"] += 1
+            return (self.fixtures / path.lstrip("/")).read_bytes()
+        if path == BULK_SUBMISSIONS_PATH:
+            # Built on first request, then served from memory
+            with self.lock:
+                if self._archive is None:
+                    self._archive = make_submissions_zip(
+                        self.bulk_ciks,
+                        self.filings,
+                        wanted_every=WANTED_EVERY,
+                        others=self.bulk_others,
+                    )
+            return self._archive
+        page = _HISTORY_PAGE.fullmatch(path)
+        if page:
+            return make_submissions_page(
+                self.page_filings,
+                page.group(1).lstrip("0"),
+                int(page.group(2)),
+                wanted_every=WANTED_EVERY,
+            ).encode()
+        if path.startswith("/submissions/CIK") and path.endswith(".json"):
+            cik = path[len("/submissions/CIK") : -len(".json")].lstrip("0")
+            return make_submissions(
+                self.filings * WANTED_EVERY,
+                cik=cik,
+                wanted_every=WANTED_EVERY,
+                history_pages=self.history_pages,
+                page_filings=self.page_filings,
+            ).encode()
+        if path.startswith("/Archives/edgar/data/"):
+            # A different document per filing, so embeddings are not all cache hits
+            return make_10k_html(self.document_mb, seed=zlib.crc32(path.encode()))
+        return None
+
+
+def make_handler(documents):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def handle(self):
+            try:
+                super().handle()
+            except ConnectionResetError:
+                # The client closed with part of a response unread
+                pass
+
+        def do_GET(self):
+            body = documents.get(self.path)
+            if body is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            with documents.lock:
+                documents.stats["requests"] += 1
+                documents.stats["bytes"] += len(body)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # A streaming client may stop reading early (a ZIP reader
+                # has no use for the central directory)
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(
+    port=0,
+    filings=4,
+    document_mb=0.2,
+    fixtures=None,
+    bulk_ciks=(),
+    bulk_others=0,
+    history_pages=1,
+    page_filings=2000,
+):
+    """Start the server on a background thread; returns (server, documents)."""
+    documents = Documents(
+        filings,
+        document_mb,
+        fixtures,
+        bulk_ciks,
+        bulk_others,
+        history_pages,
+        page_filings,
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(documents))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, documents
+
+
+class RedirectAdapter(HTTPAdapter):
+    """Sends requests for EDGAR hosts to `base_url` instead."""
+
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        for host in EDGAR_HOSTS:
+            if request.url.startswith(host):
+                request.url = self.base_url + request.url[len(host) :]
+                break
+        return super().send(request, **kwargs)
+
+
+def route(session, server):
+    adapter = RedirectAdapter(
+        f"http://127.0.0.1:{server.server_port}", pool_connections=4, pool_maxsize=16
+    )
+    for host in EDGAR_HOSTS:
+        session.mount(host, adapter)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--filings", type=int, default=4, help="10-K/10-Q/8-Ks each")
+    parser.add_argument("--document-mb", type=float, default=0.2)
+    parser.add_argument("--fixtures", help="directory of recorded responses")
+    args = parser.parse_args()
+    server, _ = serve(args.port, args.filings, args.document_mb, args.fixtures)
+    print(f"Fake EDGAR on http://127.0.0.1:{server.server_port}")
+    threading.Event().wait()
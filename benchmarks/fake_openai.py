@@ -0,0 +1,137 @@
+"""A local stand-in for the OpenAI embeddings endpoint, with rate limits.
+
+    python benchmarks/fake_openai.py --port 8099 --tpm 300000 --max-concurrency 6
+
+Serves POST /v1/embeddings with base64 embeddings. Each request takes
+`--latency` seconds plus `--per-1k-tokens` seconds per thousand input tokens.
+Requests beyond `--max-concurrency` in flight, or needing more tokens than the
+`--tpm` budget holds, get a 429 with a Retry-After header. Like the real API,
+the budget refills continuously up to a minute's worth of tokens. Point a
+client at it with base_url="http://127.0.0.1:<port>/v1".
+"""
+
+import argparse
+import base64
+import json
+import threading
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIM = 1536
+EMBEDDING = base64.b64encode(array("f", [0.01] * DIM)).decode()
+
+
+class Limits:
+    def __init__(self, tpm, max_concurrency, latency, per_1k_tokens):
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.latency = latency
+        self.per_1k_tokens = per_1k_tokens
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.tokens = tpm
+        self.updated = time.monotonic()
+        self.stats = {"requests": 0, "rate_limited": 0, "tokens": 0}
+
+    def admit(self, tokens):
+        """None if the request may run, else the seconds to ask the client to wait."""
+        with self.lock:
+            now = time.monotonic()
+            if self.tpm:
+                self.tokens = min(
+                    self.tpm, self.tokens + (now - self.updated) * self.tpm / 60
+                )
+                self.updated = now
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                self.stats["rate_limited"] += 1
+                return 1.0
+            if self.tpm and tokens > self.tokens:
+                self.stats["rate_limited"] += 1
+                return (tokens - self.tokens) * 60 / self.tpm
+            self.in_flight += 1
+            if self.tpm:
+                self.tokens -= tokens
+            self.stats["requests"] += 1
+            self.stats["tokens"] += tokens
+            return None
+
+    def done(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+def make_handler(limits):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            inputs = request["input"]
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            tokens = sum(len(text) // 4 + 1 for text in inputs)
+
+            wait = limits.admit(tokens)
+            if wait is not None:
+                self.respond(
+                    429,
+                    {"error": {"message": "Rate limit reached", "type": "requests"}},
+                    {"retry-after": f"{wait:.2f}"},
+                )
+                return
+            try:
+                time.sleep(limits.latency + limits.per_1k_tokens * tokens / 1000)
+            finally:
+                limits.done()
+            self.respond(
+                200,
+                {
+                    "object": "list",
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": EMBEDDING}
+                        for i in range(len(inputs))
+                    ],
+                    "model": request["model"],
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                },
+            )
+
+        def respond(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=0, tpm=0, max_concurrency=0, latency=0.2, per_1k_tokens=0.01):
+    """Start the server on a background thread; returns (server, limits)."""
+    limits = Limits(tpm, max_concurrency, latency, per_1k_tokens)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(limits))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, limits
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--tpm", type=int, default=0, help="0 for no limit")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="0 for none")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--per-1k-tokens", type=float, default=0.01)
+    args = parser.parse_args()
+    server, _ = serve(
+        args.port, args.tpm, args.max_concurrency, args.latency, args.per_1k_tokens
+    )
+    print(f"Fake embeddings API on http://127.0.0.1:{server.server_port}/v1")
+    threading.Event().wait()
@@ -0,0 +1,222 @@
+"""Synthetic fixtures shaped like the real EDGAR payloads."""
+
+import io
+import json
+import random
+import zipfile
+
+RECENT_COLUMNS = [
+    "accessionNumber",
+    "filingDate",
+    "reportDate",
+    "acceptanceDateTime",
+    "act",
+    "form",
+    "fileNumber",
+    "filmNumber",
+    "items",
+    "size",
+    "isXBRL",
+    "isInlineXBRL",
+    "primaryDocument",
+    "primaryDocDescription",
+]
+# Large filers are dominated by prospectus and ownership forms
+BULK_FORMS = ["424B2", "FWP", "4", "424B3", "S-8", "SC 13G/A", "3", "13F-HR"]
+
+
+def filing_columns(filing_count, cik, wanted_every, rng, year_of):
+    """Columnar filing rows, as in filings.recent and the older pages.
+
+    Row i is filed in year_of(i).
+    """
+    columns = {name: [] for name in RECENT_COLUMNS}
+    for i in range(filing_count):
+        if i % wanted_every == wanted_every - 1:
+            form = rng.choice(["10-K", "10-Q", "8-K"])
+        else:
+            form = rng.choice(BULK_FORMS)
+        year = year_of(i)
+        columns["accessionNumber"].append(f"0000{cik}-{year % 100:02d}-{i:06d}")
+        columns["filingDate"].append(f"{year}-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}")
+        columns["reportDate"].append(f"{year}-{(i % 12) + 1:02d}-01")
+        columns["acceptanceDateTime"].append(f"{year}-01-01T16:05:{i % 60:02d}.000Z")
+        columns["act"].append("33")
+        columns["form"].append(form)
+        columns["fileNumber"].append(f"333-{rng.randint(100000, 999999)}")
+        columns["filmNumber"].append(str(rng.randint(10**9, 10**10)))
+        columns["items"].append("")
+        columns["size"].append(rng.randint(1000, 10**7))
+        columns["isXBRL"].append(rng.randint(0, 1))
+        columns["isInlineXBRL"].append(rng.randint(0, 1))
+        columns["primaryDocument"].append(f"d{i}.htm")
+        columns["primaryDocDescription"].append(form)
+    return columns
+
+
+def history_years(page):
+    """The two years of filings on older page `page` (1 is the newest)."""
+    return [2024 - 2 * page, 2023 - 2 * page]
+
+
+def history_files(cik, pages, page_filings):
+    """filings.files entries for `pages` older pages of `page_filings` rows."""
+    return [
+        {
+            "name": f"CIK{cik.zfill(10)}-submissions-{page:03d}.json",
+            "filingCount": page_filings,
+            "filingFrom": f"{min(history_years(page))}-01-01",
+            "filingTo": f"{max(history_years(page))}-12-31",
+        }
+        for page in range(1, pages + 1)
+    ]
+
+
+def make_submissions(
+    filing_count,
+    cik="19617",
+    wanted_every=500,
+    seed=0,
+    history_pages=1,
+    page_filings=40000,
+):
+    """Submissions JSON text with `filing_count` rows in filings.recent.
+
+    One row in every `wanted_every` is a 10-K/10-Q/8-K; the rest are noise.
+    filings.files lists `history_pages` older pages (make_submissions_page).
+    """
+    rng = random.Random(seed)
+    columns = filing_columns(
+        filing_count, cik, wanted_every, rng, lambda i: 2024 - i // 4000
+    )
+
+    document = {
+        "cik": cik,
+        "entityType": "operating",
+        "sic": "6021",
+        "sicDescription": "National Commercial Banks",
+        "ownerOrg": "02 Finance",
+        "insiderTransactionForOwnerExists": 1,
+        "insiderTransactionForIssuerExists": 1,
+        "name": "JPMORGAN CHASE & CO",
+        "tickers": ["JPM"],
+        "exchanges": ["NYSE"],
+        "ein": "132624428",
+        "description": "",
+        "website": "",
+        "investorWebsite": "",
+        "category": "Large accelerated filer",
+        "fiscalYearEnd": "1231",
+        "stateOfIncorporation": "DE",
+        "stateOfIncorporationDescription": "DE",
+        "addresses": {
+            "mailing": {"street1": "383 MADISON AVENUE", "city": "NEW YORK"},
+            "business": {"street1": "383 MADISON AVENUE", "city": "NEW YORK"},
+        },
+        "phone": "2122706000",
+        "flags": "",
+        "formerNames": [
+            {"name": "CHASE MANHATTAN CORP /DE/", "from": "1994", "to": "2001"}
+        ],
+        "filings": {
+            "recent": columns,
+            "files": history_files(cik, history_pages, page_filings),
+        },
+    }
+    return json.dumps(document, separators=(",", ":"))
+
+
+def make_submissions_page(filing_count, cik, page, wanted_every=5, seed=0):
+    """Older page `page` of a company's filings (CIK##########-submissions-###.json).
+
+    Holds the same columns as filings.recent, at the top level.
+    """
+    rng = random.Random(seed * 1000 + page)
+    years = history_years(page)
+    columns = filing_columns(
+        filing_count, cik, wanted_every, rng, lambda i: years[i % len(years)]
+    )
+    return json.dumps(columns, separators=(",", ":"))
+
+
+def make_submissions_zip(ciks, filing_count, wanted_every=5, others=0):
+    """EDGAR's bulk submissions.zip for `ciks`, as bytes.
+
+    Each company gets its CIK##########.json document and, like large filers
+    in the real archive, a -submissions-001.json overflow member. `others`
+    adds that many small companies outside `ciks`, interleaved, standing in
+    for the rest of EDGAR that a universe does not cover.
+    """
+    out = io.BytesIO()
+    names = sorted(
+        [(str(cik), True) for cik in ciks]
+        + [(str(900000000 + n), False) for n in range(others)],
+        key=lambda entry: entry[0].zfill(10),
+    )
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        for cik, in_universe in names:
+            count = filing_count * wanted_every if in_universe else wanted_every
+            document = make_submissions(count, cik=cik, wanted_every=wanted_every)
+            archive.writestr(f"CIK{cik.zfill(10)}.json", document)
+            if in_universe:
+                overflow = json.loads(document)["filings"]["recent"]
+                archive.writestr(
+                    f"CIK{cik.zfill(10)}-submissions-001.json",
+                    json.dumps(overflow, separators=(",", ":")),
+                )
+    return out.getvalue()
+
+
+WORDS = (
+    "revenue increased decreased net income operating margin risk factors "
+    "liquidity capital resources litigation impairment goodwill customers "
+    "supply chain demand uncertainty favorable adverse growth decline loss "
+    "the of and to in for on with as by from that this our we"
+).split()
+
+
+def make_10k_html(size_mb, seed=0):
+    """Inline XBRL 10-K style HTML of roughly `size_mb` megabytes, as bytes.
+
+    Mirrors what makes real filings heavy: a hidden ix:header block, inline
+    styles on every element, and long runs of table markup around short text.
+    """
+    rng = random.Random(seed)
+    target = int(size_mb * 1e6)
+    parts = [
+        "<html><head><title>10-K</title><style>",
+        "td{font-family:Times New Roman;font-size:10pt}" * 200,
+        "</style></head><body>",
+        '<div style="display:none"><ix:header><ix:hidden>',
+        "".join(
+            f'<ix:nonNumeric name="dei:Fact{i}" contextRef="c-{i}">value {i}</ix:nonNumeric>'
+            for i in range(2000)
+        ),
+        "</ix:hidden></ix:header></div>",
+    ]
+    size = sum(len(p) for p in parts)
+    item = 1
+    while size < target:
+        if rng.random() < 0.01:
+            block = f'<div style="font-weight:bold"><span>Item {item}.</span></div>'
+            item += 1
+        elif rng.random() < 0.5:
+            sentence = " ".join(rng.choices(WORDS, k=rng.randint(12, 40)))
+            block = (
+                '<div style="margin-top:6pt;text-align:justify">'
+                f'<span style="font-family:Times New Roman;font-size:10pt">'
+                f"{sentence.capitalize()} &#8217;s &amp; results.</span></div>"
+            )
+        else:
+            cells = "".join(
+                '<td style="padding:0 1pt;vertical-align:bottom">'
+                f'<span style="font-size:9pt"><ix:nonFraction name="us-gaap:Revenues" '
+                f'contextRef="c-1" unitRef="usd" decimals="-6">{rng.randint(1, 99999):,}'
+                "</ix:nonFraction></span></td>"
+                for _ in range(6)
+            )
+            block = f"<table><tr>{cells}</tr></table>"
+        parts.append(block)
+        size += len(block)
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
@@ -0,0 +1,73 @@
+"""Where the time went: a span table from a METRICS_FILE written by common.telemetry.
+
+    METRICS_FILE=/tmp/metrics.jsonl python benchmarks/bench_sentiment_batch.py
+    python benchmarks/metrics_report.py /tmp/metrics.jsonl
+
+Sums every invocation in the file per function and span. "% of handler" is
+the span's total time over the function's handler time; spans that run on
+several threads at once can exceed 100%.
+"""
+
+import json
+import sys
+from collections import defaultdict
+
+from _support import report
+
+MEASURES = ("count", "ms", "max_ms")
+
+
+def load(path):
+    """{function: {span: {measure: value}}} summed over the file's invocations."""
+    functions = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+    with open(path) as lines:
+        for line in lines:
+            record = json.loads(line)
+            definitions = [
+                metric["Name"]
+                for directive in record["_aws"]["CloudWatchMetrics"]
+                for metric in directive["Metrics"]
+            ]
+            spans = functions[record["Function"]]
+            for name in definitions:
+                span, _, measure = name.rpartition(".")
+                if measure == "max_ms":
+                    spans[span][measure] = max(spans[span][measure], record[name])
+                else:
+                    spans[span][measure] += record[name]
+    return functions
+
+
+def main(path):
+    rows = []
+    for function, spans in sorted(load(path).items()):
+        handler_ms = spans.get("handler", {}).get("ms") or 0
+        for span, measures in sorted(
+            spans.items(), key=lambda item: -item[1].get("ms", 0)
+        ):
+            counters = ", ".join(
+                f"{name}={value:,.0f}"
+                for name, value in sorted(measures.items())
+                if name not in MEASURES
+            )
+            rows.append(
+                (
+                    function,
+                    span,
+                    f"{measures.get('count', 0):,.0f}",
+                    f"{measures.get('ms', 0):,.1f}",
+                    f"{measures.get('max_ms', 0):,.1f}",
+                    f"{100 * measures.get('ms', 0) / handler_ms:.0f}%"
+                    if handler_ms
+                    else "-",
+                    counters,
+                )
+            )
+    report(
+        rows,
+        ["function", "span", "count", "total ms", "max ms", "% of handler", "counters"],
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
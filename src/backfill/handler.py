@@ -0,0 +1,217 @@
+import boto3
+import os
+import time
+import uuid
+import psycopg2
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dotenv import load_dotenv
+
+from common import backfill, companies as company_store, db, edgar, shards, telemetry
+from common.submissions import parse_history, parse_history_page
+
+load_dotenv()
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SUBMISSIONS_URL = "https://data.sec.gov/submissions/{}"
+# Pages fetched at once; the EDGAR rate limit is shared between them
+BACKFILL_WORKERS = int(os.environ.get("BACKFILL_WORKERS", "4"))
+# Filings loaded per transaction, together with their pages' progress rows
+BATCH_FILINGS = int(os.environ.get("BACKFILL_BATCH_FILINGS", "5000"))
+# Time left in the invocation below which no further company is started
+RESERVE_SECONDS = float(os.environ.get("BACKFILL_RESERVE_S", "60"))
+
+
+def main_page(cik):
+    return f"CIK{cik.zfill(10)}.json"
+
+
+def fetch_page(name):
+    response = edgar.fetch(SUBMISSIONS_URL.format(name))
+    return response.content
+
+
+def run_backfill(ciks, backfill_id, options, out_of_time=lambda: False):
+    """Load the filing history of `ciks`; returns (complete, failed, stats).
+
+    Companies' documents and their older pages are fetched by a pool of
+    BACKFILL_WORKERS threads, pages of companies already started first, so
+    companies finish (and are recorded) one after another. `complete` is
+    False when `out_of_time()` stopped the backfill before every company was
+    started.
+    """
+    forms = options["forms"]
+    start_date, end_date = options["start_date"], options["end_date"]
+    with db.transaction() as cur:
+        completed = backfill.completed_pages(cur, backfill_id, ciks)
+
+    todo = deque(cik for cik in ciks if main_page(cik) not in completed.get(cik, ()))
+    pages = deque()
+    # Pages still to load per started company, and its own document's row
+    outstanding = {}
+    main_rows = {}
+    failed = {}
+    batch = {"facts": [], "filings": [], "pages": []}
+    stats = {
+        "companies": len(ciks),
+        "companies_done_before": len(ciks) - len(todo),
+        "companies_started": 0,
+        "pages": 0,
+        "pages_done_before": 0,
+        "pages_out_of_range": 0,
+        "filings": 0,
+        "bytes": 0,
+    }
+
+    def load(cik, name):
+        body = fetch_page(name)
+        with telemetry.span("parse", bytes=len(body)):
+            text = body.decode("utf-8")
+            if name == main_page(cik):
+                result = parse_history(text, forms, start_date, end_date)
+            else:
+                result = (
+                    None,
+                    parse_history_page(text, forms, start_date, end_date),
+                    [],
+                )
+        return len(body), result
+
+    def flush():
+        if not (batch["facts"] or batch["filings"] or batch["pages"]):
+            return
+        with db.transaction() as cur:
+            if batch["facts"]:
+                company_store.save_companies(cur, batch["facts"])
+            company_store.copy_filings(cur, batch["filings"])
+            backfill.record_pages(cur, backfill_id, batch["pages"])
+        for rows in batch.values():
+            rows.clear()
+
+    def page_loaded(cik):
+        outstanding[cik] -= 1
+        if outstanding[cik] == 0 and cik not in failed:
+            # Every page is in: the company's own row marks it done
+            batch["pages"].append(main_rows.pop(cik))
+
+    def handle(cik, name, size, result):
+        company_facts, filings, files = result
+        stats["pages"] += 1
+        stats["bytes"] += size
+        stats["filings"] += len(filings)
+        batch["filings"].extend((cik, filing) for filing in filings)
+        if company_facts is None:
+            batch["pages"].append((cik, name, len(filings)))
+            page_loaded(cik)
+            return
+
+        batch["facts"].append((cik, company_facts, []))
+        done_before = completed.get(cik, set())
+        queued = 0
+        for page in files:
+            if not backfill.in_range(page, start_date, end_date):
+                stats["pages_out_of_range"] += 1
+            elif page["name"] in done_before:
+                stats["pages_done_before"] += 1
+            else:
+                pages.append((cik, page["name"]))
+                queued += 1
+        main_rows[cik] = (cik, name, len(filings))
+        outstanding[cik] = queued + 1
+        page_loaded(cik)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=BACKFILL_WORKERS) as executor:
+        in_flight = {}
+
+        def submit():
+            while len(in_flight) < 2 * BACKFILL_WORKERS:
+                if pages:
+                    cik, name = pages.popleft()
+                elif todo and not out_of_time():
+                    cik = todo.popleft()
+                    name = main_page(cik)
+                    stats["companies_started"] += 1
+                else:
+                    return
+                in_flight[executor.submit(load, cik, name)] = (cik, name)
+
+        submit()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                cik, name = in_flight.pop(future)
+                try:
+                    size, result = future.result()
+                except Exception as e:
+                    logger.error(f"Error backfilling {name}: {str(e)}")
+                    failed.setdefault(cik, f"{name}: {str(e)}")
+                    if cik in outstanding:
+                        page_loaded(cik)
+                    continue
+                handle(cik, name, size, result)
+            if len(batch["filings"]) >= BATCH_FILINGS:
+                flush()
+            submit()
+    flush()
+    elapsed = time.monotonic() - started
+
+    stats["failed"] = len(failed)
+    stats["elapsed_s"] = round(elapsed, 2)
+    stats["filings_per_s"] = round(stats["filings"] / elapsed, 2) if elapsed else 0
+    complete = not todo
+    return complete, [{"cik": c, "message": m} for c, m in failed.items()], stats
+
+
+@telemetry.instrument
+def lambda_handler(event, context):
+    """Load the full filing history of a shard's (or a cik_list's) companies.
+
+    `options` sets the forms and date range (see common.backfill.options);
+    `backfill_id` names the progress to resume. An invocation stops starting
+    companies when its time runs low and returns `"complete": false`, to be
+    invoked again with the same id.
+    """
+    try:
+        options = backfill.options(event.get("options") or True)
+        backfill_id = event.get("backfill_id") or str(uuid.uuid4())
+
+        s3 = boto3.client("s3")
+        ciks = shards.load_ciks(s3, os.environ["S3_BUCKET"], event)
+        if not ciks:
+            raise ValueError("No CIK values provided")
+
+        def out_of_time():
+            return hasattr(context, "get_remaining_time_in_millis") and (
+                context.get_remaining_time_in_millis() < RESERVE_SECONDS * 1000
+            )
+
+        complete, failed, stats = run_backfill(ciks, backfill_id, options, out_of_time)
+        telemetry.record(
+            "backfill",
+            companies=len(ciks),
+            pages=stats["pages"],
+            filings=stats["filings"],
+            failed=len(failed),
+        )
+        logger.info(f"Backfill {backfill_id} stats: {stats}")
+        logger.info(f"DB connection stats: {db.metrics()}")
+
+        return {
+            "Backfill": "OK",
+            "backfill_id": backfill_id,
+            "complete": complete,
+            "failed": failed,
+            "stats": stats,
+        }
+    except psycopg2.Error as e:
+        logger.error(f"Database error: {str(e)}")
+        raise Exception(f"DatabaseConnectionError: {str(e)}")
+    except ValueError as e:
+        raise Exception(f"BadRequest: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error in lambda_handler: {str(e)}")
+        raise Exception(f"InternalServerError: {str(e)}")
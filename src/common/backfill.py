@@ -0,0 +1,93 @@
+"""Options and resumable progress for loading companies' filing history.
+
+EDGAR keeps about the last thousand filings of a company in its submissions
+document (`filings.recent`); older ones are on separate pages listed under
+`filings.files`. A backfill loads every filing of the chosen forms filed in
+a date range, from both, for a list of companies.
+
+Progress is kept in `backfill_progress`, one row per page loaded, written in
+the same transaction as the page's filings. Running a backfill again with
+the same `backfill_id` skips what is already loaded, so one that ran out of
+time, or failed part way, picks up where it stopped. A company's own
+document is recorded last, once all its pages are in, and marks the company
+done.
+"""
+
+import os
+from datetime import date, timedelta
+from psycopg2.extras import execute_values
+
+from common.submissions import FILING_FORMS
+
+BACKFILL_YEARS = int(os.environ.get("BACKFILL_YEARS", "10"))
+
+
+def options(value, today=None):
+    """Backfill options with defaults filled in, or None when backfill is off.
+
+    `value` is true for the defaults or a dict that may set `forms`,
+    `start_date` and `end_date` (inclusive ISO dates; the range defaults to
+    the last BACKFILL_YEARS years). Raises ValueError for invalid options.
+    """
+    if not value:
+        return None
+    value = {} if value is True else dict(value)
+    today = today or date.today()
+
+    forms = value.get("forms") or FILING_FORMS
+    if isinstance(forms, str) or not all(isinstance(form, str) for form in forms):
+        raise ValueError(f"backfill forms must be a list of form types, got {forms!r}")
+    start_date = (
+        value.get("start_date")
+        or (today - timedelta(days=round(365.25 * BACKFILL_YEARS))).isoformat()
+    )
+    end_date = value.get("end_date")
+    for name, day in (("start_date", start_date), ("end_date", end_date)):
+        if day is not None:
+            try:
+                date.fromisoformat(day)
+            except (TypeError, ValueError):
+                raise ValueError(f"backfill {name} must be an ISO date, got {day!r}")
+    if end_date and end_date < start_date:
+        raise ValueError(f"backfill end_date {end_date} is before {start_date}")
+    return {"forms": list(forms), "start_date": start_date, "end_date": end_date}
+
+
+def in_range(page, start_date, end_date):
+    """Whether a `filings.files` entry can hold filings in the range."""
+    return not (
+        (start_date and page.get("filingTo", start_date) < start_date)
+        or (end_date and page.get("filingFrom", end_date) > end_date)
+    )
+
+
+def completed_pages(cur, backfill_id, ciks):
+    """{cik: set of page names} already loaded by this backfill."""
+    cur.execute(
+        """
+        SELECT cik, page
+        FROM backfill_progress
+        WHERE backfill_id = %s AND cik = ANY(%s)
+        """,
+        (backfill_id, list(ciks)),
+    )
+    completed = {}
+    for cik, page in cur.fetchall():
+        completed.setdefault(cik, set()).add(page)
+    return completed
+
+
+def record_pages(cur, backfill_id, pages):
+    """Record `(cik, page, filings)` as loaded."""
+    if not pages:
+        return
+    execute_values(
+        cur,
+        """
+        INSERT INTO backfill_progress (backfill_id, cik, page, filings)
+        VALUES %s
+        ON CONFLICT (backfill_id, cik, page) DO NOTHING
+        """,
+        [(backfill_id, cik, page, filings) for cik, page, filings in pages],
+        page_size=1000,
+    )
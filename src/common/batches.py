@@ -0,0 +1,126 @@
+"""Completion tracking for the sentiment messages of one filings-ingest run.
+
+filings-ingest registers a batch with one item per filing it queues. The
+sentiment Lambda marks items done (or failed, once SQS is about to give up
+on them) in the same transaction that stores their scores. filings-queue
+parks the Step Functions task token on the batch; whichever of the two
+sees the batch finished with a token present claims it and calls
+send_task_success, so the workflow resumes as soon as the last item lands.
+"""
+
+import json
+import logging
+from psycopg2.extras import execute_values
+
+from common import telemetry
+
+logger = logging.getLogger()
+
+DONE = "done"
+FAILED = "failed"
+
+
+def create_batch(cur, batch_id, filings):
+    """Register a batch expecting one sentiment result per (cik, accession_number)."""
+    filings = list(dict.fromkeys(filings))
+    cur.execute(
+        "INSERT INTO filing_batches (batch_id, expected) VALUES (%s, %s)",
+        (batch_id, len(filings)),
+    )
+    execute_values(
+        cur,
+        "INSERT INTO filing_batch_items (batch_id, cik, accession_number) VALUES %s",
+        [(batch_id, cik, accession_number) for cik, accession_number in filings],
+        page_size=1000,
+    )
+
+
+def finish_items(cur, items, status=DONE):
+    """Move pending items to `status`; `items` is a list of (batch_id, cik, accession_number).
+
+    Items already finished are left alone, so a message SQS delivers twice is
+    counted once. Returns the ids of the batches that were updated.
+    """
+    if not items:
+        return []
+    rows = execute_values(
+        cur,
+        """
+        WITH finished AS (
+            UPDATE filing_batch_items i
+            SET status = v.status
+            FROM (VALUES %s) AS v (batch_id, cik, accession_number, status)
+            WHERE i.batch_id = v.batch_id
+              AND i.cik = v.cik
+              AND i.accession_number = v.accession_number
+              AND i.status = 'pending'
+            RETURNING i.batch_id, i.status
+        )
+        UPDATE filing_batches b
+        SET completed = b.completed + f.done, failed = b.failed + f.failed
+        FROM (
+            SELECT batch_id,
+                   count(*) FILTER (WHERE status = 'done') AS done,
+                   count(*) FILTER (WHERE status = 'failed') AS failed
+            FROM finished
+            GROUP BY batch_id
+        ) f
+        WHERE b.batch_id = f.batch_id
+        RETURNING b.batch_id
+        """,
+        [item + (status,) for item in dict.fromkeys(items)],
+        page_size=len(items),
+        fetch=True,
+    )
+    return [batch_id for (batch_id,) in rows]
+
+
+def set_task_token(cur, batch_id, task_token):
+    cur.execute(
+        "UPDATE filing_batches SET task_token = %s WHERE batch_id = %s",
+        (task_token, batch_id),
+    )
+    if cur.rowcount == 0:
+        raise Exception(f"BadRequest: unknown batch_id {batch_id}")
+
+
+def notify_finished(cur, sfn, batch_ids):
+    """Send task success for every listed batch that is finished and has a token.
+
+    The claim and the callback share the caller's transaction: if the call to
+    Step Functions raises, the claim rolls back and the next caller retries it.
+    Returns the batches notified.
+    """
+    if not batch_ids:
+        return []
+    cur.execute(
+        """
+        UPDATE filing_batches
+        SET finished_at = now()
+        WHERE batch_id = ANY(%s)
+          AND task_token IS NOT NULL
+          AND finished_at IS NULL
+          AND completed + failed >= expected
+        RETURNING batch_id, task_token, expected, completed, failed
+        """,
+        (list(batch_ids),),
+    )
+    notified = []
+    for batch_id, task_token, expected, completed, failed in cur.fetchall():
+        output = {
+            "status": "success",
+            "message": f"All messages for batch_id {batch_id} processed",
+            "batch_id": batch_id,
+            "expected": expected,
+            "completed": completed,
+            "failed": failed,
+        }
+        try:
+            with telemetry.span("sfn.send_task_success"):
+                sfn.send_task_success(taskToken=task_token, output=json.dumps(output))
+        except (sfn.exceptions.TaskTimedOut, sfn.exceptions.InvalidToken) as e:
+            # The execution stopped waiting; nothing is left to resume
+            logger.warning(f"Task token for batch_id {batch_id} expired: {str(e)}")
+            continue
+        notified.append(output)
+    return notified
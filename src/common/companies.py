@@ -0,0 +1,252 @@
+"""Bulk upsert of company facts and filings into Postgres."""
+
+import io
+import logging
+import psycopg2
+from datetime import datetime
+from psycopg2.extras import execute_values
+
+from common import db
+
+logger = logging.getLogger()
+
+
+def get_archive_url(cik, filing):
+    accession_number_dashless = filing["accession_number"].replace("-", "")
+    return f"https://www.sec.gov/Archives/edgar/data/{cik}/{accession_number_dashless}/{filing['primary_doc']}"
+
+
+FACT_COLUMNS = [
+    "cik",
+    "sic",
+    "sic_description",
+    "owner_org",
+    "entity_name",
+    "tickers",
+    "exchanges",
+    "ein",
+    "description",
+    "website",
+    "category",
+    "state_of_incorporation",
+    "last_updated",
+]
+FILING_COLUMNS = [
+    "cik",
+    "form",
+    "filing_date",
+    "accession_number",
+    "primary_doc",
+    "archive_url",
+]
+
+
+STAGE_FILINGS = """
+    CREATE TEMP TABLE IF NOT EXISTS staged_company_filings (
+        cik TEXT, form TEXT, filing_date DATE, accession_number TEXT,
+        primary_doc TEXT, archive_url TEXT
+    ) ON COMMIT DROP;
+"""
+MERGE_FILINGS = f"""
+    INSERT INTO company_filings ({", ".join(FILING_COLUMNS)})
+    SELECT DISTINCT ON (cik, accession_number) {", ".join(FILING_COLUMNS)}
+    FROM staged_company_filings
+    ORDER BY cik, accession_number
+    ON CONFLICT (cik, accession_number) DO UPDATE
+    SET archive_url = EXCLUDED.archive_url
+    WHERE company_filings.archive_url IS DISTINCT FROM EXCLUDED.archive_url
+"""
+
+
+def save_companies(cur, companies, page_size=5000):
+    """Upsert facts and filings for many companies with one merge per table.
+
+    `companies` is a list of (cik, company_facts, filings) tuples. Rows are staged
+    into temp tables with execute_values, then merged set-wise, so the number of
+    round trips no longer grows with the number of rows.
+    """
+    cur.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS staged_company_facts
+            (LIKE company_facts INCLUDING DEFAULTS) ON COMMIT DROP;
+        """
+        + STAGE_FILINGS
+        + "TRUNCATE staged_company_facts, staged_company_filings;"
+    )
+
+    now = datetime.now()
+    fact_rows = []
+    filing_rows = []
+    for cik, company_facts, filings in companies:
+        fact_rows.append(
+            (
+                company_facts["cik"],
+                company_facts["sic"],
+                company_facts["sic_description"],
+                company_facts["owner_org"],
+                company_facts["name"],
+                company_facts["tickers"],
+                company_facts["exchanges"],
+                company_facts["ein"],
+                company_facts["description"],
+                company_facts["website"],
+                company_facts["category"],
+                company_facts["state_of_incorporation"],
+                now,
+            )
+        )
+        for filing in filings:
+            filing_rows.append(
+                (
+                    cik,
+                    filing["form"],
+                    filing["filing_date"],
+                    filing["accession_number"],
+                    filing["primary_doc"],
+                    get_archive_url(cik, filing),
+                )
+            )
+
+    execute_values(
+        cur,
+        f"INSERT INTO staged_company_facts ({', '.join(FACT_COLUMNS)}) VALUES %s",
+        fact_rows,
+        template="(%s, %s, %s, %s, %s, %s::text[], %s::text[], %s, %s, %s, %s, %s, %s)",
+        page_size=page_size,
+    )
+    execute_values(
+        cur,
+        f"INSERT INTO staged_company_filings ({', '.join(FILING_COLUMNS)}) VALUES %s",
+        filing_rows,
+        page_size=page_size,
+    )
+
+    cur.execute(
+        f"""
+        INSERT INTO company_facts ({", ".join(FACT_COLUMNS)})
+        SELECT DISTINCT ON (cik) {", ".join(FACT_COLUMNS)}
+        FROM staged_company_facts
+        ORDER BY cik
+        ON CONFLICT (cik) DO UPDATE
+        SET sic = EXCLUDED.sic,
+            sic_description = EXCLUDED.sic_description,
+            owner_org = EXCLUDED.owner_org,
+            entity_name = EXCLUDED.entity_name,
+            tickers = EXCLUDED.tickers,
+            exchanges = EXCLUDED.exchanges,
+            ein = EXCLUDED.ein,
+            description = EXCLUDED.description,
+            website = EXCLUDED.website,
+            category = EXCLUDED.category,
+            state_of_incorporation = EXCLUDED.state_of_incorporation,
+            last_updated = EXCLUDED.last_updated
+        """
+    )
+    cur.execute(MERGE_FILINGS)
+    return len(fact_rows), len(filing_rows)
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_filings(cur, filings):
+    """Upsert `(cik, filing)` pairs, staged with one COPY and merged set-wise.
+
+    For loads too large for save_companies' VALUES lists, such as a company's
+    full filing history. Returns the number of rows staged.
+    """
+    buffer = io.StringIO()
+    count = 0
+    for cik, filing in filings:
+        row = (
+            cik,
+            filing["form"],
+            filing["filing_date"],
+            filing["accession_number"],
+            filing["primary_doc"],
+            get_archive_url(cik, filing),
+        )
+        buffer.write("\t".join(map(_copy_value, row)))
+        buffer.write("\n")
+        count += 1
+    if not count:
+        return 0
+    buffer.seek(0)
+    cur.execute(STAGE_FILINGS + "TRUNCATE staged_company_filings;")
+    cur.copy_expert(
+        f"COPY staged_company_filings ({', '.join(FILING_COLUMNS)}) FROM STDIN",
+        buffer,
+        size=1 << 20,
+    )
+    cur.execute(MERGE_FILINGS)
+    return count
+
+
+def processed_hashes(cur, ciks):
+    """{cik: content hash} of the submissions document last stored per company."""
+    cur.execute(
+        """
+        SELECT cik, submissions_sha256
+        FROM company_facts
+        WHERE cik = ANY(%s) AND submissions_sha256 IS NOT NULL
+        """,
+        (list(ciks),),
+    )
+    return dict(cur.fetchall())
+
+
+def record_hashes(cur, hashes):
+    """Record `{cik: content hash}` once those companies' documents are stored."""
+    if not hashes:
+        return
+    execute_values(
+        cur,
+        """
+        UPDATE company_facts f
+        SET submissions_sha256 = v.digest
+        FROM (VALUES %s) AS v (cik, digest)
+        WHERE f.cik = v.cik
+        """,
+        list(hashes.items()),
+        page_size=1000,
+    )
+
+
+def save_companies_isolated(cur, companies):
+    """Fallback for a failed batch: one savepoint per company.
+
+    A bad company is rolled back on its own instead of discarding the good ones.
+    Returns a {cik: error message} dict for the companies that failed.
+    """
+    failed = {}
+    for company in companies:
+        try:
+            with db.savepoint(cur, "company"):
+                save_companies(cur, [company])
+        except psycopg2.Error as e:
+            failed[company[0]] = str(e)
+    return failed
+
+
+def store(companies):
+    """Upsert `companies` in one batch, isolating failures if the batch fails.
+
+    Returns a {cik: error message} dict for the companies that were dropped.
+    """
+    try:
+        with db.transaction() as cur:
+            save_companies(cur, companies)
+        return {}
+    except psycopg2.Error as e:
+        logger.warning(f"Bulk upsert failed, isolating companies: {str(e)}")
+        with db.transaction() as cur:
+            return save_companies_isolated(cur, companies)
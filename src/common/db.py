@@ -0,0 +1,180 @@
+"""One Postgres connection per warm Lambda container.
+
+Handlers open work with `with db.transaction() as cur:` instead of calling
+psycopg2.connect themselves. The connection survives between invocations, is
+health-checked after it has sat idle, and is replaced if it has gone bad.
+"""
+
+import os
+import time
+import logging
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import extensions
+
+from common import telemetry
+
+logger = logging.getLogger()
+
+# Connections idle for longer than this are pinged before being handed out
+HEALTH_CHECK_AFTER = float(os.environ.get("DB_HEALTH_CHECK_AFTER", "30"))
+
+_conn = None
+_last_used = 0.0
+stats = {
+    "connects": 0,
+    "connect_seconds": 0.0,
+    "reuses": 0,
+    "health_checks": 0,
+    "reconnects": 0,
+}
+
+
+def pooler_host(host):
+    """Neon's PgBouncer endpoint: `-pooler` appended to the endpoint id."""
+    endpoint, _, domain = host.partition(".")
+    if endpoint.endswith("-pooler"):
+        return host
+    return f"{endpoint}-pooler.{domain}"
+
+
+def connection_params():
+    host = os.environ["DB_HOST"]
+    if os.environ.get("DB_POOLER", "").lower() in ("1", "true", "yes"):
+        host = pooler_host(host)
+    params = {
+        "host": host,
+        "database": os.environ["DB_NAME"],
+        "user": os.environ["DB_USER"],
+        "password": os.environ["DB_PASSWORD"],
+        "port": os.environ.get("DB_PORT", "5432"),
+        "connect_timeout": 10,
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "application_name": os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "sec-filings"),
+    }
+    if "DB_SSLMODE" in os.environ:
+        params["sslmode"] = os.environ["DB_SSLMODE"]
+    return params
+
+
+class TimedCursor(extensions.cursor):
+    """Records every statement as a `db.execute` or `db.copy` span with its row count."""
+
+    def execute(self, query, vars=None):
+        with telemetry.span("db.execute") as span:
+            try:
+                return super().execute(query, vars)
+            finally:
+                span.add(rows=max(self.rowcount, 0))
+
+    def executemany(self, query, vars_list):
+        with telemetry.span("db.execute") as span:
+            try:
+                return super().executemany(query, vars_list)
+            finally:
+                span.add(rows=max(self.rowcount, 0))
+
+    def copy_expert(self, sql, file, size=8192):
+        with telemetry.span("db.copy") as span:
+            try:
+                return super().copy_expert(sql, file, size)
+            finally:
+                span.add(rows=max(self.rowcount, 0))
+
+
+def _connect():
+    started = time.perf_counter()
+    with telemetry.span("db.connect"):
+        conn = psycopg2.connect(**connection_params())
+    stats["connects"] += 1
+    stats["connect_seconds"] += time.perf_counter() - started
+    return conn
+
+
+def _healthy(conn):
+    if conn.closed:
+        return False
+    if conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if time.monotonic() - _last_used < HEALTH_CHECK_AFTER:
+        return True
+
+    stats["health_checks"] += 1
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error as e:
+        logger.warning(f"Discarding unhealthy database connection: {str(e)}")
+        return False
+
+
+def get_connection():
+    global _conn
+    if _conn is not None:
+        if _healthy(_conn):
+            stats["reuses"] += 1
+            return _conn
+        stats["reconnects"] += 1
+        close()
+    _conn = _connect()
+    return _conn
+
+
+def close():
+    global _conn
+    if _conn is not None:
+        try:
+            _conn.close()
+        except psycopg2.Error:
+            pass
+        _conn = None
+
+
+@contextmanager
+def transaction():
+    """Yield a cursor; commit on success, roll back and re-raise on error.
+
+    A connection broken mid-transaction is closed by psycopg2, so the next
+    call reconnects.
+    """
+    global _last_used
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=TimedCursor) as cur:
+            yield cur
+        with telemetry.span("db.commit"):
+            conn.commit()
+    except BaseException:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                close()
+        raise
+    finally:
+        _last_used = time.monotonic()
+
+
+@contextmanager
+def savepoint(cur, name="work"):
+    """Run a block under a savepoint so its failure leaves the transaction usable."""
+    cur.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except BaseException:
+        cur.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        raise
+    cur.execute(f"RELEASE SAVEPOINT {name}")
+
+
+def metrics():
+    return {
+        "connects": stats["connects"],
+        "connect_ms": round(stats["connect_seconds"] * 1000, 1),
+        "reuses": stats["reuses"],
+        "health_checks": stats["health_checks"],
+        "reconnects": stats["reconnects"],
+    }
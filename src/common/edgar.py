@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from common import telemetry
+
+USER_AGENT = "Seismiq info@seismiq.ai"
+
+# SEC fair-use policy caps automated access at 10 requests/second per client
+EDGAR_MAX_RPS = float(os.environ.get("EDGAR_MAX_RPS", "9"))
+EDGAR_TIMEOUT = float(os.environ.get("EDGAR_TIMEOUT", "30"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# One limiter and one session per warm container, shared by every worker thread
+limiter = TokenBucket(EDGAR_MAX_RPS, capacity=1)
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size=16):
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update(
+                {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"}
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def fetch(url, **kwargs):
+    """GET `url` under the shared EDGAR rate limit, retrying 429/5xx responses."""
+    session = get_session()
+    kwargs.setdefault("timeout", EDGAR_TIMEOUT)
+    with telemetry.span("edgar.fetch") as span:
+        for attempt in range(MAX_RETRIES + 1):
+            with telemetry.span("edgar.throttle"):
+                limiter.acquire()
+            response = session.get(url, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                break
+            retry_after = response.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else 2**attempt
+            response.close()
+            span.add(retries=1)
+            time.sleep(delay)
+        response.raise_for_status()
+        if not kwargs.get("stream"):
+            # Reading the body here keeps the download inside the span
+            span.add(bytes=len(response.content))
+    return response
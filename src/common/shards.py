@@ -0,0 +1,99 @@
+"""The CIK universe, and the shards the workflow's Map state fans it out into.
+
+The universe is an S3 object listing CIKs: a JSON array, or text/CSV with
+the CIK in the first column (header and `#` comment lines are skipped).
+shard-planner splits it into shards of SHARD_SIZE companies, each stored as
+a JSON array under `shards/<run_id>/`. States then pass small descriptors
+instead of CIK lists, so the workflow's payloads stay the same size however
+large the universe is:
+
+    {"run_id": ..., "shard": 3, "key": "shards/<run_id>/00003.json", "companies": 50}
+
+When a shard finishes, shard-report stores its stage stats and failed files
+next to it (`00003.stats.json`) for final-report, for the same reason.
+"""
+
+import json
+
+from common import telemetry
+
+SHARD_PREFIX = "shards"
+
+
+def parse_universe(body):
+    """CIKs in `body` (bytes) in order, without leading zeros or repeats."""
+    text = body.decode("utf-8-sig").strip()
+    if text.startswith("["):
+        values = [str(value) for value in json.loads(text)]
+    else:
+        values = [
+            line.split(",", 1)[0].strip().strip('"') for line in text.splitlines()
+        ]
+    # dict keeps the first occurrence of each CIK in the universe's order
+    return list(dict.fromkeys(str(int(v)) for v in values if v.isdigit()))
+
+
+def read_universe(s3, bucket, key):
+    with telemetry.span("s3.get") as span:
+        body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+        span.add(bytes=len(body))
+    return parse_universe(body)
+
+
+def shard_key(run_id, index):
+    return f"{SHARD_PREFIX}/{run_id}/{index:05d}.json"
+
+
+def stats_key(run_id, index):
+    return f"{SHARD_PREFIX}/{run_id}/{index:05d}.stats.json"
+
+
+def write_stats(s3, bucket, run_id, index, stats):
+    body = json.dumps(stats, separators=(",", ":"), default=str).encode()
+    with telemetry.span("s3.put", bytes=len(body)):
+        s3.put_object(
+            Bucket=bucket,
+            Key=stats_key(run_id, index),
+            Body=body,
+            ContentType="application/json",
+        )
+
+
+def read_stats(s3, bucket, run_id, index):
+    with telemetry.span("s3.get") as span:
+        body = s3.get_object(Bucket=bucket, Key=stats_key(run_id, index))["Body"].read()
+        span.add(bytes=len(body))
+    return json.loads(body)
+
+
+def plan(run_id, ciks, shard_size):
+    """[(descriptor, ciks)] for consecutive runs of `shard_size` CIKs."""
+    if shard_size < 1:
+        raise ValueError(f"shard_size must be positive, got {shard_size}")
+    return [
+        (
+            {
+                "run_id": run_id,
+                "shard": index,
+                "key": shard_key(run_id, index),
+                "companies": len(ciks[start : start + shard_size]),
+            },
+            ciks[start : start + shard_size],
+        )
+        for index, start in enumerate(range(0, len(ciks), shard_size))
+    ]
+
+
+def load_ciks(s3, bucket, event):
+    """The CIKs a handler should work on.
+
+    Workflow runs send a `shard` descriptor; a direct invocation can still
+    pass `cik_list`. Returns None when the event has neither.
+    """
+    shard = event.get("shard")
+    if shard:
+        with telemetry.span("s3.get") as span:
+            body = s3.get_object(Bucket=bucket, Key=shard["key"])["Body"].read()
+            span.add(bytes=len(body))
+        return json.loads(body)
+    return event.get("cik_list")
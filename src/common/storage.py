@@ -0,0 +1,64 @@
+import hashlib
+from urllib.parse import quote, unquote
+from botocore.exceptions import ClientError
+
+from common import telemetry
+
+HASH_METADATA_KEY = "content-sha256"
+
+
+def filing_key(cik, form, accession_number):
+    """S3 key of a filing's text: filings/<cik>/<form>_<accession>.txt.
+
+    The form is percent-encoded, so an amendment ("10-K/A") stays one path
+    segment: filings/320193/10-K%2FA_0000320193-24-000081.txt.
+    """
+    return f"filings/{cik}/{quote(form, safe='')}_{accession_number}.txt"
+
+
+def filing_of(key):
+    """(cik, form, accession_number) of a filing_key.
+
+    Parsed from the right, so keys written with a raw "/" in the form still
+    resolve to their filing.
+    """
+    _, cik, name = key.split("/", 2)
+    form, accession_number = name.rsplit("_", 1)
+    return cik, unquote(form), accession_number.removesuffix(".txt")
+
+
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def stored_hash(s3_client, bucket, key):
+    """Fingerprint recorded on the existing object, or None if there is no object."""
+    try:
+        with telemetry.span("s3.head"):
+            head = s3_client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return head.get("Metadata", {}).get(HASH_METADATA_KEY)
+
+
+def put_if_changed(s3_client, bucket, key, body, metadata=None, force=False, **kwargs):
+    """Write `body` unless the object already holds identical content.
+
+    Returns True when the object was written.
+    """
+    digest = content_hash(body)
+    if not force and stored_hash(s3_client, bucket, key) == digest:
+        telemetry.record("s3.put_skipped", objects=1, bytes=len(body))
+        return False
+
+    with telemetry.span("s3.put", bytes=len(body)):
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=body,
+            Metadata={**(metadata or {}), HASH_METADATA_KEY: digest},
+            **kwargs,
+        )
+    return True
@@ -0,0 +1,297 @@
+"""Company facts and filings from EDGAR submissions JSON.
+
+Shared by company-proc, which reads one document per company from S3,
+company-bulk, which streams them out of EDGAR's nightly submissions.zip, and
+backfill, which also pages through the older filings listed in
+`filings.files`.
+"""
+
+import json
+import os
+import re
+from itertools import islice
+
+FILING_FORMS = ["10-K", "8-K", "10-Q"]
+FILINGS_PER_COMPANY = int(os.environ.get("FILINGS_PER_COMPANY", "2"))
+
+
+def get_company_facts(company_data):
+    return {
+        "cik": company_data.get("cik"),
+        "sic": company_data.get("sic"),
+        "sic_description": company_data.get("sicDescription"),
+        "owner_org": company_data.get("ownerOrg"),
+        "name": company_data.get("name"),
+        "tickers": company_data.get("tickers") or [],
+        "exchanges": company_data.get("exchanges") or [],
+        "ein": company_data.get("ein"),
+        "description": company_data.get("description"),
+        "website": company_data.get("website"),
+        "category": company_data.get("category"),
+        "state_of_incorporation": company_data.get("stateOfIncorporation"),
+    }
+
+
+def get_recent_filings(company_data):
+    recent_filings = company_data.get("filings", {}).get("recent", {})
+    forms = recent_filings.get("form", [])
+    filing_dates = recent_filings.get("filingDate", [])
+    accession_numbers = recent_filings.get("accessionNumber", [])
+    primary_doc = recent_filings.get("primaryDocument", [])
+
+    filings = []
+    for form, filing_date, accession_number, primary_doc in zip(
+        forms, filing_dates, accession_numbers, primary_doc
+    ):
+        if form in FILING_FORMS:
+            filings.append(
+                {
+                    "form": form,
+                    "filing_date": filing_date,
+                    "accession_number": accession_number,
+                    "primary_doc": primary_doc,
+                }
+            )
+            if len(filings) == FILINGS_PER_COMPANY:
+                break
+
+    return filings
+
+
+# Lazy submissions parsing. Large filers have tens of thousands of entries in every
+# filings.recent column; json.loads materializes all of them as Python objects just
+# so we can read a couple of rows. Instead we decode the top-level facts, jump
+# straight to the four columns we use and pick out only the wanted rows.
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_RECENT = re.compile(r'"recent"\s*:\s*\{')
+_FILES = re.compile(r'"files"\s*:\s*(?=\[)')
+RECENT_COLUMNS = {
+    "form": "form",
+    "filingDate": "filing_date",
+    "accessionNumber": "accession_number",
+    "primaryDocument": "primary_doc",
+}
+_COUNT_BLOCK = 16384
+
+
+def _expect(text, pos, char):
+    pos = _WHITESPACE.match(text, pos).end()
+    if text[pos : pos + 1] != char:
+        raise ValueError(f"Expected {char!r} at offset {pos} of submissions JSON")
+    return _WHITESPACE.match(text, pos + 1).end()
+
+
+def _iter_array(text, pos):
+    """Decode the JSON array starting at `pos` one element at a time."""
+    pos = _expect(text, pos, "[")
+    if text[pos] == "]":
+        return
+    while True:
+        value, pos = _decoder.raw_decode(text, pos)
+        yield value
+        pos = _WHITESPACE.match(text, pos).end()
+        if text[pos] == "]":
+            return
+        pos = _expect(text, pos, ",")
+
+
+def _find_column(text, recent_pos, name):
+    match = re.compile(rf'"{name}"\s*:\s*(?=\[)').search(text, recent_pos)
+    return match.end() if match else None
+
+
+def _string_array_span(text, pos):
+    """(start, end) of an array of escape-free strings, or None for anything else.
+
+    Inside such an array every element is exactly two quote characters, so
+    element offsets can be found by counting quotes at C speed.
+    """
+    start = _expect(text, pos, "[")
+    end = text.find("]", start)
+    if end == -1 or text.find("\\", start, end) != -1:
+        return None
+    quotes = text.count('"', start, end)
+    if quotes % 2 or text.count(",", start, end) != max(quotes // 2 - 1, 0):
+        return None
+    return start, end
+
+
+def _string_values(text, pos, indexes):
+    """Elements at ascending `indexes` of the string array at `pos`."""
+    span = _string_array_span(text, pos)
+    if span is None:
+        values = list(islice(_iter_array(text, pos), indexes[-1] + 1))
+        return [values[i] if i < len(values) else None for i in indexes]
+
+    position, end = span
+    skipped = 0
+    values = []
+    for index in indexes:
+        # Skip whole blocks while they hold fewer quotes than we need to pass
+        remaining = 2 * index - skipped
+        while True:
+            count = text.count('"', position, min(position + _COUNT_BLOCK, end))
+            if count > remaining or position + _COUNT_BLOCK >= end:
+                break
+            remaining -= count
+            skipped += count
+            position += _COUNT_BLOCK
+        for _ in range(remaining):
+            position = text.find('"', position, end) + 1
+            if position == 0:
+                return values + [None] * (len(indexes) - len(values))
+        skipped += remaining
+        opening = text.find('"', position, end)
+        if opening == -1:
+            return values + [None] * (len(indexes) - len(values))
+        value, _ = _decoder.raw_decode(text, opening)
+        values.append(value)
+    return values
+
+
+def _form_indexes(text, pos, forms, limit):
+    span = _string_array_span(text, pos)
+    if span is None:
+        indexes = []
+        for index, form in enumerate(_iter_array(text, pos)):
+            if form in forms:
+                indexes.append(index)
+                if len(indexes) == limit:
+                    break
+        return indexes
+
+    start, end = span
+    pattern = re.compile("|".join(re.escape(f'"{form}"') for form in forms))
+    indexes = []
+    for match in pattern.finditer(text, start, end):
+        indexes.append(text.count('"', start, match.start()) // 2)
+        if len(indexes) == limit:
+            break
+    return indexes
+
+
+def parse_top_level(text):
+    """Decode top-level members up to `filings`, returning them and its offset.
+
+    EDGAR writes `filings` as the last member, so everything we need from the
+    top level comes before it.
+    """
+    company_data = {}
+    pos = _expect(text, 0, "{")
+    while text[pos] != "}":
+        key, pos = _decoder.raw_decode(text, pos)
+        pos = _expect(text, pos, ":")
+        if key == "filings":
+            return company_data, pos
+        company_data[key], pos = _decoder.raw_decode(text, pos)
+        pos = _WHITESPACE.match(text, pos).end()
+        if text[pos] == ",":
+            pos = _WHITESPACE.match(text, pos + 1).end()
+    return company_data, None
+
+
+def parse_recent_filings(
+    text, filings_pos, forms=FILING_FORMS, limit=FILINGS_PER_COMPANY
+):
+    match = _RECENT.search(text, filings_pos) if filings_pos is not None else None
+    if not match:
+        return []
+    recent_pos = match.start()
+
+    form_pos = _find_column(text, recent_pos, "form")
+    if form_pos is None:
+        return []
+    indexes = _form_indexes(text, form_pos, forms, limit)
+    if not indexes:
+        return []
+
+    filings = [{} for _ in indexes]
+    for column, field in RECENT_COLUMNS.items():
+        column_pos = _find_column(text, recent_pos, column)
+        if column_pos is None:
+            values = [None] * len(indexes)
+        else:
+            values = _string_values(text, column_pos, indexes)
+        for filing, value in zip(filings, values):
+            filing[field] = value
+    return filings
+
+
+def parse_submissions(text):
+    """Company facts and recent filings from a submissions JSON document."""
+    company_data, filings_pos = parse_top_level(text)
+    return get_company_facts(company_data), parse_recent_filings(text, filings_pos)
+
+
+# Full history for backfill. Every matching row is wanted here, so each of the
+# four columns is decoded whole with one C-level raw_decode; the other columns
+# (items, sizes, XBRL flags, descriptions...) are never turned into objects.
+def filing_columns(text, pos=0):
+    """{field: values} of the RECENT_COLUMNS in the columnar object at `pos`."""
+    columns = {}
+    for column, field in RECENT_COLUMNS.items():
+        column_pos = _find_column(text, pos, column)
+        columns[field] = (
+            _decoder.raw_decode(text, column_pos)[0] if column_pos is not None else []
+        )
+    return columns
+
+
+def select_filings(columns, forms=FILING_FORMS, start_date=None, end_date=None):
+    """Rows of `columns` with a form in `forms` filed in [start_date, end_date].
+
+    Dates are ISO strings, which compare in date order; None leaves that end
+    of the range open.
+    """
+    forms = set(forms)
+    filings = []
+    for form, filing_date, accession_number, primary_doc in zip(
+        columns["form"],
+        columns["filing_date"],
+        columns["accession_number"],
+        columns["primary_doc"],
+    ):
+        if form not in forms:
+            continue
+        if (start_date and filing_date < start_date) or (
+            end_date and filing_date > end_date
+        ):
+            continue
+        filings.append(
+            {
+                "form": form,
+                "filing_date": filing_date,
+                "accession_number": accession_number,
+                "primary_doc": primary_doc,
+            }
+        )
+    return filings
+
+
+def parse_history(text, forms=FILING_FORMS, start_date=None, end_date=None):
+    """Company facts, every matching filing in `recent`, and `filings.files`.
+
+    The files entries name the older pages of the company's history, each
+    with its `filingFrom`/`filingTo` dates, for parse_history_page.
+    """
+    company_data, filings_pos = parse_top_level(text)
+    if filings_pos is None:
+        return get_company_facts(company_data), [], []
+    match = _RECENT.search(text, filings_pos)
+    filings = (
+        select_filings(filing_columns(text, match.start()), forms, start_date, end_date)
+        if match
+        else []
+    )
+    match = _FILES.search(text, filings_pos)
+    files = _decoder.raw_decode(text, match.end())[0] if match else []
+    return get_company_facts(company_data), filings, files
+
+
+def parse_history_page(text, forms=FILING_FORMS, start_date=None, end_date=None):
+    """Matching filings of one older page (CIK##########-submissions-###.json).
+
+    A page holds the same columns as `filings.recent`, at the top level.
+    """
+    return select_filings(filing_columns(text), forms, start_date, end_date)
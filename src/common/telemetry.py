@@ -0,0 +1,171 @@
+"""Timed spans and counters per handler invocation, emitted as CloudWatch EMF.
+
+    @telemetry.instrument
+    def lambda_handler(event, context): ...
+
+    with telemetry.span("s3.get") as s:
+        body = s3.get_object(...)["Body"].read()
+        s.add(bytes=len(body))
+
+Spans with the same name aggregate into a count, total and max milliseconds,
+and summed counters (bytes, rows, tokens, retries, ...). When the handler
+returns or raises, one Embedded Metric Format record is written. In Lambda
+it goes to stdout, where CloudWatch turns it into metrics with the function
+name as dimension; with METRICS_FILE set (locally, for benchmarks) it is also
+appended there as a JSON line.
+
+Spans running on several threads or tasks at once overlap, so their totals
+can add up to more than the invocation's wall time.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "SecFilings")
+# CloudWatch accepts at most 100 metrics per EMF directive
+MAX_METRICS_PER_DIRECTIVE = 100
+
+UNITS = {"ms": "Milliseconds", "max_ms": "Milliseconds", "bytes": "Bytes"}
+
+_lock = threading.Lock()
+_spans = {}
+
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.counters = {}
+
+    def add(self, **counters):
+        for counter, value in counters.items():
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+
+def record(name, seconds=None, **counters):
+    """Fold one span (or, without `seconds`, bare counters) into the invocation."""
+    with _lock:
+        totals = _spans.setdefault(name, {"count": 0, "ms": 0.0, "max_ms": 0.0})
+        if seconds is not None:
+            ms = seconds * 1000
+            totals["count"] += 1
+            totals["ms"] += ms
+            totals["max_ms"] = max(totals["max_ms"], ms)
+        for counter, value in counters.items():
+            totals[counter] = totals.get(counter, 0) + value
+
+
+@contextmanager
+def span(name, **counters):
+    """Time the block as `name`; counters added to the yielded Span are summed."""
+    current = Span(name)
+    current.add(**counters)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.add(errors=1)
+        raise
+    finally:
+        record(name, time.perf_counter() - started, **current.counters)
+
+
+def timed(name):
+    """Decorator form of span() for a function."""
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+
+
+def snapshot():
+    """{span: {count, ms, max_ms, counters...}} recorded so far, rounded."""
+    with _lock:
+        return {
+            name: {
+                k: round(v, 1) if isinstance(v, float) else v for k, v in totals.items()
+            }
+            for name, totals in sorted(_spans.items())
+        }
+
+
+def emf_record(function, spans, properties=None):
+    """An EMF log record with every span measure as a metric."""
+    values = {}
+    definitions = []
+    for name, totals in spans.items():
+        for measure, value in totals.items():
+            if measure in ("count", "ms", "max_ms") and not totals["count"]:
+                continue
+            metric = f"{name}.{measure}"
+            values[metric] = value
+            definitions.append({"Name": metric, "Unit": UNITS.get(measure, "Count")})
+    return {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [["Function"]],
+                    "Metrics": definitions[i : i + MAX_METRICS_PER_DIRECTIVE],
+                }
+                for i in range(0, len(definitions), MAX_METRICS_PER_DIRECTIVE)
+            ],
+        },
+        "Function": function,
+        **(properties or {}),
+        **values,
+    }
+
+
+def flush(function, properties=None):
+    """Emit the invocation's spans and start over; returns the EMF record."""
+    emf = emf_record(function, snapshot(), properties)
+    reset()
+    line = json.dumps(emf, separators=(",", ":"), default=str)
+    if "AWS_LAMBDA_FUNCTION_NAME" in os.environ:
+        print(line, flush=True)
+    path = os.environ.get("METRICS_FILE")
+    if path:
+        with _lock, open(path, "a") as sink:
+            sink.write(line + "\n")
+    return emf
+
+
+def instrument(handler):
+    """Wrap a lambda_handler in a `handler` span and flush its metrics at the end."""
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        function = os.environ.get(
+            "AWS_LAMBDA_FUNCTION_NAME", handler.__module__.removesuffix("_handler")
+        )
+        reset()
+        status = "error"
+        try:
+            with span("handler"):
+                result = handler(event, context)
+            status = "ok"
+            return result
+        finally:
+            properties = {"Status": status}
+            if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+                # How much of the function timeout the invocation left unused
+                properties["RemainingMs"] = context.get_remaining_time_in_millis()
+            flush(function, properties)
+
+    return wrapper
@@ -0,0 +1,87 @@
+"""Bulk loading of pgvector embeddings with binary COPY.
+
+Rows are streamed to Postgres in COPY's binary format, with each vector in
+pgvector's wire format (int16 dimensions, int16 unused, big-endian float4
+values), so no vector is ever rendered as text.
+"""
+
+import struct
+import sys
+from array import array
+
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+# Field count, then (length, value) for filing_id and chunk_index, then the
+# vector's length and its own dimension/unused header
+_ROW = struct.Struct(">hiiiiihh")
+
+
+def rows(buffer, dim):
+    """Views of each `dim`-value row of a float32 buffer, without copying."""
+    view = memoryview(buffer).cast("B")
+    width = 4 * dim
+    return [view[start : start + width] for start in range(0, len(view), width)]
+
+
+def encode_row(filing_id, chunk_index, vector):
+    """One COPY row; `vector` is a buffer of native-order float32 values."""
+    values = array("f")
+    values.frombytes(memoryview(vector).cast("B"))
+    if sys.byteorder == "little":
+        values.byteswap()
+    dim = len(values)
+    header = _ROW.pack(3, 4, filing_id, 4, chunk_index, 4 + 4 * dim, dim, 0)
+    return header + values.tobytes()
+
+
+class CopyStream:
+    """File-like reader producing a binary COPY stream from `rows` on demand.
+
+    A read returns whole rows, so it can run slightly past `size`; psycopg2
+    sends each read as it comes.
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.started = False
+        self.done = False
+        self.count = 0
+
+    def read(self, size=-1):
+        if self.done:
+            return b""
+        parts, length = [], 0
+        if not self.started:
+            parts.append(COPY_HEADER)
+            self.started = True
+        for row in self.rows:
+            part = encode_row(*row)
+            parts.append(part)
+            length += len(part)
+            self.count += 1
+            if 0 <= size <= length:
+                return b"".join(parts)
+        parts.append(COPY_TRAILER)
+        self.done = True
+        return b"".join(parts)
+
+
+def copy_embeddings(cur, filing_ids, rows):
+    """Replace the embeddings of `filing_ids` with `rows`, returning the row count.
+
+    `rows` yields `(filing_id, chunk_index, vector)`, each vector a float32
+    buffer, and is consumed lazily.
+    Existing chunks of those filings are deleted first, so a filing that now
+    splits into fewer chunks keeps no stale ones.
+    """
+    cur.execute(
+        "DELETE FROM filing_embeddings WHERE filing_id = ANY(%s)", (list(filing_ids),)
+    )
+    stream = CopyStream(rows)
+    cur.copy_expert(
+        "COPY filing_embeddings (filing_id, chunk_index, embedding) "
+        "FROM STDIN WITH (FORMAT binary)",
+        stream,
+        size=1 << 20,
+    )
+    return stream.count
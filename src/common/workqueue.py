@@ -0,0 +1,137 @@
+"""Leases on company_filings rows, so concurrent workers split the backlog.
+
+Each stage a filing goes through has its own status column (`ingest_status`,
+`embedding_status`, `sentiment_status`: pending, done or failed). A worker
+claims up to `limit` filings its stage still has to do with
+FOR UPDATE SKIP LOCKED, so rows another worker is claiming at that moment
+are passed over instead of waited on, and stamps them with a lease: its
+owner id and an expiry. Leased rows are left out of every other claim until
+the lease runs out, so two runs never take the same filing, and a worker
+that dies only holds its filings back until then. Finishing a filing ends
+its owner's lease, so the next stage can claim it right away; filings-ingest
+does not take a filing it stored back unless a later stage failed on it.
+
+    with db.transaction() as cur:
+        filings = workqueue.claim(cur, "ingest", batch_id, 100, 600)
+    ...
+    with db.transaction() as cur:
+        workqueue.finish(cur, "ingest", done, owner=batch_id)
+        workqueue.finish(cur, "ingest", failed, workqueue.FAILED, batch_id)
+
+A failure, or a lease that ran out before its worker finished, counts as an
+attempt; filings with MAX_ATTEMPTS attempts are not claimed again (reset
+`attempts` to retry them).
+"""
+
+import os
+from psycopg2.extras import execute_values
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+MAX_ATTEMPTS = int(os.environ.get("WORK_MAX_ATTEMPTS", "5"))
+
+# Filings some stage still has to finish. Written exactly as the predicate of
+# the idx_company_filings_unfinished partial index, so claims can use it.
+UNFINISHED = "(embedding_status <> 'done' OR sentiment_status <> 'done')"
+
+# What each claiming stage still has to do. filings-ingest takes a filing it
+# has not stored yet, or one a later stage failed on, since both read its
+# text; one it stored that is still being embedded or scored is left to them.
+CLAIMS = {
+    "ingest": f"""{UNFINISHED} AND (
+        ingest_status <> 'done'
+        OR embedding_status = 'failed'
+        OR sentiment_status = 'failed'
+    )""",
+    "embedding": "ingest_status = 'done' AND embedding_status <> 'done'",
+}
+STATUS_COLUMNS = {
+    "ingest": "ingest_status",
+    "embedding": "embedding_status",
+    "sentiment": "sentiment_status",
+}
+
+
+def claim(cur, stage, owner, limit, lease_seconds, ciks=None, filings=None):
+    """Lease up to `limit` filings pending for `stage` to `owner`.
+
+    `limit` None claims every one available; `ciks` restricts the claim to
+    those companies, `filings` to those `(cik, accession_number)` pairs.
+    Returns (cik, accession_number, form, archive_url) rows.
+    """
+    pairs = list(dict.fromkeys(filings or ()))
+    cur.execute(
+        f"""
+        WITH claimable AS (
+            SELECT id
+            FROM company_filings
+            WHERE {CLAIMS[stage]}
+              AND lease_expires_at < now()
+              AND attempts < %s
+              AND (%s OR cik = ANY(%s::text[]))
+              AND (%s OR (cik, accession_number) IN (
+                  SELECT * FROM unnest(%s::text[], %s::text[])
+              ))
+            -- Never-leased filings first, then the longest expired; in the
+            -- partial index's order, so leased rows are not even read
+            ORDER BY lease_expires_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE company_filings f
+        SET lease_owner = %s,
+            lease_expires_at = now() + make_interval(secs => %s),
+            -- Still owned, so the last worker's lease ran out
+            attempts = f.attempts + (f.lease_owner IS NOT NULL)::int
+        FROM claimable c
+        WHERE f.id = c.id
+        RETURNING f.cik, f.accession_number, f.form, f.archive_url
+        """,
+        (
+            MAX_ATTEMPTS,
+            ciks is None,
+            ciks or [],
+            filings is None,
+            [cik for cik, _ in pairs],
+            [accession_number for _, accession_number in pairs],
+            limit,
+            owner,
+            lease_seconds,
+        ),
+    )
+    return cur.fetchall()
+
+
+def finish(cur, stage, filings, status=DONE, owner=None):
+    """Set `stage`'s status on `(cik, accession_number)` filings in one statement.
+
+    Ends `owner`'s lease on them; leases held by others are kept, as a filing
+    done with one stage may still be in flight in another. FAILED counts as
+    an attempt. Returns {(cik, accession_number): filing_id} for the filings
+    that exist.
+    """
+    if not filings:
+        return {}
+    rows = execute_values(
+        cur,
+        f"""
+        UPDATE company_filings f
+        SET {STATUS_COLUMNS[stage]} = v.status,
+            attempts = f.attempts + (v.status = '{FAILED}')::int,
+            lease_owner = CASE
+                WHEN f.lease_owner = v.owner THEN NULL ELSE f.lease_owner
+            END,
+            lease_expires_at = CASE
+                WHEN f.lease_owner = v.owner THEN '-infinity' ELSE f.lease_expires_at
+            END
+        FROM (VALUES %s) AS v (cik, accession_number, status, owner)
+        WHERE f.cik = v.cik AND f.accession_number = v.accession_number
+        RETURNING f.cik, f.accession_number, f.id
+        """,
+        [filing + (status, owner) for filing in dict.fromkeys(filings)],
+        page_size=len(filings),
+        fetch=True,
+    )
+    return {(cik, accession_number): id for cik, accession_number, id in rows}
@@ -0,0 +1,209 @@
+"""Members of a ZIP archive, read front to back from a stream that cannot seek.
+
+zipfile starts from the central directory at the end of the archive, so it
+needs the whole file on disk or in memory. EDGAR's bulk submissions.zip is
+several GB; this walks the local file headers in order instead, so the
+archive is consumed as it downloads:
+
+    for member in zipstream.members(response.raw):
+        if member.name in wanted:
+            body = member.read()
+
+Members that are not read are skipped, without inflating them when the
+header gives their compressed size. Stored and deflated members are
+supported, including zip64 sizes and trailing data descriptors.
+"""
+
+import struct
+import zlib
+
+CHUNK_SIZE = 1 << 20
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+# Central directory and end of archive records follow the last member
+_END_SIGNATURES = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06")
+_ZIP64_EXTRA = 0x0001
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ENCRYPTED = 0x1
+_HAS_DESCRIPTOR = 0x8
+_UTF8_NAME = 0x800
+_STORED, _DEFLATED = 0, 8
+
+
+class _Stream:
+    """Reads of exact sizes over a raw stream, with over-read bytes pushed back."""
+
+    def __init__(self, raw, chunk_size):
+        self.raw = raw
+        self.chunk_size = chunk_size
+        self.pending = b""
+        self.position = 0
+
+    def read(self, size):
+        """Up to `size` bytes; empty only at the end of the stream."""
+        if self.pending:
+            data, self.pending = self.pending[:size], self.pending[size:]
+        else:
+            data = self.raw.read(min(size, self.chunk_size))
+        self.position += len(data)
+        return data
+
+    def read_exact(self, size):
+        parts = []
+        while size:
+            data = self.read(size)
+            if not data:
+                raise ValueError(f"ZIP archive truncated at offset {self.position}")
+            parts.append(data)
+            size -= len(data)
+        return b"".join(parts)
+
+    def discard(self, size):
+        while size:
+            data = self.read(min(size, self.chunk_size))
+            if not data:
+                raise ValueError(f"ZIP archive truncated at offset {self.position}")
+            size -= len(data)
+
+    def unread(self, data):
+        self.pending = data + self.pending
+        self.position -= len(data)
+
+
+class Member:
+    def __init__(self, stream, name, flags, method, crc, compressed_size, size, zip64):
+        self.name = name
+        self.method = method
+        self.crc = crc
+        # Both are 0 in the local header when a data descriptor follows
+        self.compressed_size = compressed_size
+        self.size = size
+        self._stream = stream
+        self._descriptor = bool(flags & _HAS_DESCRIPTOR)
+        self._zip64 = zip64
+        self._consumed = False
+
+    def chunks(self):
+        """The member's uncompressed content, a block at a time."""
+        if self._consumed:
+            raise ValueError(f"ZIP member {self.name} was already read")
+        self._consumed = True
+        stream = self._stream
+        crc = 0
+        if self.method == _STORED:
+            remaining = self.compressed_size
+            while remaining:
+                data = stream.read(remaining)
+                if not data:
+                    raise ValueError(f"ZIP archive truncated in {self.name}")
+                remaining -= len(data)
+                crc = zlib.crc32(data, crc)
+                yield data
+        else:
+            inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+            # Without a size, read until the deflate stream says it is done
+            remaining = None if self._descriptor else self.compressed_size
+            while not inflater.eof:
+                data = stream.read(CHUNK_SIZE if remaining is None else remaining)
+                if not data:
+                    raise ValueError(f"ZIP archive truncated in {self.name}")
+                if remaining is not None:
+                    remaining -= len(data)
+                block = inflater.decompress(data)
+                crc = zlib.crc32(block, crc)
+                yield block
+            if inflater.unused_data:
+                stream.unread(inflater.unused_data)
+            if remaining:
+                stream.discard(remaining)
+        if self._descriptor:
+            self._read_descriptor()
+        if crc != self.crc:
+            raise ValueError(f"CRC mismatch in ZIP member {self.name}")
+
+    def read(self):
+        return b"".join(self.chunks())
+
+    def skip(self):
+        if self._consumed:
+            return
+        if self._descriptor:
+            for _ in self.chunks():
+                pass
+        else:
+            self._consumed = True
+            self._stream.discard(self.compressed_size)
+
+    def _read_descriptor(self):
+        signature = self._stream.read_exact(4)
+        if signature != _DESCRIPTOR_SIGNATURE:
+            # The signature is optional; without it these bytes are the CRC
+            self._stream.unread(signature)
+        sizes = "<IQQ" if self._zip64 else "<III"
+        self.crc, self.compressed_size, self.size = struct.unpack(
+            sizes, self._stream.read_exact(struct.calcsize(sizes))
+        )
+
+
+def _zip64_sizes(extra, compressed_size, size):
+    pos = 0
+    while pos + 4 <= len(extra):
+        field, length = struct.unpack_from("<HH", extra, pos)
+        if field == _ZIP64_EXTRA:
+            values = iter(struct.unpack_from(f"<{length // 8}Q", extra, pos + 4))
+            # Only the sizes that overflowed the header are present, in order
+            if size == _ZIP64_LIMIT:
+                size = next(values)
+            if compressed_size == _ZIP64_LIMIT:
+                compressed_size = next(values)
+            return compressed_size, size, True
+        pos += 4 + length
+    return compressed_size, size, False
+
+
+def members(raw, chunk_size=CHUNK_SIZE):
+    """Yield each Member of the archive read from `raw` (anything with read(n)).
+
+    A member has to be read before the iteration moves on; any that is not
+    is skipped when the next one is requested.
+    """
+    stream = _Stream(raw, chunk_size)
+    while True:
+        signature = stream.read_exact(4)
+        if signature in _END_SIGNATURES:
+            return
+        if signature != _LOCAL_SIGNATURE:
+            raise ValueError(
+                f"Not a ZIP local file header at offset {stream.position - 4}"
+            )
+        (
+            _,
+            _,
+            flags,
+            method,
+            _,
+            _,
+            crc,
+            compressed_size,
+            size,
+            name_length,
+            extra_length,
+        ) = _LOCAL_HEADER.unpack(signature + stream.read_exact(_LOCAL_HEADER.size - 4))
+        name = stream.read_exact(name_length).decode(
+            "utf-8" if flags & _UTF8_NAME else "cp437"
+        )
+        compressed_size, size, zip64 = _zip64_sizes(
+            stream.read_exact(extra_length), compressed_size, size
+        )
+        if flags & _ENCRYPTED:
+            raise ValueError(f"ZIP member {name} is encrypted")
+        if method not in (_STORED, _DEFLATED):
+            raise ValueError(f"ZIP member {name} uses unsupported method {method}")
+        if method == _STORED and flags & _HAS_DESCRIPTOR:
+            raise ValueError(f"ZIP member {name} is stored without a size")
+
+        member = Member(stream, name, flags, method, crc, compressed_size, size, zip64)
+        yield member
+        member.skip()
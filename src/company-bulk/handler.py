@@ -0,0 +1,128 @@
+import boto3
+import os
+import re
+import time
+import psycopg2
+import logging
+from dotenv import load_dotenv
+
+from common import companies as company_store, db, edgar, shards, telemetry, zipstream
+from common.submissions import parse_submissions
+
+load_dotenv()
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Rebuilt nightly by EDGAR: one submissions JSON per company, several GB in all
+BULK_SUBMISSIONS_URL = os.environ.get(
+    "BULK_SUBMISSIONS_URL",
+    "https://www.sec.gov/Archives/edgar/daily-index/bulkdata/submissions.zip",
+)
+# Companies parsed before each bulk upsert; bounds what is held in memory
+BULK_BATCH_COMPANIES = int(os.environ.get("BULK_BATCH_COMPANIES", "500"))
+# The main document per company; CIK##########-submissions-###.json members
+# only hold older filings beyond filings.recent
+_MAIN_MEMBER = re.compile(r"CIK(\d{10})\.json")
+
+
+def ingest_archive(raw, universe, batch_size=BULK_BATCH_COMPANIES):
+    """Parse and store the universe's companies from a submissions.zip stream.
+
+    `raw` is the archive as a file-like object, read once from the start;
+    `universe` is a set of CIKs. Returns (saved, failed, stats), with failed
+    a list of {"cik", "message"} dicts.
+    """
+    saved, failed = 0, []
+    batch = []
+    stats = {"members": 0, "matched": 0, "bytes": 0}
+
+    def flush():
+        nonlocal saved, batch
+        errors = company_store.store(batch)
+        for cik, message in errors.items():
+            failed.append({"cik": cik, "message": message})
+        saved += len(batch) - len(errors)
+        batch = []
+
+    for member in zipstream.members(raw):
+        stats["members"] += 1
+        match = _MAIN_MEMBER.fullmatch(member.name)
+        if not match or str(int(match.group(1))) not in universe:
+            continue
+        cik = str(int(match.group(1)))
+        stats["matched"] += 1
+        try:
+            with telemetry.span("parse") as span:
+                body = member.read()
+                span.add(bytes=len(body))
+                company_facts, recent_filings = parse_submissions(body.decode("utf-8"))
+            stats["bytes"] += len(body)
+        except Exception as e:
+            logger.error(f"Error processing CIK {cik}: {str(e)}")
+            failed.append({"cik": cik, "message": str(e)})
+            continue
+        batch.append((cik, company_facts, recent_filings))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return saved, failed, stats
+
+
+@telemetry.instrument
+def lambda_handler(event, context):
+    """Load every company of the universe from EDGAR's bulk submissions archive.
+
+    The alternative to company-ingest and company-proc for large universes:
+    one download instead of a request per company, streamed member by member
+    and never written to disk.
+    """
+    s3 = boto3.client("s3")
+    bucket_name = os.environ["S3_BUCKET"]
+
+    if event.get("universe_key"):
+        universe = set(shards.read_universe(s3, bucket_name, event["universe_key"]))
+    else:
+        universe = set(shards.load_ciks(s3, bucket_name, event) or [])
+    if not universe:
+        raise Exception("BadRequest: No CIK values provided")
+
+    try:
+        url = event.get("archive_url", BULK_SUBMISSIONS_URL)
+        started = time.monotonic()
+        response = edgar.fetch(url, stream=True)
+        try:
+            response.raw.decode_content = True
+            saved, failed, stats = ingest_archive(response.raw, universe)
+        finally:
+            response.close()
+        elapsed = time.monotonic() - started
+
+        stats.update(
+            {
+                "requested": len(universe),
+                "saved": saved,
+                "failed": len(failed),
+                "missing": len(universe) - stats["matched"],
+                "elapsed_s": round(elapsed, 2),
+                "companies_per_s": round(saved / elapsed, 2) if elapsed else 0,
+            }
+        )
+        telemetry.record(
+            "companies",
+            requested=len(universe),
+            saved=saved,
+            failed=len(failed),
+            members=stats["members"],
+        )
+        logger.info(f"CompanyBulk stats: {stats}")
+        logger.info(f"DB connection stats: {db.metrics()}")
+
+        return {"CompanyBulk": "OK", "failed": failed, "stats": stats}
+    except psycopg2.Error as e:
+        logger.error(f"Database error: {str(e)}")
+        raise Exception(f"DatabaseConnectionError: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error in lambda_handler: {str(e)}")
+        raise Exception(f"InternalServerError: {str(e)}")
@@ -1,48 +1,128 @@
 import boto3
+import psycopg2
 import requests
-import json
 import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from common import companies as company_store, db, edgar, shards, storage, telemetry
+
 load_dotenv()
 
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+MAX_WORKERS = int(os.environ.get("EDGAR_WORKERS", "8"))
+
+
+def fetch_submissions(s3_client, bucket_name, cik, processed_hash=None, force=False):
+    cik_padded = cik.zfill(10)
+    started = time.monotonic()
+    try:
+        url = f"https://data.sec.gov/submissions/CIK{cik_padded}.json"
+        response = edgar.fetch(url)
+
+        # Store the payload as received; company-proc does the parsing.
+        # Identical payloads are not rewritten.
+        key = f"submissions/CIK{cik_padded}.json"
+        storage.put_if_changed(
+            s3_client,
+            bucket_name,
+            key,
+            response.content,
+            force=force,
+            ContentType="application/json",
+        )
+        # Unchanged since company-proc last stored it: the company drops out
+        # of the run. Compared with what was processed rather than what is in
+        # S3, so a company-proc failure leaves the company to the next run.
+        changed = force or storage.content_hash(response.content) != processed_hash
+        result = {"cik": cik, "status": "success", "changed": changed}
+    except requests.RequestException as e:
+        result = {"cik": cik, "status": "error", "message": str(e)}
+    except Exception as e:
+        result = {"cik": cik, "status": "error", "message": str(e)}
+
+    result["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return result
 
+
+def summarize(results, elapsed):
+    latencies = sorted(r["latency_ms"] for r in results)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    return {
+        "requested": len(results),
+        "succeeded": sum(1 for r in results if r["status"] == "success"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "changed": sum(1 for r in results if r.get("changed")),
+        "elapsed_s": round(elapsed, 2),
+        "requests_per_s": round(len(results) / elapsed, 2) if elapsed else 0,
+        "latency_ms": {
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "max": latencies[-1],
+        },
+        "slowest": [
+            {"cik": r["cik"], "latency_ms": r["latency_ms"]}
+            for r in sorted(results, key=lambda r: r["latency_ms"])[-5:]
+        ],
+    }
+
+
+@telemetry.instrument
 def lambda_handler(event, context):
     try:
-        cik_list = event.get("cik_list", [])
+        s3_client = boto3.client("s3")
+        bucket_name = os.environ["S3_BUCKET"]
+
+        # A shard descriptor from the workflow's Map state, or a plain cik_list
+        cik_list = shards.load_ciks(s3_client, bucket_name, event)
+        force = event.get("force", False) or (event.get("shard") or {}).get(
+            "force", False
+        )
 
         if not cik_list:
             raise ValueError("No CIK values provided")
 
-        results = []
-        for cik in cik_list:
-            cik_padded = cik.zfill(10)
-
-            try:
-                url = f"https://data.sec.gov/submissions/CIK{cik_padded}.json"
-                headers = {"User-Agent": "Seismiq info@seismiq.ai"}
-                response = requests.get(url, headers=headers)
-                response.raise_for_status()
-                company_submissions = response.json()
-
-                s3_client = boto3.client("s3")
-                bucket_name = os.environ["S3_BUCKET"]
-                file_name = f"submissions/CIK{cik_padded}.json"
-
-                s3_client.put_object(
-                    Bucket=bucket_name,
-                    Key=file_name,
-                    Body=json.dumps(company_submissions),
-                    ContentType="application/json",
+        with db.transaction() as cur:
+            processed = company_store.processed_hashes(cur, cik_list)
+
+        # Workers share one session, one S3 client and the EDGAR rate limiter
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = list(
+                executor.map(
+                    lambda cik: fetch_submissions(
+                        s3_client, bucket_name, cik, processed.get(cik), force
+                    ),
+                    cik_list,
                 )
+            )
+        stats = summarize(results, time.monotonic() - started)
+        telemetry.record(
+            "companies",
+            requested=stats["requested"],
+            changed=stats["changed"],
+            failed=stats["failed"],
+        )
+
+        for result in results:
+            if result["status"] == "error":
+                logger.error(f"Error fetching CIK {result['cik']}: {result['message']}")
+        logger.info(f"CompanyIngest stats: {stats}")
 
-                results.append({"cik": cik, "status": "success"})
-            except requests.RequestException as e:
-                results.append({"cik": cik, "status": "error", "message": str(e)})
-            except Exception as e:
-                results.append({"cik": cik, "status": "error", "message": str(e)})
+        # Only companies whose submissions changed continue down the pipeline
+        changed_ciks = [r["cik"] for r in results if r.get("changed")]
 
-        return {"CompanyIngest": "OK"}
+        return {"CompanyIngest": "OK", "cik_list": changed_ciks, "stats": stats}
+    except psycopg2.Error as e:
+        logger.error(f"Database error: {str(e)}")
+        raise Exception(f"DatabaseConnectionError: {str(e)}")
     except ValueError as e:
         raise Exception(f"BadRequest: {str(e)}")
     except Exception as e:
@@ -1,124 +1,650 @@
-import json
+import asyncio
 import boto3
+import base64
+import codecs
+import functools
+import hashlib
 import os
 import psycopg2
 import openai
 import logging
+import re
+import tiktoken
+import time
+import uuid
+from array import array
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from psycopg2.extras import execute_values
+
+from common import db, storage, telemetry, vectors, workqueue
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 1536
+# Per-request limits; the API allows 2048 inputs and 300k tokens per request.
+# Smaller requests give the scheduler more to balance and make a retry cheaper.
+BATCH_MAX_INPUTS = int(os.environ.get("EMBED_BATCH_INPUTS", "2048"))
+BATCH_MAX_TOKENS = int(os.environ.get("EMBED_BATCH_TOKENS", "50000"))
+# Requests in flight: starting point and ceiling for the AIMD limit
+CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+MAX_CONCURRENCY = int(os.environ.get("EMBED_MAX_CONCURRENCY", "32"))
+# A request slower than this is read as the API saturating
+LATENCY_TARGET = float(os.environ.get("EMBED_LATENCY_TARGET_S", "15"))
+TOKENS_PER_MINUTE = int(os.environ.get("EMBED_TPM", "1000000"))
+CHUNK_TOKENS = int(os.environ.get("EMBED_CHUNK_TOKENS", "1000"))
+CHUNK_OVERLAP = int(os.environ.get("EMBED_CHUNK_OVERLAP", "100"))
+# Filings an invocation without file_names claims from the backlog, and how
+# long they stay leased to it
+CLAIM_LIMIT = int(os.environ.get("EMBED_CLAIM_LIMIT", "100"))
+LEASE_SECONDS = int(os.environ.get("EMBED_LEASE_SECONDS", "900"))
+# A chunk this full closes at the next paragraph break instead of mid-paragraph
+PARAGRAPH_FILL = 0.75
+# Text without sentence breaks is cut into segments of at most this size
+MAX_SEGMENT_CHARS = 16384
+
+# End of a sentence (punctuation, closing quotes or brackets, whitespace) or of
+# a paragraph; a segment runs up to the end of the match
+_BOUNDARY = re.compile(r"[.!?][\"')\]]*\s+|\n\s*\n")
+_PARAGRAPH_END = re.compile(r"\n\s*\n\s*$")
+
+_client = None
+_loop = None
+
+
+def get_client():
+    """Return the container's async OpenAI client, creating it on first use.
+
+    Retries are left to EmbeddingBatcher, which needs to see each 429.
+    """
+    global _client
+    if _client is None:
+        _client = openai.AsyncOpenAI(
+            api_key=os.environ["OPENAI_API_KEY"], max_retries=0
+        )
+    return _client
+
+
+def run(coroutine):
+    """Run `coroutine` on the container's event loop.
+
+    The loop outlives the invocation so the client's connections stay usable
+    in the next one.
+    """
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coroutine)
+
+
+@functools.cache
+def get_encoder():
+    """The model's tokenizer, loaded once per container."""
+    return tiktoken.encoding_for_model(EMBEDDING_MODEL)
+
+
+def decode(blocks):
+    """Text of an iterable of UTF-8 byte blocks, decoded as they arrive."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for block in blocks:
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+
+def _segments(pieces):
+    """Sentences and paragraphs of the text streamed in as `pieces`."""
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        start = 0
+        for match in _BOUNDARY.finditer(buffer):
+            # Whitespace at the end of the buffer may continue in the next piece
+            if match.end() == len(buffer):
+                break
+            yield buffer[start : match.end()]
+            start = match.end()
+        buffer = buffer[start:]
+        # No sentence break in sight (tables, lists); cut between words
+        if len(buffer) > MAX_SEGMENT_CHARS:
+            cut = buffer.rfind(" ") + 1 or len(buffer)
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+
+def _counted(segments, limit):
+    """Pair segments with their token counts, cutting any over `limit` tokens."""
+    encoder = get_encoder()
+    for segment in segments:
+        tokens = encoder.encode_ordinary(segment)
+        if len(tokens) <= limit:
+            yield segment, len(tokens)
+            continue
+        for start in range(0, len(tokens), limit):
+            part = tokens[start : start + limit]
+            yield encoder.decode(part), len(part)
+
+
+def chunk_text(pieces, target_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP):
+    """Yield `(text, tokens)` chunks from text streamed in as `pieces`.
 
-def get_embedding(text):
-    openai.api_key = os.environ["OPENAI_API_KEY"]
-    response = openai.embeddings.create(input=text, model="text-embedding-3-small")
-    return response.data[0].embedding
+    Whole sentences are packed into a chunk until the next one would pass
+    `target_tokens`; a chunk that is mostly full also closes at the end of a
+    paragraph. Each chunk starts with up to `overlap_tokens` of trailing
+    sentences from the one before it. A sentence longer than the target is cut
+    on token boundaries. Counts are summed per sentence, so they can differ
+    from an encoding of the joined text by a token at a seam.
+    """
+    chunk, tokens, fresh = [], 0, False
 
-def chunk_text(text, chunk_size=7200):
-    return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
+    def carry_over():
+        kept, kept_tokens = [], 0
+        for segment, count in reversed(chunk):
+            if kept_tokens + count > overlap_tokens:
+                break
+            kept.insert(0, (segment, count))
+            kept_tokens += count
+        return kept, kept_tokens
 
-def process_file(bucket, key):
+    for segment, count in _counted(_segments(pieces), target_tokens):
+        if fresh and tokens + count > target_tokens:
+            yield "".join(s for s, _ in chunk).strip(), tokens
+            chunk, tokens = carry_over()
+            fresh = False
+        while chunk and tokens + count > target_tokens:
+            tokens -= chunk.pop(0)[1]
+
+        chunk.append((segment, count))
+        tokens += count
+        fresh = True
+        if tokens >= target_tokens * PARAGRAPH_FILL and _PARAGRAPH_END.search(segment):
+            yield "".join(s for s, _ in chunk).strip(), tokens
+            chunk, tokens = carry_over()
+            fresh = False
+
+    if fresh:
+        yield "".join(s for s, _ in chunk).strip(), tokens
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on embedding requests in flight.
+
+    Each successful request adds about 1/limit, so the limit grows by one per
+    round of requests. A 429 halves it, and a request slower than
+    `latency_target` cuts it by a quarter. Requests that started before the
+    last cut cannot cut it again, so a burst of 429s from one round counts once.
+    """
+
+    def __init__(self, start, minimum, maximum, latency_target):
+        self.limit = float(start)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+        self.decreased_at = 0.0
+        self.stats = {"peak": 0, "increases": 0, "decreases": 0}
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            self.stats["peak"] = max(self.stats["peak"], self.in_flight)
+        return time.monotonic()
+
+    async def release(self, started, throttled=False):
+        latency = time.monotonic() - started
+        if throttled or latency > self.latency_target:
+            if started >= self.decreased_at:
+                factor = 0.5 if throttled else 0.75
+                self.limit = max(self.minimum, self.limit * factor)
+                self.decreased_at = time.monotonic()
+                self.stats["decreases"] += 1
+        elif self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.stats["increases"] += 1
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+
+class TokenBudget:
+    """Tokens-per-minute bucket; `acquire` waits until a request's tokens fit."""
+
+    def __init__(self, tokens_per_minute):
+        self.rate = tokens_per_minute / 60
+        self.capacity = tokens_per_minute
+        self.tokens = tokens_per_minute
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        """Take `tokens` from the bucket, returning the seconds spent waiting."""
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, or None."""
+    headers = error.response.headers
     try:
-        s3 = boto3.client("s3")
-        response = s3.get_object(Bucket=bucket, Key=key)
-        content = response["Body"].read().decode("utf-8")
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
 
-        chunks = chunk_text(content)
 
-        embeddings = []
-        for chunk in chunks:
-            embedding = get_embedding(chunk)
-            embeddings.append(embedding)
+class EmbeddingBatcher:
+    """Packs chunks from many files into multi-input embedding requests.
 
-        # Extract cik, form, and accession_number from the key
-        parts = key.split("/")
-        cik = parts[1]
-        form, accession_number = parts[2].split("_")
-        accession_number = accession_number.split(".")[0]  # Remove file extension
+    Inputs are `(ref, text, tokens)` triples; `embed` returns `{ref: embedding}`,
+    each embedding the raw float32 bytes of the vector, for every input that
+    succeeded and records the rest in `failed`.
+
+    Requests run on one event loop under an AdaptiveConcurrency limit and a
+    TokenBudget. A 429 pauses all sends for its Retry-After and retries only
+    that request. A sub-batch the API rejects outright is split in half until
+    the bad input is isolated; other failures retry the sub-batch on its own.
+    """
+
+    MAX_ATTEMPTS = 6
+
+    def __init__(
+        self,
+        client,
+        model=EMBEDDING_MODEL,
+        max_inputs=BATCH_MAX_INPUTS,
+        max_tokens=BATCH_MAX_TOKENS,
+        concurrency=CONCURRENCY,
+        min_concurrency=1,
+        max_concurrency=MAX_CONCURRENCY,
+        tokens_per_minute=TOKENS_PER_MINUTE,
+        latency_target=LATENCY_TARGET,
+    ):
+        self.client = client
+        self.model = model
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self.concurrency_args = (
+            concurrency,
+            min_concurrency,
+            max_concurrency,
+            latency_target,
+        )
+        self.tokens_per_minute = tokens_per_minute
+        self.paused_until = 0.0
+        self.failed = {}
+        self.stats = {
+            "inputs": 0,
+            "requests": 0,
+            "tokens": 0,
+            "splits": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failed": 0,
+            "throttled_s": 0.0,
+            "wall_s": 0.0,
+        }
 
+    def plan(self, inputs):
+        """Group inputs into batches that fit the per-request limits."""
+        batches, batch, tokens = [], [], 0
+        for ref, text, size in inputs:
+            if batch and (
+                len(batch) == self.max_inputs or tokens + size > self.max_tokens
+            ):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append((ref, text, size))
+            tokens += size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def embed(self, inputs):
+        started = time.perf_counter()
+        self.stats["inputs"] += len(inputs)
+        embeddings = run(self._embed(self.plan(inputs)))
+        self.stats["wall_s"] += time.perf_counter() - started
+        return embeddings
+
+    async def _embed(self, batches):
+        self.concurrency = AdaptiveConcurrency(*self.concurrency_args)
+        self.budget = TokenBudget(self.tokens_per_minute)
+        embeddings = {}
+        for result in await asyncio.gather(*map(self._send, batches)):
+            embeddings.update(result)
+        return embeddings
+
+    async def _send(self, batch):
+        tokens = sum(size for _, _, size in batch)
+        for attempt in range(self.MAX_ATTEMPTS):
+            await self._wait_out_pause()
+            self.stats["throttled_s"] += await self.budget.acquire(tokens)
+
+            await self.concurrency.acquire()
+            # A 429 may have paused sends while this one waited for a slot
+            await self._wait_out_pause()
+            started = time.monotonic()
+            try:
+                # base64 skips the JSON float lists; it decodes straight to
+                # float32 bytes
+                with telemetry.span("openai.embed", inputs=len(batch), tokens=tokens):
+                    response = await self.client.embeddings.create(
+                        input=[text for _, text, _ in batch],
+                        model=self.model,
+                        encoding_format="base64",
+                    )
+            except openai.RateLimitError as e:
+                await self.concurrency.release(started, throttled=True)
+                self.stats["rate_limited"] += 1
+                error = e
+                delay = retry_after(e) or 0.5 * 2**attempt
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            except openai.BadRequestError as e:
+                # The request itself is invalid; find the offending input
+                await self.concurrency.release(started)
+                if len(batch) == 1:
+                    self._fail(batch, e)
+                    return {}
+                self.stats["splits"] += 1
+                middle = len(batch) // 2
+                halves = await asyncio.gather(
+                    self._send(batch[:middle]), self._send(batch[middle:])
+                )
+                return {**halves[0], **halves[1]}
+            except openai.APIError as e:
+                await self.concurrency.release(started, throttled=True)
+                error = e
+                await asyncio.sleep(0.5 * 2**attempt)
+            else:
+                await self.concurrency.release(started)
+                self.stats["requests"] += 1
+                self.stats["tokens"] += response.usage.total_tokens
+                return {
+                    batch[item.index][0]: base64.b64decode(item.embedding)
+                    for item in response.data
+                }
+            self.stats["retries"] += 1
+            telemetry.record("openai.embed", retries=1)
+
+        self._fail(batch, error)
+        return {}
+
+    async def _wait_out_pause(self):
+        """Sleep until no 429's Retry-After pause is in effect."""
+        while True:
+            pause = self.paused_until - time.monotonic()
+            if pause <= 0:
+                return
+            self.stats["throttled_s"] += pause
+            await asyncio.sleep(pause)
+
+    def _fail(self, batch, error):
+        for ref, _, _ in batch:
+            self.failed[ref] = str(error)
+        self.stats["failed"] += len(batch)
+
+    def report(self):
         return {
+            **self.stats,
+            "throttled_s": round(self.stats["throttled_s"], 2),
+            "wall_s": round(self.stats["wall_s"], 2),
+            "concurrency": {
+                "final": round(self.concurrency.limit, 1),
+                **self.concurrency.stats,
+            },
+        }
+
+
+def cache_key(text, model=EMBEDDING_MODEL):
+    """Cache key for the embedding of `text` by `model`."""
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).digest()
+
+
+def get_cached_embeddings(cur, keys):
+    """{key: embedding} for the cache keys already in embedding_cache."""
+    if not keys:
+        return {}
+    cur.execute(
+        "SELECT content_hash, embedding FROM embedding_cache WHERE content_hash = ANY(%s)",
+        (list(keys),),
+    )
+    # Stored as the float32 bytes the API returned (little-endian)
+    return {bytes(key): bytes(embedding) for key, embedding in cur.fetchall()}
+
+
+def save_cached_embeddings(cur, embeddings, model=EMBEDDING_MODEL):
+    execute_values(
+        cur,
+        """
+        INSERT INTO embedding_cache (content_hash, model, embedding)
+        VALUES %s
+        ON CONFLICT (content_hash) DO NOTHING
+        """,
+        [(key, model, embedding) for key, embedding in embeddings.items()],
+        page_size=500,
+    )
+
+
+def process_file(s3, bucket, key):
+    try:
+        # Chunk while the body streams in rather than holding the whole text;
+        # the download and the chunking overlap, so they share a span
+        with telemetry.span("s3.read_chunk") as span:
+            response = s3.get_object(Bucket=bucket, Key=key)
+            chunks = list(chunk_text(decode(response["Body"].iter_chunks(65536))))
+            span.add(bytes=response.get("ContentLength", 0), chunks=len(chunks))
+
+        cik, form, accession_number = storage.filing_of(key)
+
+        return {
+            "key": key,
             "cik": cik,
             "accession_number": accession_number,
             "form": form,
-            "embeddings": embeddings,
+            "chunks": [text for text, _ in chunks],
+            "tokens": [tokens for _, tokens in chunks],
+            "cache_keys": [cache_key(text) for text, _ in chunks],
         }
     except Exception as e:
         logger.error(f"Error processing file {key}: {str(e)}")
         return None
 
 
+@telemetry.instrument
 def lambda_handler(event, context):
     try:
-        # Connect to Postgres
-        conn = psycopg2.connect(
-            host=os.environ["DB_HOST"],
-            database=os.environ["DB_NAME"],
-            user=os.environ["DB_USER"],
-            password=os.environ["DB_PASSWORD"],
-        )
-        cur = conn.cursor()
-
         bucket = os.environ["S3_BUCKET"]
-        file_names = event.get("file_names", [])
+        # The workflow passes the files filings-ingest just wrote; invoked
+        # without them, a worker claims its share of the unembedded backlog.
+        # Both lease their filings, so the workflow and backlog workers never
+        # embed the same filing at once: one another worker holds is skipped
+        owner = str(uuid.uuid4())
+        requested = event.get("file_names")
+        with db.transaction() as cur:
+            if requested is None:
+                claimed = workqueue.claim(
+                    cur,
+                    "embedding",
+                    owner,
+                    event.get("limit", CLAIM_LIMIT),
+                    LEASE_SECONDS,
+                )
+            else:
+                filings = {}
+                for key in requested:
+                    cik, _, accession_number = storage.filing_of(key)
+                    filings[(cik, accession_number)] = key
+                claimed = workqueue.claim(
+                    cur, "embedding", owner, None, LEASE_SECONDS, filings=filings
+                )
+        if requested is None:
+            file_names = [
+                storage.filing_key(cik, form, accession_number)
+                for cik, accession_number, form, _ in claimed
+            ]
+        else:
+            file_names = [
+                filings[(cik, accession_number)]
+                for cik, accession_number, _, _ in claimed
+            ]
+            if len(file_names) < len(filings):
+                logger.info(
+                    f"Skipping {len(filings) - len(file_names)} files leased "
+                    "to another worker or already embedded"
+                )
         logger.info(f"Processing {len(file_names)} files")
 
-        # Process files concurrently
+        # Read and chunk files concurrently
+        s3 = boto3.client("s3")
         with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(process_file, bucket, key) for key in file_names]
-            results = []
+            futures = [
+                executor.submit(process_file, s3, bucket, key) for key in file_names
+            ]
+            files = []
             for future in as_completed(futures):
                 result = future.result()
                 if result:
-                    results.append(result)
-                    logger.info(
-                        f"Successfully processed file: {result['cik']}/{result['form']}_{result['accession_number']}"
-                    )
+                    files.append(result)
                 else:
                     logger.warning("A file failed to process")
 
+        # Chunks embedded before (a re-processed filing, boilerplate repeated
+        # across filings) come from the cache with one lookup for the whole run
+        with db.transaction() as cur:
+            cached = get_cached_embeddings(
+                cur, {key for file in files for key in file["cache_keys"]}
+            )
+
+        # Embed each remaining distinct chunk once, packed into as few requests
+        # as the per-request limits allow
+        misses = {}
+        for file in files:
+            for chunk, tokens, key in zip(
+                file["chunks"], file["tokens"], file["cache_keys"]
+            ):
+                if key not in cached and key not in misses:
+                    misses[key] = (key, chunk, tokens)
+        batcher = EmbeddingBatcher(get_client())
+        embedded = batcher.embed(list(misses.values()))
+        if embedded:
+            with db.transaction() as cur:
+                save_cached_embeddings(cur, embedded)
+        embeddings = {**cached, **embedded}
+
+        results = []
+        for file in files:
+            missing = [key for key in file["cache_keys"] if key not in embeddings]
+            if missing:
+                logger.error(
+                    f"Error embedding file {file['key']}: {len(missing)} chunk(s) "
+                    f"failed: {batcher.failed[missing[0]]}"
+                )
+                continue
+            # One contiguous float32 buffer per file, a row of EMBEDDING_DIMENSIONS
+            # values per chunk
+            file["embeddings"] = array(
+                "f", b"".join(embeddings[key] for key in file["cache_keys"])
+            )
+            results.append(file)
+            logger.info(
+                f"Successfully processed file: {file['cik']}/{file['form']}_{file['accession_number']}"
+            )
+
+        chunk_count = sum(len(file["chunks"]) for file in files)
+        hits = sum(1 for file in files for key in file["cache_keys"] if key in cached)
+        stats = {
+            **batcher.report(),
+            "cache": {
+                "chunks": chunk_count,
+                "hits": hits,
+                "hit_rate": round(hits / chunk_count, 3) if chunk_count else 0,
+                # Inputs that never reached the API: cache hits plus repeats
+                # of a chunk already being embedded in this run
+                "inputs_avoided": chunk_count - len(misses),
+                "requests_avoided": len(
+                    batcher.plan(
+                        (None, chunk, tokens)
+                        for file in files
+                        for chunk, tokens in zip(file["chunks"], file["tokens"])
+                    )
+                )
+                - len(batcher.plan(misses.values())),
+            },
+        }
         logger.info(
             f"Successfully processed {len(results)} out of {len(file_names)} files"
         )
+        logger.info(f"Embedding stats: {stats}")
 
-        # Store embeddings in Postgres
-        embedding_batch = []
-        for result in results:
-            # Update company_filings
-            cur.execute(
-                """
-                UPDATE company_filings
-                SET processed = TRUE
-                WHERE cik = %s AND accession_number = %s
-                RETURNING id
-                """,
-                (result["cik"], result["accession_number"]),
+        # Store embeddings in Postgres: one statement resolves every filing id,
+        # one binary COPY streams every vector
+        with db.transaction() as cur:
+            filing_ids = workqueue.finish(
+                cur,
+                "embedding",
+                [(r["cik"], r["accession_number"]) for r in results],
+                owner=owner,
+            )
+            stored = []
+            for result in results:
+                if (result["cik"], result["accession_number"]) in filing_ids:
+                    stored.append(result)
+                else:
+                    logger.warning(
+                        f"No company_filings row for {result['cik']}/{result['accession_number']}"
+                    )
+            rows = vectors.copy_embeddings(
+                cur,
+                filing_ids.values(),
+                (
+                    (filing_ids[(r["cik"], r["accession_number"])], i, embedding)
+                    for r in stored
+                    for i, embedding in enumerate(
+                        vectors.rows(r["embeddings"], EMBEDDING_DIMENSIONS)
+                    )
+                ),
+            )
+        stats["rows_written"] = rows
+        # Filings that did not embed go back to the backlog, as a failed attempt
+        embedded_filings = {(r["cik"], r["accession_number"]) for r in stored}
+        failed = [
+            filing
+            for filing in dict.fromkeys(
+                (cik, accession_number)
+                for cik, _, accession_number in map(storage.filing_of, file_names)
             )
-            filing_id = cur.fetchone()[0]
-
-            for chunk_index, chunk_embedding in enumerate(result["embeddings"]):
-                embedding_batch.append((
-                    filing_id,
-                    chunk_index,
-                    json.dumps(chunk_embedding)
-                ))
-            
-            cur.executemany(
-                """
-                INSERT INTO filing_embeddings (filing_id, chunk_index, embedding)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (filing_id, chunk_index) DO UPDATE
-                SET embedding = EXCLUDED.embedding
-                """,
-                embedding_batch
-)
-        conn.commit()
-        cur.close()
-        conn.close()
+            if filing not in embedded_filings
+        ]
+        if failed:
+            with db.transaction() as cur:
+                workqueue.finish(cur, "embedding", failed, workqueue.FAILED, owner)
+        stats["files_failed"] = len(failed)
+        stats["claimed"] = len(claimed)
 
         logger.info("All database operations committed successfully")
+        logger.info(f"DB connection stats: {db.metrics()}")
 
-        return { "files_processed": len(results) }
+        return {"files_processed": len(stored), "stats": stats}
     except psycopg2.Error as e:
         logger.error(f"Database error: {str(e)}")
         raise Exception(f"DatabaseConnectionError: {str(e)}")
@@ -1,3 +1,7 @@
+from common import telemetry
+
+
+@telemetry.instrument
 def lambda_handler(event, context):
     """
     Error handler function for the Step Functions workflow.
@@ -1,105 +1,603 @@
 import boto3
-import requests
 import json
-import psycopg2
-from datetime import datetime, timedelta
 import os
 import logging
+import queue
+import threading
+import time
 import uuid
+import codecs
 import html
+import io
 import re
 from dotenv import load_dotenv
 
+from common import batches, db, edgar, shards, storage, telemetry, workqueue
+
 load_dotenv()
 
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", "4"))
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "4"))
+# Bytes read from the EDGAR response per extractor feed
+STREAM_CHUNK_SIZE = 65536
+# Documents allowed to wait between two stages; bounds memory held in flight
+QUEUE_DEPTH = int(os.environ.get("PIPELINE_QUEUE_DEPTH", "2"))
+# Filings claimed per run, about what one invocation fetches in its timeout;
+# a larger backlog drains over later runs. 0 takes all of it.
+CLAIM_LIMIT = int(os.environ.get("FILINGS_CLAIM_LIMIT", "200"))
+# Claimed filings stay leased while the run fetches them. Finishing ends the
+# lease; outliving the Lambda timeout, it only hands back the filings of a
+# run that died, soon enough for a retry or the next run to take them.
+LEASE_SECONDS = int(os.environ.get("FILINGS_LEASE_SECONDS", "600"))
 
-def lambda_handler(event, context):
-    try:
-        # Connect to Postgres
-        conn = psycopg2.connect(
-            host=os.environ["DB_HOST"],
-            database=os.environ["DB_NAME"],
-            user=os.environ["DB_USER"],
-            password=os.environ["DB_PASSWORD"],
+_DONE = object()
+
+
+class Stage:
+    """A pool of worker threads applying `func` to items from `inbox`.
+
+    Results go to `outbox`, a bounded queue, so a slow stage blocks the ones in
+    front of it instead of letting documents pile up in memory. An item whose
+    `func` raises is dropped from the pipeline and reported through `on_error`.
+    """
+
+    def __init__(self, name, func, workers, inbox, outbox, next_workers, on_error):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.next_workers = next_workers
+        self.on_error = on_error
+        self.lock = threading.Lock()
+        self.running = workers
+        self.stats = {
+            "items": 0,
+            "errors": 0,
+            "bytes": 0,
+            "busy_s": 0.0,
+            "blocked_s": 0.0,
+        }
+
+    def start(self):
+        self.threads = [
+            threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                break
+
+            started = time.perf_counter()
+            try:
+                result, size = self.func(item)
+            except Exception as e:
+                self.on_error(self.name, item, e)
+                with self.lock:
+                    self.stats["errors"] += 1
+                continue
+            busy = time.perf_counter() - started
+
+            started = time.perf_counter()
+            self.outbox.put(result)
+            blocked = time.perf_counter() - started
+
+            with self.lock:
+                self.stats["items"] += 1
+                self.stats["bytes"] += size
+                self.stats["busy_s"] += busy
+                self.stats["blocked_s"] += blocked
+
+        # The last worker out tells every worker of the next stage to stop
+        with self.lock:
+            self.running -= 1
+            last = self.running == 0
+        if last:
+            for _ in range(self.next_workers):
+                self.outbox.put(_DONE)
+
+    def report(self, elapsed):
+        stats = self.stats
+        return {
+            "workers": self.workers,
+            "items": stats["items"],
+            "errors": stats["errors"],
+            "items_per_s": round(stats["items"] / elapsed, 2) if elapsed else 0,
+            "mb_per_busy_s": (
+                round(stats["bytes"] / 1e6 / stats["busy_s"], 2)
+                if stats["busy_s"]
+                else 0
+            ),
+            # Share of the stage's worker time spent working; the bottleneck
+            # stage sits near 1.0 while the others wait on it
+            "utilization": (
+                round(stats["busy_s"] / (elapsed * self.workers), 2) if elapsed else 0
+            ),
+            "blocked_s": round(stats["blocked_s"], 2),
+        }
+
+
+def run_pipeline(items, stages):
+    """Push `items` through `stages` = [(name, func, workers), ...].
+
+    Each func takes an item and returns (result, bytes processed). Returns the
+    results of the last stage and per-stage throughput stats.
+    """
+    errors = []
+    errors_lock = threading.Lock()
+
+    def on_error(stage_name, item, e):
+        with errors_lock:
+            errors.append((stage_name, item, e))
+
+    queues = [queue.Queue(maxsize=QUEUE_DEPTH) for _ in stages]
+    results = queue.Queue()
+    pool = []
+    for i, (name, func, workers) in enumerate(stages):
+        if i + 1 < len(stages):
+            outbox, next_workers = queues[i + 1], stages[i + 1][2]
+        else:
+            outbox, next_workers = results, 1
+        pool.append(
+            Stage(name, func, workers, queues[i], outbox, next_workers, on_error)
         )
-        cur = conn.cursor()
-
-        # Get new filings from the database
-        cur.execute(
-            """
-            SELECT cik, accession_number, form, archive_url
-            FROM company_filings
-            WHERE processed = FALSE OR sentiment IS NULL
-        """
+
+    started = time.perf_counter()
+    for stage in pool:
+        stage.start()
+    for item in items:
+        queues[0].put(item)
+    for _ in range(pool[0].workers):
+        queues[0].put(_DONE)
+
+    completed = []
+    while True:
+        result = results.get()
+        if result is _DONE:
+            break
+        completed.append(result)
+    elapsed = time.perf_counter() - started
+
+    stats = {stage.name: stage.report(elapsed) for stage in pool}
+    stats["elapsed_s"] = round(elapsed, 2)
+    return completed, errors, stats
+
+
+class SqsBatcher:
+    """Buffers SQS messages and sends them with send_message_batch.
+
+    A batch goes out at 10 messages or 256 KB, whichever comes first. Entries
+    the batch response reports as failed are retried on their own, and so is
+    every entry of a call that raised; sender faults are not retried. Entries
+    still unsent after MAX_ATTEMPTS end up in `failed`. Safe to call from
+    several threads.
+    """
+
+    MAX_MESSAGES = 10
+    MAX_BYTES = 256 * 1024
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, sqs, queue_url, message_attributes):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.message_attributes = message_attributes
+        self.attributes_size = sum(
+            len(name) + len(value["DataType"]) + len(value["StringValue"])
+            for name, value in message_attributes.items()
         )
-        new_filings = cur.fetchall()
+        self.lock = threading.Lock()
+        self.pending = []
+        self.pending_bytes = 0
+        self.next_id = 0
+        self.failed = []
+        self.stats = {"messages": 0, "batch_calls": 0, "retried": 0, "failed": 0}
+
+    def add(self, body, key):
+        """Queue a message; `key` identifies it in `failed` if it cannot be sent."""
+        size = len(body.encode("utf-8")) + self.attributes_size
+        with self.lock:
+            ready = None
+            if self.pending and (
+                len(self.pending) == self.MAX_MESSAGES
+                or self.pending_bytes + size > self.MAX_BYTES
+            ):
+                ready = self._take()
+            self.pending.append(
+                {
+                    "Id": str(self.next_id),
+                    "MessageBody": body,
+                    "MessageAttributes": self.message_attributes,
+                    "key": key,
+                }
+            )
+            self.next_id += 1
+            self.pending_bytes += size
+            self.stats["messages"] += 1
+        if ready:
+            self._send(ready)
+
+    def flush(self):
+        with self.lock:
+            ready = self._take()
+        if ready:
+            self._send(ready)
+
+    def _take(self):
+        ready, self.pending, self.pending_bytes = self.pending, [], 0
+        return ready
+
+    def _send(self, entries):
+        by_id = {entry["Id"]: entry for entry in entries}
+        for attempt in range(self.MAX_ATTEMPTS):
+            try:
+                with telemetry.span("sqs.send", messages=len(by_id)):
+                    response = self.sqs.send_message_batch(
+                        QueueUrl=self.queue_url,
+                        Entries=[
+                            {k: v for k, v in entry.items() if k != "key"}
+                            for entry in by_id.values()
+                        ],
+                    )
+            except Exception as e:
+                # The whole call failed: every entry in it failed with it
+                response = {
+                    "Failed": [
+                        {"Id": id, "SenderFault": False, "Message": str(e)}
+                        for id in by_id
+                    ]
+                }
+            with self.lock:
+                self.stats["batch_calls"] += 1
+
+            retry = {}
+            for failure in response.get("Failed", []):
+                entry = by_id[failure["Id"]]
+                if failure.get("SenderFault") or attempt == self.MAX_ATTEMPTS - 1:
+                    with self.lock:
+                        self.failed.append((entry["key"], failure.get("Message", "")))
+                        self.stats["failed"] += 1
+                else:
+                    retry[failure["Id"]] = entry
+            if not retry:
+                return
+            with self.lock:
+                self.stats["retried"] += len(retry)
+            telemetry.record("sqs.send", retries=len(retry))
+            by_id = retry
+            time.sleep(0.1 * 2**attempt)
+
+    def report(self):
+        return {
+            **self.stats,
+            # Calls a send_message per filing would have made
+            "calls_saved": self.stats["messages"] - self.stats["batch_calls"],
+        }
 
-        conn.commit()
-        cur.close()
-        conn.close()
 
+# Elements whose contents are never document text. ix:header holds the hidden
+# inline XBRL facts that 10-K/10-Q documents carry up front.
+SKIP_TAGS = ["head", "script", "style", "noscript", "template", "title", "ix:header"]
+# Elements that end a paragraph, kept as a blank line for the embeddings chunker
+PARAGRAPH_TAGS = [
+    "address", "blockquote", "caption", "div", "dl", "h[1-6]", "hr", "li", "ol",
+    "p", "pre", "section", "table", "tr", "ul",
+]  # fmt: skip
+# Elements that separate words; every other tag is removed without a space
+BLOCK_TAGS = ["br", "dd", "dt", "td", "th"]
+VOID_TAGS = {"area", "br", "col", "embed", "hr", "img", "input", "link", "meta", "wbr"}
+
+# Structural scanning runs over an ASCII-lowercased bytes copy of the text:
+# offsets match the original, and the regexes can skip re.IGNORECASE
+_SKIPPED_TAG = re.compile(rb"<!--|<(" + "|".join(SKIP_TAGS).encode() + rb")\b[^>]*>")
+_HIDDEN_STYLE = re.compile(rb"display\s*:\s*none")
+_TAG_OPEN = re.compile(rb"<([a-z][\w:.-]*)\b[^>]*>")
+_COMMENT_END = re.compile(rb"-(-)>")
+_COMMENT_END_LENGTH = len("-->")
+_PARAGRAPH_TAG = re.compile(rf"</?(?:{'|'.join(PARAGRAPH_TAGS)})\b[^>]*>", re.I)
+_BLOCK_TAG = re.compile(rf"</?(?:{'|'.join(BLOCK_TAGS)})\b[^>]*>", re.I)
+_ANY_TAG = re.compile(r"<[^>]*>")
+# Stands in for paragraph tags while the rest of the markup is stripped
+_BREAK = "\x00"
+# What goes between two runs of words, by strength: nothing, a space, a blank line
+_NONE, _SPACE, _PARAGRAPH = range(3)
+_SEPARATORS = ("", " ", "\n\n")
+
+
+def _complete_prefix(text, pos):
+    """End of the part of text[pos:] that cannot be cut mid-tag or mid-entity."""
+    end = len(text)
+    tag = text.rfind("<", pos)
+    if tag != -1 and text.find(">", tag) == -1:
+        end = tag
+    entity = text.rfind("&", pos, end)
+    if entity != -1 and end - entity < 12 and ";" not in text[entity:end]:
+        end = entity
+    return end
+
+
+def _next_skipped(low, pos):
+    """(start, end, tag) of the next element whose content is dropped, or None.
+
+    `tag` is empty for a comment.
+    """
+    skipped = _SKIPPED_TAG.search(low, pos)
+    limit = skipped.start() if skipped else len(low)
+    hidden = _HIDDEN_STYLE.search(low, pos, limit)
+    while hidden:
+        # Only counts when it sits inside a start tag's attributes
+        start = low.rfind(b"<", pos, hidden.start())
+        if start != -1 and low.find(b">", start, hidden.start()) == -1:
+            opening = _TAG_OPEN.match(low, start)
+            if opening and opening.end() > hidden.start():
+                return start, opening.end(), opening.group(1)
+        hidden = _HIDDEN_STYLE.search(low, hidden.end(), limit)
+    if skipped:
+        return skipped.start(), skipped.end(), skipped.group(1) or b""
+    return None
+
+
+class TextExtractor:
+    """Single-pass HTML to text: drops non-content elements, collapses whitespace.
+
+    Paragraphs are separated by a blank line, other whitespace collapses to a
+    single space. Python only visits the openings of skipped elements, which
+    are rare; paragraph and block tags become separators, other tags are
+    stripped and entities decoded by C-level substitutions over whole runs of
+    text. Fed incrementally, it buffers at most the unfinished tail of the last
+    chunk.
+    """
+
+    def __init__(self):
+        self.out = io.StringIO()
+        self.buffer = ""
+        self.skip = None  # (regex for the skipped element's tags, nesting depth)
+        self.pending = _NONE  # separator owed before the next word
+
+    def feed(self, data):
+        self.buffer += data
+        self._process(final=False)
+
+    def close(self):
+        self._process(final=True)
+        return self.out.getvalue()
+
+    def _process(self, final):
+        text = self.buffer
+        low = text.encode("ascii", "replace").lower()
+        pos = 0
+        while pos < len(text):
+            if self.skip is not None:
+                pattern, depth = self.skip
+                match = pattern.search(low, pos)
+                if match is None:
+                    # Keep what may be the start of the terminator for the next
+                    # chunk: an incomplete closing tag, or the "--" of a "-->"
+                    if final:
+                        pos = len(text)
+                    else:
+                        tail = text.rfind("<", pos)
+                        keep = len(text) - (_COMMENT_END_LENGTH - 1)
+                        pos = max(pos, keep if tail == -1 else min(tail, keep))
+                    break
+                pos = match.end()
+                depth += -1 if match.group(1) else 1
+                self.skip = (pattern, depth) if depth else None
+                continue
+
+            skipped = _next_skipped(low, pos)
+            if skipped is None:
+                end = len(text) if final else _complete_prefix(text, pos)
+                self._emit(text[pos:end])
+                pos = end
+                break
+
+            start, end, tag = skipped
+            self._emit(text[pos:start])
+            pos = end
+            if not tag:
+                self.skip = (_COMMENT_END, 1)
+            elif tag.decode() not in VOID_TAGS:
+                closing = re.compile(rb"<(/?)" + re.escape(tag) + rb"\b[^>]*>")
+                self.skip = (closing, 1)
+            self.pending = max(self.pending, _SPACE)
+        self.buffer = text[pos:]
+
+    def _emit(self, segment):
+        if not segment:
+            return
+        segment = _PARAGRAPH_TAG.sub(_BREAK, segment.replace(_BREAK, ""))
+        segment = html.unescape(_ANY_TAG.sub("", _BLOCK_TAG.sub(" ", segment)))
+        for i, part in enumerate(segment.split(_BREAK)):
+            if i:
+                self.pending = _PARAGRAPH
+            words = part.split()
+            if not words:
+                if part:
+                    self.pending = max(self.pending, _SPACE)
+                continue
+            if part[0].isspace():
+                self.pending = max(self.pending, _SPACE)
+            if self.out.tell():
+                self.out.write(_SEPARATORS[self.pending])
+            self.out.write(" ".join(words))
+            self.pending = _SPACE if part[-1].isspace() else _NONE
+
+
+def extract_text(chunks):
+    """Normalized document text from an iterable of HTML byte chunks."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    extractor = TextExtractor()
+    for chunk in chunks:
+        extractor.feed(decoder.decode(chunk))
+    extractor.feed(decoder.decode(b"", final=True))
+    return extractor.close()
+
+
+def iter_chunks(content, size=65536):
+    view = memoryview(content)
+    for start in range(0, len(view), size):
+        yield view[start : start + size]
+
+
+@telemetry.instrument
+def lambda_handler(event, context):
+    try:
         s3 = boto3.client("s3")
         bucket_name = os.environ["S3_BUCKET"]
 
+        # Limited to the shard's companies, so shards running side by side in
+        # the Map state do not pick up each other's filings; without a shard
+        # or cik_list every pending filing is claimable
+        cik_list = shards.load_ciks(s3, bucket_name, event)
+        batch_id = str(uuid.uuid4())
+
+        # Lease the unfinished filings to this batch; filings another run has
+        # leased are skipped, so concurrent runs split the backlog
+        with db.transaction() as cur:
+            new_filings = workqueue.claim(
+                cur, "ingest", batch_id, CLAIM_LIMIT or None, LEASE_SECONDS, cik_list
+            )
+
         sqs = boto3.client("sqs")
         queue_url = os.environ["SQS_URL"]
-        batch_id = str(uuid.uuid4())
 
-        file_names = []
+        def fetch(filing):
+            # Fetch the filing document under the shared EDGAR rate limit and
+            # clean it as it arrives, so no more than a chunk of the HTML is
+            # held in memory at once
+            response = edgar.fetch(filing["archive_url"], stream=True)
+            received = 0
+
+            def chunks():
+                nonlocal received
+                for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                    received += len(chunk)
+                    yield chunk
+
+            with response, telemetry.span("clean") as span:
+                filing["text"] = extract_text(chunks()).encode("utf-8")
+                span.add(bytes=received)
+            return filing, received
+
+        sqs_batcher = SqsBatcher(
+            sqs,
+            queue_url,
+            {"batch_id": {"DataType": "String", "StringValue": batch_id}},
+        )
+        upload_stats = {"puts": 0, "skipped": 0, "bytes_skipped": 0}
+        upload_lock = threading.Lock()
+
+        def upload(filing):
+            text = filing.pop("text")
+            # Re-ingested filings usually clean to the same text as last time
+            written = storage.put_if_changed(
+                s3, bucket_name, filing["file_name"], text, ContentType="text/plain"
+            )
+            with upload_lock:
+                if written:
+                    upload_stats["puts"] += 1
+                else:
+                    upload_stats["skipped"] += 1
+                    upload_stats["bytes_skipped"] += len(text)
+
+            message_body = json.dumps(
+                {
+                    "bucket": bucket_name,
+                    "key": filing["file_name"],
+                    "cik": filing["cik"],
+                    "accession_number": filing["accession_number"],
+                    "form": filing["form"],
+                    "batch_id": batch_id,
+                }
+            )
+            sqs_batcher.add(message_body, filing["file_name"])
+            return filing["file_name"], len(text)
+
+        filings = [
+            {
+                "cik": cik,
+                "accession_number": accession_number,
+                "form": form,
+                "archive_url": archive_url,
+                # Stored in S3 as plain text
+                "file_name": storage.filing_key(cik, form, accession_number),
+            }
+            for cik, accession_number, form, archive_url in new_filings
+        ]
+        # Registered before anything is queued, so no sentiment result can
+        # arrive for a batch filings-queue does not know about yet
+        with db.transaction() as cur:
+            batches.create_batch(
+                cur, batch_id, [(f["cik"], f["accession_number"]) for f in filings]
+            )
+
+        file_names, errors, stats = run_pipeline(
+            filings,
+            [
+                ("fetch", fetch, FETCH_WORKERS),
+                ("upload", upload, UPLOAD_WORKERS),
+            ],
+        )
+
+        sqs_batcher.flush()
+
         failed_files = []
-        for filing in new_filings:
-            cik, accession_number, form, archive_url = filing
+        for stage_name, filing, e in errors:
+            logger.error(
+                f"Error processing filing {filing['cik']}/{filing['accession_number']} "
+                f"at {stage_name}: {str(e)}"
+            )
+            failed_files.append(filing["file_name"])
+        for file_name, message in sqs_batcher.failed:
+            logger.error(f"Error enqueueing {file_name}: {message}")
+            failed_files.append(file_name)
+        unqueued = {file_name for file_name, _ in sqs_batcher.failed}
+        file_names = [f for f in file_names if f not in unqueued]
 
-            try:
-                # Fetch the filing document
-                headers = {"User-Agent": "Seismiq info@seismiq.ai"}
-                response = requests.get(archive_url, headers=headers)
-                response.raise_for_status()
-                content = response.content
-
-                # Clean the htm document
-                clean_content = html.unescape(content.decode('utf-8'))
-                text_content = re.sub('<[^<]+?>', '', clean_content)
-                text_content = re.sub(r'\s+', ' ', text_content).strip()
-
-                # Store the document in S3 with its original extension
-                file_extension = ".txt"
-                file_name = f"filings/{cik}/{form}_{accession_number}{file_extension}"
-                s3.put_object(Bucket=bucket_name, Key=file_name, Body=text_content.encode('utf-8'))
-
-                message_body = json.dumps(
-                    {
-                        "bucket": bucket_name,
-                        "key": file_name,
-                        "cik": cik,
-                        "accession_number": accession_number,
-                        "form": form,
-                    }
-                )
-                sqs.send_message(
-                    QueueUrl=queue_url,
-                    MessageBody=message_body,
-                    MessageAttributes={
-                        "batch_id": {"DataType": "String", "StringValue": batch_id}
-                    },
-                )
-
-                file_names.append(file_name)
-            except Exception as e:
-                logger.error(
-                    f"Error processing filing {cik}/{accession_number}: {str(e)}"
-                )
-                failed_files.append(file_name)
+        # Filings that never reached the queue will not be scored in this run;
+        # their leases end with the others', so the next run can retry them
+        by_file = {f["file_name"]: f for f in filings}
+        failed = [
+            (by_file[f]["cik"], by_file[f]["accession_number"]) for f in failed_files
+        ]
+        with db.transaction() as cur:
+            batches.finish_items(
+                cur,
+                [(batch_id, cik, accession_number) for cik, accession_number in failed],
+                batches.FAILED,
+            )
+            workqueue.finish(
+                cur,
+                "ingest",
+                [
+                    (by_file[f]["cik"], by_file[f]["accession_number"])
+                    for f in file_names
+                ],
+                owner=batch_id,
+            )
+            workqueue.finish(cur, "ingest", failed, workqueue.FAILED, batch_id)
+
+        stats["claimed"] = len(filings)
+        stats["sqs"] = sqs_batcher.report()
+        stats["s3"] = upload_stats
+        logger.info(f"Pipeline stats: {json.dumps(stats)}")
+        logger.info(f"DB connection stats: {db.metrics()}")
 
         return {
             "batch_id": batch_id,
             "file_names": file_names,
             "failed_files": failed_files,
-            "file_count": len(file_names)
+            "file_count": len(file_names),
+            "stats": stats,
         }
     except Exception as e:
         logger.error(f"Error in lambda_handler: {str(e)}")
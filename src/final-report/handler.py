@@ -1,6 +1,216 @@
+import boto3
+import gzip
+import io
+import json
+import os
+import time
+import psycopg2
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from common import db, shards, telemetry
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+REPORT_PREFIX = os.environ.get("REPORT_PREFIX", "reports")
+# gzip.compress defaults to level 9, several times slower for a few % smaller
+COMPRESS_LEVEL = 6
+DOWNLOAD_WORKERS = 8
+
+# One row per company and form in the run, built once per report into a
+# temporary table that the totals and the CSV export both read. The filings
+# come from the run's sentiment batches (one per shard), so the report covers
+# exactly what filings-ingest queued.
+COMPANY_FORMS = """
+    CREATE TEMPORARY TABLE report_company_forms ON COMMIT DROP AS
+    SELECT f.cik,
+           c.entity_name,
+           f.form,
+           count(*) AS filings,
+           count(*) FILTER (WHERE f.embedding_status = 'done') AS embedded,
+           coalesce(sum(e.chunks), 0)::bigint AS chunks,
+           count(*) FILTER (WHERE i.status = 'failed') AS failed,
+           count(*) FILTER (WHERE f.sentiment = 'POSITIVE') AS positive,
+           count(*) FILTER (WHERE f.sentiment = 'NEGATIVE') AS negative,
+           count(*) FILTER (WHERE f.sentiment = 'NEUTRAL') AS neutral,
+           count(*) FILTER (WHERE f.sentiment = 'MIXED') AS mixed,
+           count(*) FILTER (WHERE f.sentiment IS NULL) AS unscored,
+           min(f.filing_date) AS first_filed,
+           max(f.filing_date) AS last_filed
+    FROM filing_batch_items i
+    JOIN company_filings f
+      ON f.cik = i.cik AND f.accession_number = i.accession_number
+    LEFT JOIN company_facts c ON c.cik = f.cik
+    LEFT JOIN LATERAL (
+        SELECT count(*) AS chunks FROM filing_embeddings WHERE filing_id = f.id
+    ) e ON TRUE
+    WHERE i.batch_id = ANY(%s)
+    GROUP BY f.cik, c.entity_name, f.form
+"""
+
+# The same measures rolled up by form and for the whole run
+TOTALS = """
+    SELECT form,
+           count(DISTINCT cik) AS companies,
+           sum(filings)::bigint AS filings,
+           sum(embedded)::bigint AS embedded,
+           sum(chunks)::bigint AS chunks,
+           sum(failed)::bigint AS failed,
+           sum(positive)::bigint AS positive,
+           sum(negative)::bigint AS negative,
+           sum(neutral)::bigint AS neutral,
+           sum(mixed)::bigint AS mixed,
+           sum(unscored)::bigint AS unscored
+    FROM report_company_forms
+    GROUP BY GROUPING SETS ((form), ())
+    ORDER BY form NULLS FIRST
+"""
+
+SENTIMENTS = ("positive", "negative", "neutral", "mixed", "unscored")
+
+
+def summarize(cur, batch_ids):
+    """{"totals": {...}, "forms": {form: {...}}, "failed": [...]} for the batches.
+
+    Leaves report_company_forms in place for export_company_forms.
+    """
+    batch_ids = list(batch_ids)
+    cur.execute(COMPANY_FORMS, (batch_ids,))
+    cur.execute(TOTALS)
+    columns = [column.name for column in cur.description]
+    summary = {"totals": {}, "forms": {}}
+    for row in cur.fetchall():
+        measures = dict(zip(columns, row))
+        form = measures.pop("form")
+        measures["sentiment"] = {name: measures.pop(name) for name in SENTIMENTS}
+        if form is None:
+            summary["totals"] = measures
+        else:
+            summary["forms"][form] = measures
+
+    # Failed sentiment items plus filings that were never embedded
+    cur.execute(
+        """
+        SELECT i.cik, i.accession_number, f.form,
+               i.status = 'failed' AS sentiment_failed,
+               coalesce(f.embedding_status, 'pending') <> 'done' AS not_embedded
+        FROM filing_batch_items i
+        LEFT JOIN company_filings f
+          ON f.cik = i.cik AND f.accession_number = i.accession_number
+        WHERE i.batch_id = ANY(%s)
+          AND (i.status = 'failed' OR coalesce(f.embedding_status, 'pending') <> 'done')
+        ORDER BY i.cik, i.accession_number
+        """,
+        (batch_ids,),
+    )
+    columns = [column.name for column in cur.description]
+    summary["failed"] = [dict(zip(columns, row)) for row in cur.fetchall()]
+    return summary
+
+
+def export_company_forms(cur):
+    """The per company and form rows as gzipped CSV, straight from COPY."""
+    # psycopg2 writes COPY output a row at a time; compress once at the end
+    # rather than paying GzipFile's per-write overhead on every row
+    out = io.BytesIO()
+    cur.copy_expert(
+        "COPY (SELECT * FROM report_company_forms ORDER BY cik, form) "
+        "TO STDOUT WITH (FORMAT csv, HEADER)",
+        out,
+    )
+    return gzip.compress(out.getbuffer(), COMPRESS_LEVEL)
+
+
+@telemetry.instrument
 def lambda_handler(event, context):
-    # You can add final reporting logic here, such as:
-    # - Querying for and summarizing final outputs (sanity checks)
-    # - Sending notifications
-    # - Updating the status of the workflow in a tracking system
-    return
\ No newline at end of file
+    """Write the run report for the shards in the event to S3.
+
+    The event is the workflow state: shard-planner's output with each
+    shard's result under `shards`, as left by the Map state's ShardReport or
+    ShardFailed step. Finished shards' stage stats and failed files are read
+    from the objects ShardReport stored under `shards/<run_id>/`.
+    """
+    started = time.perf_counter()
+    run_id = event.get("run_id")
+    if not run_id:
+        raise Exception("BadRequest: run_id is required")
+
+    try:
+        bucket = os.environ["S3_BUCKET"]
+        prefix = f"{REPORT_PREFIX}/{run_id}"
+        shard_results = event.get("shards") or []
+        batch_ids = [s["batch_id"] for s in shard_results if s.get("batch_id")]
+
+        s3 = boto3.client("s3")
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            shard_stats = list(
+                executor.map(
+                    lambda s: shards.read_stats(s3, bucket, run_id, s["shard"]),
+                    [s for s in shard_results if not s.get("error")],
+                )
+            )
+
+        with db.transaction() as cur:
+            summary = summarize(cur, batch_ids)
+            csv_body = export_company_forms(cur)
+
+        report = {
+            "run_id": run_id,
+            "universe_key": event.get("universe_key"),
+            "companies": event.get("companies"),
+            "mode": event.get("mode"),
+            "bulk": (event.get("bulk") or {}).get("stats"),
+            **summary,
+            "failed_files": [f for s in shard_stats for f in s["failed_files"]],
+            "failed_shards": [
+                {"shard": s.get("shard"), **s["error"]}
+                for s in shard_results
+                if s.get("error")
+            ],
+            "shards": [
+                {k: v for k, v in s.items() if k != "failed_files"} for s in shard_stats
+            ],
+        }
+        report_body = gzip.compress(
+            json.dumps(report, separators=(",", ":"), default=str).encode(),
+            COMPRESS_LEVEL,
+        )
+
+        with telemetry.span("s3.put", bytes=len(report_body) + len(csv_body)):
+            s3.put_object(
+                Bucket=bucket,
+                Key=f"{prefix}/summary.json.gz",
+                Body=report_body,
+                ContentType="application/json",
+                ContentEncoding="gzip",
+            )
+            s3.put_object(
+                Bucket=bucket,
+                Key=f"{prefix}/company_forms.csv.gz",
+                Body=csv_body,
+                ContentType="text/csv",
+                ContentEncoding="gzip",
+            )
+
+        logger.info(
+            f"Report for run {run_id}: {json.dumps(summary['totals'])}, "
+            f"{len(batch_ids)} batches, {len(report['failed_shards'])} failed shards, "
+            f"{len(summary['failed'])} failed filings, "
+            f"{len(report_body) + len(csv_body)} bytes written "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        logger.info(f"DB connection stats: {db.metrics()}")
+        return {
+            "run_id": run_id,
+            "report": f"s3://{bucket}/{prefix}/summary.json.gz",
+            "company_forms": f"s3://{bucket}/{prefix}/company_forms.csv.gz",
+            "totals": summary["totals"],
+            "failed_shards": len(report["failed_shards"]),
+        }
+    except psycopg2.Error as e:
+        logger.error(f"Database error: {str(e)}")
+        raise Exception(f"DatabaseConnectionError: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error in lambda_handler: {str(e)}")
+        raise Exception(f"InternalServerError: {str(e)}")
@@ -1,81 +1,411 @@
+import boto3
+import codecs
+import csv
+import functools
 import json
-import random
 import os
+import re
+import time
+from collections import Counter
 import psycopg2
-import boto3
-from botocore.exceptions import ClientError
+from psycopg2.extras import execute_values
 import logging
 
+from common import batches, db, telemetry, workqueue
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Loughran-McDonald style finance word lists. A fuller dictionary (the LM
+# master dictionary CSV) can be supplied from S3 through LEXICON_KEY.
+POSITIVE_WORDS = """
+    abundance accomplish accomplished accomplishes accomplishing accomplishment
+    achieve achieved achievement achievements achieves achieving advances
+    advancing advantage advantaged advantageous advantages attain attained
+    attaining attainment attractive beneficial benefit benefited benefiting best
+    better boom boost boosted breakthrough brilliant collaborate collaboration
+    conclusive confident constructive creative delight dependable desirable
+    efficiencies efficiency efficient efficiently empower enable enabled enables
+    enabling encouraged encouraging enhance enhanced enhancement enhances
+    enhancing enjoy enthusiasm enthusiastic excellence excellent exceptional
+    excited exciting exclusive favorable favorably gain gained gaining gains good
+    great greater greatest happy highest honor ideal impressive improve improved
+    improvement improvements improves improving incredible influential ingenuity
+    innovate innovation innovations innovative integrity leadership leading
+    lucrative opportunities opportunity optimistic outperform outperformed
+    outstanding perfect pleased popular positive positively profitability
+    profitable progress progressing prosper prosperity rebound rebounded resolve
+    resolved reward rewarding smooth solving stability stabilize stable strength
+    strengthen strengthened strengthening strengths strong stronger strongest
+    succeed succeeded success successes successful successfully superior surpass
+    surpassed transparency tremendous unmatched unparalleled upturn valuable
+    versatile win winner winning worthy
+""".split()
+
+NEGATIVE_WORDS = """
+    abandon abandoned abandonment abnormal abuse accident accidents accusations
+    adverse adversely against allegation allegations alleged annul anomalies
+    arrears attrition bad bankrupt bankruptcy breach breached breaches burden
+    burdensome calamity cancel canceled cancellation cancelled catastrophe
+    catastrophic caution cautionary cease ceased challenge challenged challenges
+    challenging closure closures collapse collapsed complaint complaints concern
+    concerned concerns condemn conflict conflicts costly crime crisis critical
+    criticism curtail curtailed damage damaged damages danger dangerous deadlock
+    decline declined declines declining decrease decreased decreases decreasing
+    default defaulted defaults defect defective defects deficiencies deficiency
+    deficit degrade delay delayed delays delinquency delinquent deteriorate
+    deteriorated deterioration detrimental difficult difficulties difficulty
+    diminish diminished disadvantage disadvantages disappoint disappointing
+    disaster discontinue discontinued dispute disputes disrupt disrupted
+    disruption disruptions dissatisfied distress downgrade downgraded downturn
+    downturns error errors fail failed failing fails failure failures falsely
+    fatal fault felony fined fines fraud fraudulent harm harmful hazard hazardous
+    hazards hinder hurt illegal impair impaired impairment impairments impede
+    imprisonment inability inadequate incorrect ineffective inefficient infringe
+    infringement injunction injury insolvency insolvent instability insufficient
+    interrupt interruption interruptions investigation investigations lack
+    lawsuit lawsuits layoffs liquidate liquidation litigation lose losing loss
+    losses lost misconduct misleading misstatement negative negatively neglect
+    negligence obsolete obstacle penalties penalty poor poorly problem problems
+    protest questionable recall recalls recession restate restated restatement
+    restructuring sanction sanctions serious severe severely shortage shortages
+    shortfall slowdown slowing stagnant suffer suffered suspend suspended
+    suspension terminate terminated termination threat threaten threats unable
+    unanticipated unavailable uncollectible underperform unfavorable
+    unfavorably unfortunately unprofitable unsuccessful violate violated
+    violation violations warning weak weaken weakened weakness weaknesses worse
+    worst writedown writedowns writeoff wrongdoing
+""".split()
+
+UNCERTAINTY_WORDS = """
+    almost ambiguity anticipate anticipated apparently appear appears approximate
+    approximately assume assumed assumes assumption assumptions believe believed
+    believes contingency contingent could depend dependent depending depends
+    doubt estimate estimated estimates exposure fluctuate fluctuation
+    fluctuations indefinite likelihood may maybe might nearly occasionally
+    pending perhaps possible possibly predict predicted preliminary presume
+    probable probably random risk risks risky roughly seems sometimes
+    speculative suggest tentative uncertain uncertainties uncertainty unclear
+    unknown unpredictable variability variable volatile volatility
+""".split()
+
+CATEGORIES = ("positive", "negative", "uncertainty")
+# Share of words carrying tone at which a document is fully non-neutral;
+# 10-Ks typically run 1-3% Loughran-McDonald words
+FULL_STRENGTH_DENSITY = 0.03
+READ_SIZE = 1 << 20
+# The queue's redrive maxReceiveCount: a message failing on this receive goes
+# to the dead-letter queue, so its batch item is counted as failed
+MAX_RECEIVES = int(os.environ.get("SENTIMENT_MAX_RECEIVES", "3"))
+
+# Lowercase ASCII letters, everything else to a space, so bytes.split()
+# yields the same words as [a-z]+ without a regex
+_LETTERS = bytes.maketrans(
+    bytes(range(256)),
+    bytes(c if 97 <= c <= 122 else 32 for c in bytes(range(256)).lower()),
+)
+# A section heading in a 10-K or 10-Q: "Item 1A." or "ITEM 7."
+_SECTION = re.compile(r"\b(?:Item|ITEM)\s+(\d{1,2}[A-C]?)\.")
+_SECTION_START = re.compile(r"\b(?:Item|ITEM)\s*$")
+
+_s3 = None
+_sfn = None
+
+
+def get_s3():
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client("s3")
+    return _s3
+
+
+def get_sfn():
+    global _sfn
+    if _sfn is None:
+        _sfn = boto3.client("stepfunctions")
+    return _sfn
+
+
+@functools.cache
+def load_lexicon():
+    """{word: categories}, from LEXICON_KEY in S3 if set, else the built-in lists."""
+    lexicon = {}
+    key = os.environ.get("LEXICON_KEY")
+    if key:
+        # LM master dictionary layout: a column per category, non-zero if the
+        # word belongs to it
+        body = get_s3().get_object(Bucket=os.environ["S3_BUCKET"], Key=key)["Body"]
+        for row in csv.DictReader(codecs.iterdecode(body.iter_lines(), "utf-8")):
+            categories = tuple(
+                c for c in CATEGORIES if row.get(c.capitalize(), "0") not in ("", "0")
+            )
+            if categories:
+                lexicon[row["Word"].lower()] = categories
+    else:
+        for category, words in zip(
+            CATEGORIES, (POSITIVE_WORDS, NEGATIVE_WORDS, UNCERTAINTY_WORDS)
+        ):
+            for word in words:
+                lexicon[word] = lexicon.get(word, ()) + (category,)
+    return lexicon
+
+
+def new_tally():
+    return {"words": 0, **{category: 0 for category in CATEGORIES}}
+
+
+def tally_words(text, tally, lexicon):
+    # Non-ASCII characters become "?" and then a space; the lexicon is ASCII
+    words = text.encode("ascii", "replace").translate(_LETTERS).split()
+    tally["words"] += len(words)
+    # Counter counts in C; only distinct words are looked up
+    for word, count in Counter(words).items():
+        for category in lexicon.get(word.decode(), ()):
+            tally[category] += count
+
+
+def count_text(pieces, lexicon=None):
+    """Word and lexicon counts for a document streamed in as text `pieces`.
+
+    Returns (document_tally, {section: tally}). Text before the first
+    "Item N." heading counts toward section "0". Each piece is cut after its
+    last whole word, so memory stays bounded by the piece size.
+    """
+    lexicon = lexicon or load_lexicon()
+    sections = {}
+    section = "0"
+
+    def tally(text):
+        nonlocal section
+        position = 0
+        for match in _SECTION.finditer(text):
+            tally_words(
+                text[position : match.start()],
+                sections.setdefault(section, new_tally()),
+                lexicon,
+            )
+            section = match.group(1).upper()
+            position = match.end()
+        tally_words(text[position:], sections.setdefault(section, new_tally()), lexicon)
+
+    carry = ""
+    for piece in pieces:
+        text = carry + piece
+        cut = text.rfind(" ", 0, max(0, len(text) - 16))
+        if cut == -1:
+            carry = text
+            continue
+        # Keep a heading that straddles the cut in one piece
+        start = _SECTION_START.search(text, max(0, cut - 8), cut)
+        if start:
+            cut = start.start()
+        tally(text[:cut])
+        carry = text[cut:]
+    tally(carry)
+
+    # Each word is counted once, in its section; the document is their sum
+    document = new_tally()
+    for counts in sections.values():
+        for name, count in counts.items():
+            document[name] += count
+    return document, sections
 
-def save_sentiment_to_db(message, sentiment_response):
-    try:
-        conn = psycopg2.connect(
-            host=os.environ["DB_HOST"],
-            database=os.environ["DB_NAME"],
-            user=os.environ["DB_USER"],
-            password=os.environ["DB_PASSWORD"],
-        )
-        cur = conn.cursor()
-
-        cik = message["cik"]
-        accession_number = message["accession_number"]
-
-        # Update company_filings
-        cur.execute(
-            """
-            UPDATE company_filings
-            SET sentiment = %s
-            WHERE cik = %s AND accession_number = %s
-            RETURNING id
-            """,
-            (sentiment_response["Sentiment"], cik, accession_number),
-        )
-
-        conn.commit()
-        cur.close()
-        conn.close()
 
+def sentiment_scores(tally):
+    """Positive/Negative/Neutral/Mixed scores summing to 1.
+
+    The non-neutral share grows with the density of positive and negative
+    words, reaching 1 at FULL_STRENGTH_DENSITY. Of that share, the mixed part
+    is the squared ratio of the smaller side to the larger one.
+    """
+    positive, negative = tally["positive"], tally["negative"]
+    polar = positive + negative
+    if not polar:
+        return {"Positive": 0.0, "Negative": 0.0, "Neutral": 1.0, "Mixed": 0.0}
+
+    strength = min(1.0, polar / tally["words"] / FULL_STRENGTH_DENSITY)
+    mixed = (min(positive, negative) / max(positive, negative)) ** 2
+    return {
+        "Positive": round(strength * (1 - mixed) * positive / polar, 4),
+        "Negative": round(strength * (1 - mixed) * negative / polar, 4),
+        "Neutral": round(1 - strength, 4),
+        "Mixed": round(strength * mixed, 4),
+    }
+
+
+def describe(tally):
+    scores = sentiment_scores(tally)
+    polar = tally["positive"] + tally["negative"]
+    return {
+        "Sentiment": max(scores, key=scores.get).upper(),
+        "SentimentScore": scores,
+        # Net tone from -1 (all negative) to 1 (all positive)
+        "Tone": round((tally["positive"] - tally["negative"]) / polar, 4)
+        if polar
+        else 0.0,
+        "Counts": tally,
+    }
+
+
+def decode(blocks):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for block in blocks:
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+
+def analyze_sentiment(message):
+    """Lexicon sentiment for the filing text the message points to in S3."""
+    # Scoring consumes the body as it downloads, so one span covers both
+    with telemetry.span("s3.read_score") as span:
+        response = get_s3().get_object(Bucket=message["bucket"], Key=message["key"])
+        document, sections = count_text(decode(response["Body"].iter_chunks(READ_SIZE)))
+        span.add(bytes=response.get("ContentLength", 0), words=document["words"])
+    return {
+        **describe(document),
+        "Sections": {
+            section: describe(tally)
+            for section, tally in sections.items()
+            if tally["words"]
+        },
+    }
+
+
+def save_sentiments_to_db(results, items=()):
+    """Write every result of the batch with one UPDATE.
+
+    `results` is a list of (cik, accession_number, sentiment_response);
+    `items` are the (batch_id, cik, accession_number) batch items they
+    complete, finished in the same transaction. Returns the number of
+    company_filings rows updated and the batch ids that moved.
+    """
+    try:
+        with db.transaction() as cur:
+            updated = execute_values(
+                cur,
+                """
+                UPDATE company_filings f
+                SET sentiment = v.sentiment,
+                    sentiment_scores = v.scores::jsonb,
+                    sentiment_status = 'done'
+                FROM (VALUES %s) AS v (cik, accession_number, sentiment, scores)
+                WHERE f.cik = v.cik AND f.accession_number = v.accession_number
+                RETURNING f.id
+                """,
+                [
+                    (
+                        cik,
+                        accession_number,
+                        sentiment_response["Sentiment"],
+                        json.dumps(sentiment_response),
+                    )
+                    for cik, accession_number, sentiment_response in results
+                ],
+                page_size=len(results),
+                fetch=True,
+            )
+            batch_ids = batches.finish_items(cur, list(items))
+        return len(updated), batch_ids
     except psycopg2.Error as e:
         raise Exception(f"DatabaseConnectionError: {str(e)}")
 
 
-def lambda_handler(event, context):
-    try:
-        if 'Records' not in event or not event['Records']:
-            logger.info("No messages in the event")
-            return {
-                "statusCode": 204,
-                "body": json.dumps({"message": "No messages in event"}),
-            }
-
-        for record in event['Records']:
-            message = record['body']
-            logger.info(f"Received message: {message}")
-            message_body = json.loads(message)
-            
-            # Mock sentiment analysis (keep your existing mock logic)
-            sentiments = ["POSITIVE", "NEUTRAL", "NEGATIVE"]
-            mock_sentiment = random.choice(sentiments)
-
-            sentiment_response = {
-                "Sentiment": mock_sentiment,
-                "SentimentScore": {
-                    "Positive": round(random.uniform(0, 1), 4),
-                    "Neutral": round(random.uniform(0, 1), 4),
-                    "Negative": round(random.uniform(0, 1), 4),
-                    "Mixed": round(random.uniform(0, 0.1), 4),
-                },
-            }
-            logger.info(f"Generated mock sentiment: {json.dumps(sentiment_response)}")
-
-            save_sentiment_to_db(message_body, sentiment_response)
-            logger.info("Successfully saved sentiment to database")
-
-        return {"statusCode": 200, "body": json.dumps({"message": "Processed successfully"})}
+def batch_item(record, message):
+    """(batch_id, cik, accession_number) for a message, or None if it has no batch."""
+    batch_id = message.get("batch_id") or (
+        record.get("messageAttributes", {}).get("batch_id", {}).get("stringValue")
+    )
+    if not batch_id:
+        return None
+    return (batch_id, message["cik"], message["accession_number"])
+
 
+def notify_batches(batch_ids):
+    """Resume the workflow of any batch this invocation finished."""
+    try:
+        with db.transaction() as cur:
+            for notified in batches.notify_finished(cur, get_sfn(), batch_ids):
+                logger.info(f"Batch complete: {json.dumps(notified)}")
     except Exception as e:
-        logger.error(f"Error in lambda_handler: {str(e)}")
-        raise Exception(f"InternalServerError: {str(e)}")
\ No newline at end of file
+        # The claim rolled back; the next item or filings-queue retries it
+        logger.error(f"Error completing batches {batch_ids}: {str(e)}")
+
+
+@telemetry.instrument
+def lambda_handler(event, context):
+    """Score a batch of SQS records.
+
+    Records that fail are returned in `batchItemFailures` (the event source
+    mapping reports batch item failures), so SQS retries only those.
+    """
+    started = time.perf_counter()
+    records = event.get("Records") or []
+    if not records:
+        logger.info("No messages in the event")
+        return {"batchItemFailures": []}
+
+    failures = []
+    results = []
+    message_ids = []
+    items = {}
+    for record in records:
+        try:
+            message = json.loads(record["body"])
+            items[record["messageId"]] = batch_item(record, message)
+            results.append(
+                (
+                    message["cik"],
+                    message["accession_number"],
+                    analyze_sentiment(message),
+                )
+            )
+            message_ids.append(record["messageId"])
+        except Exception as e:
+            logger.error(f"Error scoring message {record['messageId']}: {str(e)}")
+            failures.append(record["messageId"])
+
+    updated = 0
+    batch_ids = []
+    if results:
+        try:
+            updated, batch_ids = save_sentiments_to_db(
+                results, [items[id] for id in message_ids if items.get(id)]
+            )
+        except Exception as e:
+            # Nothing in the batch was written; let SQS retry all of it
+            logger.error(f"Error saving sentiment batch: {str(e)}")
+            failures.extend(message_ids)
+
+    # Messages on their last receive go to the dead-letter queue; count them
+    # as failed so their batch can still finish
+    final = [
+        items[record["messageId"]]
+        for record in records
+        if record["messageId"] in failures
+        and items.get(record["messageId"])
+        and int(record.get("attributes", {}).get("ApproximateReceiveCount", 1))
+        >= MAX_RECEIVES
+    ]
+    if final:
+        try:
+            with db.transaction() as cur:
+                batch_ids += batches.finish_items(cur, final, batches.FAILED)
+                workqueue.finish(
+                    cur,
+                    "sentiment",
+                    [(cik, accession_number) for _, cik, accession_number in final],
+                    workqueue.FAILED,
+                )
+        except Exception as e:
+            logger.error(f"Error recording failed batch items: {str(e)}")
+
+    if batch_ids:
+        notify_batches(sorted(set(batch_ids)))
+
+    logger.info(
+        f"Sentiment batch: {len(records)} records, {len(results)} scored, "
+        f"{updated} rows updated, {len(failures)} failed "
+        f"in {time.perf_counter() - started:.3f}s"
+    )
+    logger.info(f"DB connection stats: {db.metrics()}")
+    return {"batchItemFailures": [{"itemIdentifier": id} for id in failures]}
@@ -0,0 +1,85 @@
+import boto3
+import json
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from common import backfill, shards, telemetry
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+UNIVERSE_KEY = os.environ.get("UNIVERSE_KEY", "universe/default.txt")
+SHARD_SIZE = int(os.environ.get("SHARD_SIZE", "50"))
+# "per-cik": each shard fetches its companies' submissions from EDGAR;
+# "bulk": company-bulk loads them all from the nightly archive first
+INGEST_MODES = ("per-cik", "bulk")
+UPLOAD_WORKERS = 8
+
+
+@telemetry.instrument
+def lambda_handler(event, context):
+    """Split the CIK universe into shards for the workflow's Map state.
+
+    The event carries the execution's `run_id` and its `input`, which may
+    override `universe_key`, `shard_size` and `mode`, set `force` for
+    every shard, and set `backfill` to load the companies' filing history
+    first (true, or the options of common.backfill.options).
+    """
+    try:
+        options = event.get("input") or {}
+        run_id = event.get("run_id")
+        universe_key = options.get("universe_key", UNIVERSE_KEY)
+        shard_size = int(options.get("shard_size", SHARD_SIZE))
+        mode = options.get("mode", INGEST_MODES[0])
+        if not run_id:
+            raise ValueError("run_id is required")
+        if mode not in INGEST_MODES:
+            raise ValueError(f"mode must be one of {INGEST_MODES}, got {mode!r}")
+        backfill_options = backfill.options(options.get("backfill"))
+
+        s3 = boto3.client("s3")
+        bucket = os.environ["S3_BUCKET"]
+
+        ciks = shards.read_universe(s3, bucket, universe_key)
+        if not ciks:
+            raise ValueError(f"No CIK values in s3://{bucket}/{universe_key}")
+        planned = shards.plan(run_id, ciks, shard_size)
+
+        def upload(shard):
+            descriptor, shard_ciks = shard
+            body = json.dumps(shard_ciks).encode()
+            with telemetry.span("s3.put", bytes=len(body)):
+                s3.put_object(
+                    Bucket=bucket,
+                    Key=descriptor["key"],
+                    Body=body,
+                    ContentType="application/json",
+                )
+
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            list(executor.map(upload, planned))
+
+        descriptors = [descriptor for descriptor, _ in planned]
+        if options.get("force"):
+            for descriptor in descriptors:
+                descriptor["force"] = True
+        telemetry.record("shards", companies=len(ciks), shards=len(descriptors))
+        logger.info(
+            f"Run {run_id}: {len(ciks)} companies from {universe_key} "
+            f"in {len(descriptors)} shards of up to {shard_size}"
+        )
+
+        return {
+            "run_id": run_id,
+            "universe_key": universe_key,
+            "companies": len(ciks),
+            "shard_size": shard_size,
+            "mode": mode,
+            "backfill": backfill_options,
+            "shards": descriptors,
+        }
+    except ValueError as e:
+        raise Exception(f"BadRequest: {str(e)}")
+    except Exception as e:
+        raise Exception(f"InternalServerError: {str(e)}")
@@ -0,0 +1,57 @@
+import boto3
+import os
+import logging
+
+from common import shards, telemetry
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+@telemetry.instrument
+def lambda_handler(event, context):
+    """Store a finished shard's stats for final-report and return its summary.
+
+    The event carries the shard descriptor, the company stage results,
+    filings-ingest's `filings` output (without its file names) and the
+    parallel branches' `results`. Only the batch id and counts go back to
+    the Map state, so its combined output stays small however many shards
+    the run has.
+    """
+    try:
+        shard = event["shard"]
+        filings = event["filings"]
+        embeddings, sentiment = event["results"]
+        failed_files = filings.get("failed_files") or []
+
+        shards.write_stats(
+            boto3.client("s3"),
+            os.environ["S3_BUCKET"],
+            shard["run_id"],
+            shard["shard"],
+            {
+                "shard": shard["shard"],
+                "batch_id": filings["batch_id"],
+                "file_count": filings["file_count"],
+                "failed_files": failed_files,
+                "stages": {
+                    "companies": event.get("company"),
+                    "filings_ingest": filings.get("stats"),
+                    "embeddings": embeddings.get("stats"),
+                    "sentiment": sentiment,
+                },
+            },
+        )
+        logger.info(
+            f"Shard {shard['shard']}: batch {filings['batch_id']}, "
+            f"{filings['file_count']} files, {len(failed_files)} failed"
+        )
+        return {
+            "shard": shard["shard"],
+            "batch_id": filings["batch_id"],
+            "file_count": filings["file_count"],
+            "failed_files": len(failed_files),
+        }
+    except Exception as e:
+        logger.error(f"Error in lambda_handler: {str(e)}")
+        raise Exception(f"InternalServerError: {str(e)}")
@@ -0,0 +1,60 @@
+"""Helpers shared by the tests.
+
+Handlers live in hyphenated directories, so they are loaded by path, as in
+benchmarks/_support.py. Database tests run in a scratch `tests` schema built
+from POSTGRES.md on the Postgres pointed to by TEST_DATABASE_URL (or the
+usual DB_* variables), and are skipped when neither is set.
+"""
+
+import importlib.util
+import os
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+
+def load_handler(function_name):
+    module_name = f"{function_name.replace('-', '_')}_handler"
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    path = SRC / function_name / "handler.py"
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def connect(schema="tests"):
+    """Connection to a freshly built scratch schema, or skip the test."""
+    psycopg2 = pytest.importorskip("psycopg2")
+    if "TEST_DATABASE_URL" in os.environ:
+        conn = psycopg2.connect(os.environ["TEST_DATABASE_URL"])
+    elif "DB_HOST" in os.environ:
+        conn = psycopg2.connect(
+            host=os.environ["DB_HOST"],
+            database=os.environ["DB_NAME"],
+            user=os.environ["DB_USER"],
+            password=os.environ["DB_PASSWORD"],
+        )
+    else:
+        pytest.skip("needs Postgres: set TEST_DATABASE_URL or DB_HOST")
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"SET search_path TO {schema}, public")
+        for block in re.findall(
+            r"```\n(.*?)```", (ROOT / "POSTGRES.md").read_text(), re.S
+        ):
+            cur.execute(block)
+    conn.commit()
+    return conn
@@ -0,0 +1,27 @@
+from tests._support import load_handler
+
+embeddings = load_handler("embeddings")
+filings_ingest = load_handler("filings-ingest")
+
+
+def test_extractor_paragraphs_end_segments():
+    text = filings_ingest.extract_text(
+        [b"<p>Item 1. Business</p><div>We sell. More here</div><p>Next</p>"]
+    )
+    segments = list(embeddings._segments([text]))
+    assert segments == [
+        "Item 1. ",
+        "Business\n\n",
+        "We sell. ",
+        "More here\n\n",
+        "Next",
+    ]
+    ends = [bool(embeddings._PARAGRAPH_END.search(s)) for s in segments]
+    assert ends == [False, True, False, True, False]
+
+
+def test_segments_do_not_depend_on_pieces():
+    text = "One. Two!\n\nThree? Four\n\nfive"
+    whole = list(embeddings._segments([text]))
+    for split in range(1, len(text)):
+        assert list(embeddings._segments([text[:split], text[split:]])) == whole
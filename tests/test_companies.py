@@ -0,0 +1,168 @@
+import os
+
+import psycopg2
+import pytest
+
+import tests._support  # noqa: F401  puts src on sys.path
+from common import companies, db
+from tests._support import connect
+
+
+def company(cik, name="Acme Corp", filings=(), filing_date="2024-02-01"):
+    facts = {
+        "cik": cik,
+        "sic": "3571",
+        "sic_description": "Electronic Computers",
+        "owner_org": "06 Technology",
+        "name": name,
+        "tickers": ["ACME"],
+        "exchanges": ["Nasdaq"],
+        "ein": "942404110",
+        "description": "",
+        "website": "",
+        "category": "Large accelerated filer",
+        "state_of_incorporation": "CA",
+    }
+    rows = [
+        {
+            "form": "10-K",
+            "filing_date": filing_date,
+            "accession_number": accession_number,
+            "primary_doc": primary_doc,
+        }
+        for accession_number, primary_doc in filings
+    ]
+    return cik, facts, rows
+
+
+class RecordingCursor:
+    """Cursor double that records statements and fails the ones it is told to."""
+
+    def __init__(self, failing=()):
+        self.statements = []
+        self.failing = set(failing)
+
+    def execute(self, query, vars=None):
+        self.statements.append(query)
+        if query in self.failing:
+            raise psycopg2.DataError(f"bad row in {query}")
+
+
+def test_isolated_saves_roll_back_only_failing_companies(monkeypatch):
+    def save_companies(cur, batch):
+        assert len(batch) == 1
+        cur.execute(f"save {batch[0][0]}")
+
+    monkeypatch.setattr(companies, "save_companies", save_companies)
+    cur = RecordingCursor(failing={"save 2"})
+    failed = companies.save_companies_isolated(cur, [company(c) for c in "123"])
+
+    assert failed == {"2": "bad row in save 2"}
+    assert cur.statements == [
+        "SAVEPOINT company",
+        "save 1",
+        "RELEASE SAVEPOINT company",
+        "SAVEPOINT company",
+        "save 2",
+        "ROLLBACK TO SAVEPOINT company",
+        "SAVEPOINT company",
+        "save 3",
+        "RELEASE SAVEPOINT company",
+    ]
+
+
+def test_non_database_errors_are_not_isolated(monkeypatch):
+    def save_companies(cur, batch):
+        raise KeyError("name")
+
+    monkeypatch.setattr(companies, "save_companies", save_companies)
+    cur = RecordingCursor()
+    with pytest.raises(KeyError):
+        companies.save_companies_isolated(cur, [company("1")])
+    assert cur.statements == ["SAVEPOINT company", "ROLLBACK TO SAVEPOINT company"]
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = connect()
+    # store() goes through common.db, which connects with the DB_* variables
+    monkeypatch.setenv("PGOPTIONS", "-c search_path=tests,public")
+    db.close()
+    yield conn
+    db.close()
+    conn.close()
+
+
+@pytest.fixture
+def store_conn(conn):
+    # store() connects through common.db, which only reads the DB_* variables
+    if "DB_HOST" not in os.environ:
+        pytest.skip("needs Postgres: set DB_HOST")
+    return conn
+
+
+def rows(conn, query):
+    with conn.cursor() as cur:
+        cur.execute(query)
+        return cur.fetchall()
+
+
+def test_bulk_merge(conn):
+    with conn.cursor() as cur:
+        saved = companies.save_companies(
+            cur,
+            [
+                company("1", filings=[("0001-24-1", "a.htm"), ("0001-24-2", "b.htm")]),
+                company("2", filings=[("0002-24-1", "c.htm")]),
+                # A company listed twice in one batch is merged once
+                company("2", filings=[("0002-24-1", "c.htm")]),
+            ],
+        )
+        conn.commit()
+        assert saved == (3, 4)
+
+        companies.save_companies(
+            cur,
+            [
+                company("1", name="Acme Inc", filings=[("0001-24-2", "b2.htm")]),
+                company("3", filings=[]),
+            ],
+        )
+        conn.commit()
+
+    assert rows(conn, "SELECT cik, entity_name FROM company_facts ORDER BY cik") == [
+        ("1", "Acme Inc"),
+        ("2", "Acme Corp"),
+        ("3", "Acme Corp"),
+    ]
+    assert rows(
+        conn,
+        """
+        SELECT cik, accession_number, archive_url
+        FROM company_filings ORDER BY cik, accession_number
+        """,
+    ) == [
+        ("1", "0001-24-1", "https://www.sec.gov/Archives/edgar/data/1/0001241/a.htm"),
+        ("1", "0001-24-2", "https://www.sec.gov/Archives/edgar/data/1/0001242/b2.htm"),
+        ("2", "0002-24-1", "https://www.sec.gov/Archives/edgar/data/2/0002241/c.htm"),
+    ]
+
+
+def test_store_keeps_good_companies_when_batch_fails(store_conn):
+    failed = companies.store(
+        [
+            company("1", filings=[("0001-24-1", "a.htm")]),
+            company("2", filings=[("0002-24-1", "b.htm")], filing_date="not a date"),
+            company("3", filings=[("0003-24-1", "c.htm")]),
+        ]
+    )
+    assert list(failed) == ["2"]
+    assert "not a date" in failed["2"]
+    facts = rows(store_conn, "SELECT cik FROM company_facts ORDER BY cik")
+    filings = rows(store_conn, "SELECT cik FROM company_filings ORDER BY cik")
+    assert facts == filings == [("1",), ("3",)]
+
+
+def test_store_merges_in_one_batch(store_conn):
+    assert companies.store([company(str(n)) for n in range(1, 6)]) == {}
+    assert rows(store_conn, "SELECT count(*) FROM company_facts") == [(5,)]
@@ -0,0 +1,171 @@
+import asyncio
+import base64
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from tests._support import load_handler
+
+embeddings = load_handler("embeddings")
+
+
+def limiter(start=4, minimum=1, maximum=8):
+    return embeddings.AdaptiveConcurrency(start, minimum, maximum, latency_target=10)
+
+
+async def finish(limits, throttled=False, latency=0.0):
+    started = await limits.acquire()
+    await limits.release(started - latency, throttled=throttled)
+
+
+def test_grows_by_one_per_round():
+    async def main():
+        limits = limiter(start=4)
+        for _ in range(4):
+            await finish(limits)
+        return limits
+
+    limits = asyncio.run(main())
+    assert 4.9 < limits.limit < 5
+    assert limits.stats["increases"] == 4
+
+
+def test_stops_at_maximum():
+    async def main():
+        limits = limiter(start=4, maximum=6)
+        for _ in range(100):
+            await finish(limits)
+        return limits
+
+    assert asyncio.run(main()).limit == 6
+
+
+@pytest.mark.parametrize(
+    "throttled, latency, limit", [(True, 0.0, 4), (False, 60.0, 6)]
+)
+def test_throttling_halves_and_slow_requests_cut_a_quarter(throttled, latency, limit):
+    async def main():
+        limits = limiter(start=8)
+        await finish(limits, throttled=throttled, latency=latency)
+        return limits
+
+    limits = asyncio.run(main())
+    assert limits.limit == limit
+    assert limits.stats["decreases"] == 1
+
+
+def test_burst_of_429s_cuts_once():
+    async def main():
+        limits = limiter(start=8)
+        started = [await limits.acquire() for _ in range(8)]
+        for request_started in started:
+            await limits.release(request_started, throttled=True)
+        # A request started after the cut can cut again
+        await finish(limits, throttled=True)
+        return limits
+
+    limits = asyncio.run(main())
+    assert limits.limit == 2
+    assert limits.stats["decreases"] == 2
+    assert limits.in_flight == 0
+
+
+def test_never_below_minimum():
+    async def main():
+        limits = limiter(start=4, minimum=2)
+        for _ in range(10):
+            await finish(limits, throttled=True)
+        return limits
+
+    assert asyncio.run(main()).limit == 2
+
+
+def test_waits_for_a_free_slot():
+    async def main():
+        limits = limiter(start=2, maximum=2)
+        running = 0
+        peak = 0
+
+        async def request():
+            nonlocal running, peak
+            started = await limits.acquire()
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            await limits.release(started)
+
+        await asyncio.gather(*(request() for _ in range(6)))
+        return peak, limits
+
+    peak, limits = asyncio.run(main())
+    assert peak == 2
+    assert limits.stats["peak"] == 2
+
+
+def test_token_budget_spends_then_waits():
+    async def main():
+        # 100 tokens a second
+        budget = embeddings.TokenBudget(6000)
+        first = await budget.acquire(6000)
+        started = time.monotonic()
+        second = await budget.acquire(10)
+        return first, second, time.monotonic() - started
+
+    first, second, elapsed = asyncio.run(main())
+    assert first == 0
+    assert 0.09 < second < 0.2
+    assert elapsed >= 0.09
+
+
+def test_token_budget_caps_oversized_requests():
+    async def main():
+        budget = embeddings.TokenBudget(600)
+        return await budget.acquire(10**6), budget.tokens
+
+    waited, left = asyncio.run(main())
+    assert waited == 0
+    assert left < 1
+
+
+class RateLimitedEmbeddings:
+    """embeddings.create that answers its first call with a 429."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        self.sent = []
+
+    async def create(self, input, model, encoding_format):
+        self.sent.append(time.monotonic())
+        await asyncio.sleep(0.05)
+        if len(self.sent) == 1:
+            request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+            response = httpx.Response(
+                429, headers={"retry-after": str(self.retry_after)}, request=request
+            )
+            raise openai.RateLimitError("rate limited", response=response, body=None)
+        return SimpleNamespace(
+            data=[
+                SimpleNamespace(index=i, embedding=base64.b64encode(b"\0" * 4))
+                for i in range(len(input))
+            ],
+            usage=SimpleNamespace(total_tokens=len(input)),
+        )
+
+
+def test_requests_waiting_for_a_slot_honor_retry_after():
+    client = SimpleNamespace(embeddings=RateLimitedEmbeddings(retry_after=0.5))
+    batcher = embeddings.EmbeddingBatcher(
+        client, max_inputs=1, concurrency=1, max_concurrency=1
+    )
+    result = batcher.embed([(n, f"text {n}", 1) for n in range(4)])
+
+    assert sorted(result) == [0, 1, 2, 3]
+    throttled_at = client.embeddings.sent[0] + 0.05
+    # Every send after the 429 waits out its pause, including the requests
+    # that were already queued for the slot
+    assert all(sent >= throttled_at + 0.5 for sent in client.embeddings.sent[1:])
+    assert batcher.stats["rate_limited"] == 1
@@ -0,0 +1,137 @@
+import io
+
+import pytest
+
+from tests._support import load_handler
+
+sentiment = load_handler("sentiment")
+
+LEXICON = {
+    "gain": ("positive",),
+    "strong": ("positive",),
+    "loss": ("negative",),
+    "volatile": ("negative", "uncertainty"),
+    "may": ("uncertainty",),
+}
+TEXT = (
+    "Cover page with a strong gain.\n\n"
+    "Item 1A. Risk Factors\n\nResults may be volatile; a loss may follow.\n\n"
+    "ITEM 7. Management's Discussion\n\nGain, gain and a strong year. "
+    "See Item 7 for details."
+)
+
+
+def tally(words, positive=0, negative=0, uncertainty=0):
+    return {
+        "words": words,
+        "positive": positive,
+        "negative": negative,
+        "uncertainty": uncertainty,
+    }
+
+
+def test_counts_by_section():
+    document, sections = sentiment.count_text([TEXT], LEXICON)
+    assert sections == {
+        "0": tally(6, positive=2),
+        "1A": tally(10, negative=2, uncertainty=3),
+        "7": tally(13, positive=3),
+    }
+    assert document == tally(29, positive=5, negative=2, uncertainty=3)
+
+
+@pytest.mark.parametrize("size", [1, 5, 17, 64])
+def test_counts_do_not_depend_on_pieces(size):
+    pieces = [TEXT[i : i + size] for i in range(0, len(TEXT), size)]
+    assert sentiment.count_text(pieces, LEXICON) == sentiment.count_text(
+        [TEXT], LEXICON
+    )
+
+
+def test_counts_at_every_split_point():
+    expected = sentiment.count_text([TEXT], LEXICON)
+    for split in range(1, len(TEXT)):
+        pieces = [TEXT[:split], TEXT[split:]]
+        assert sentiment.count_text(pieces, LEXICON) == expected, split
+
+
+def test_non_ascii_separates_words():
+    # "café" counts as "caf", "naïve" as "na" and "ve"
+    document, _ = sentiment.count_text(["café gain—loss naïve"], LEXICON)
+    assert document == tally(5, positive=1, negative=1)
+
+
+@pytest.mark.parametrize(
+    "counts, label, scores, tone",
+    [
+        (tally(100), "NEUTRAL", (0.0, 0.0, 1.0, 0.0), 0.0),
+        (tally(100, positive=3), "POSITIVE", (1.0, 0.0, 0.0, 0.0), 1.0),
+        (tally(100, positive=1), "NEUTRAL", (0.3333, 0.0, 0.6667, 0.0), 1.0),
+        (tally(200, positive=3, negative=3), "MIXED", (0.0, 0.0, 0.0, 1.0), 0.0),
+        (tally(50, positive=2, negative=1), "POSITIVE", (0.5, 0.25, 0.0, 0.25), 0.3333),
+        (tally(100, negative=6), "NEGATIVE", (0.0, 1.0, 0.0, 0.0), -1.0),
+    ],
+)
+def test_describe(counts, label, scores, tone):
+    description = sentiment.describe(counts)
+    assert description["Sentiment"] == label
+    assert description["SentimentScore"] == dict(
+        zip(("Positive", "Negative", "Neutral", "Mixed"), scores)
+    )
+    assert description["Tone"] == tone
+    assert description["Counts"] is counts
+
+
+def test_scores_sum_to_one():
+    for positive in range(0, 12, 3):
+        for negative in range(0, 12, 2):
+            scores = sentiment.sentiment_scores(tally(300, positive, negative))
+            assert sum(scores.values()) == pytest.approx(1, abs=1e-3)
+
+
+@pytest.fixture
+def fresh_lexicon():
+    sentiment.load_lexicon.cache_clear()
+    yield
+    sentiment.load_lexicon.cache_clear()
+
+
+def test_built_in_lexicon(monkeypatch, fresh_lexicon):
+    monkeypatch.delenv("LEXICON_KEY", raising=False)
+    lexicon = sentiment.load_lexicon()
+    assert lexicon["excellent"] == ("positive",)
+    assert lexicon["losses"] == ("negative",)
+    assert lexicon["uncertain"] == ("uncertainty",)
+    document, _ = sentiment.count_text(["Excellent results despite losses."])
+    assert document == tally(4, positive=1, negative=1)
+
+
+class FakeS3:
+    def __init__(self, body):
+        self.body = body
+
+    def get_object(self, Bucket, Key):
+        return {"Body": self}
+
+    def iter_lines(self):
+        return io.BytesIO(self.body.encode("utf-8"))
+
+
+def test_lexicon_from_master_dictionary(monkeypatch, fresh_lexicon):
+    monkeypatch.setenv("LEXICON_KEY", "lexicon/lm.csv")
+    monkeypatch.setenv("S3_BUCKET", "filings")
+    csv = (
+        "Word,Negative,Positive,Uncertainty,Litigious\n"
+        "ABLE,0,2009,0,0\n"
+        "ABANDON,2009,0,0,0\n"
+        "ABEYANCE,0,0,2009,2009\n"
+        "ACCORD,0,0,0,2009\n"
+        "VOLATILE,2009,0,2009,0\n"
+    )
+    monkeypatch.setattr(sentiment, "get_s3", lambda: FakeS3(csv))
+    assert sentiment.load_lexicon() == {
+        "able": ("positive",),
+        "abandon": ("negative",),
+        "abeyance": ("uncertainty",),
+        "volatile": ("negative", "uncertainty"),
+    }
@@ -0,0 +1,76 @@
+import io
+
+import pytest
+
+from tests._support import load_handler
+
+shard_report = load_handler("shard-report")
+from common import shards  # noqa: E402
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    s3 = FakeS3()
+    monkeypatch.setenv("S3_BUCKET", "bucket")
+    monkeypatch.setattr(shard_report.boto3, "client", lambda service: s3)
+    return s3
+
+
+def event(failed_files):
+    return {
+        "shard": {"run_id": "run", "shard": 3, "key": "shards/run/00003.json"},
+        "company": {"ingest": {"cik_list": ["1"]}},
+        "filings": {
+            "batch_id": "batch-3",
+            "file_count": 2,
+            "failed_files": failed_files,
+            "stats": {"fetched": 3},
+        },
+        "results": [{"stats": {"embedded": 2}}, {"done": 2}],
+    }
+
+
+def test_stats_go_to_s3_and_only_counts_come_back(s3):
+    failed = [{"cik": "1", "accession_number": "a", "error": "timeout"}]
+
+    result = shard_report.lambda_handler(event(failed), None)
+
+    assert result == {
+        "shard": 3,
+        "batch_id": "batch-3",
+        "file_count": 2,
+        "failed_files": 1,
+    }
+    assert list(s3.objects) == ["shards/run/00003.stats.json"]
+    assert shards.read_stats(s3, "bucket", "run", 3) == {
+        "shard": 3,
+        "batch_id": "batch-3",
+        "file_count": 2,
+        "failed_files": failed,
+        "stages": {
+            "companies": {"ingest": {"cik_list": ["1"]}},
+            "filings_ingest": {"fetched": 3},
+            "embeddings": {"embedded": 2},
+            "sentiment": {"done": 2},
+        },
+    }
+
+
+def test_missing_results_fail_the_shard(s3):
+    bad = event([])
+    del bad["results"]
+
+    with pytest.raises(Exception, match="InternalServerError"):
+        shard_report.lambda_handler(bad, None)
+    assert s3.objects == {}
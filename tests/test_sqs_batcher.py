@@ -0,0 +1,123 @@
+import pytest
+
+from tests._support import load_handler
+
+filings_ingest = load_handler("filings-ingest")
+
+ATTRIBUTES = {"batch_id": {"DataType": "String", "StringValue": "batch-1"}}
+
+
+class FakeSqs:
+    """send_message_batch that answers each call with the next of `responses`.
+
+    A response is a function of the call's entries returning the failed ones
+    as {"Id", "SenderFault", "Message"} dicts, or raising.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.calls.append([entry["MessageBody"] for entry in Entries])
+        respond = self.responses.pop(0) if self.responses else succeed
+        return {"Failed": respond(Entries)}
+
+
+def succeed(entries):
+    return []
+
+
+def fail(sender_fault=False, bodies=None):
+    def respond(entries):
+        return [
+            {"Id": e["Id"], "SenderFault": sender_fault, "Message": "throttled"}
+            for e in entries
+            if bodies is None or e["MessageBody"] in bodies
+        ]
+
+    return respond
+
+
+def raise_error(entries):
+    raise ConnectionError("connection reset")
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(filings_ingest.time, "sleep", lambda seconds: None)
+
+
+def send(sqs, bodies):
+    batcher = filings_ingest.SqsBatcher(sqs, "queue-url", ATTRIBUTES)
+    for body in bodies:
+        batcher.add(body, key=f"key-{body}")
+    batcher.flush()
+    return batcher
+
+
+def test_batches_of_ten():
+    sqs = FakeSqs()
+    batcher = send(sqs, [str(n) for n in range(25)])
+    assert [len(call) for call in sqs.calls] == [10, 10, 5]
+    assert batcher.failed == []
+    assert batcher.report() == {
+        "messages": 25,
+        "batch_calls": 3,
+        "retried": 0,
+        "failed": 0,
+        "calls_saved": 22,
+    }
+
+
+def test_batches_under_size_limit():
+    sqs = FakeSqs()
+    send(sqs, [str(n) * 100_000 for n in range(5)])
+    assert [len(call) for call in sqs.calls] == [2, 2, 1]
+
+
+def test_retries_only_failed_entries():
+    sqs = FakeSqs(fail(bodies={"1", "4"}))
+    batcher = send(sqs, [str(n) for n in range(6)])
+    assert sqs.calls == [["0", "1", "2", "3", "4", "5"], ["1", "4"]]
+    assert batcher.failed == []
+    assert batcher.stats["retried"] == 2
+
+
+def test_sender_faults_are_not_retried():
+    sqs = FakeSqs(fail(sender_fault=True, bodies={"2"}))
+    batcher = send(sqs, [str(n) for n in range(3)])
+    assert len(sqs.calls) == 1
+    assert batcher.failed == [("key-2", "throttled")]
+    assert batcher.stats["failed"] == 1
+
+
+def test_entries_fail_after_max_attempts():
+    attempts = filings_ingest.SqsBatcher.MAX_ATTEMPTS
+    sqs = FakeSqs(*[fail(bodies={"0"})] * attempts)
+    batcher = send(sqs, ["0", "1"])
+    assert len(sqs.calls) == attempts
+    assert batcher.failed == [("key-0", "throttled")]
+    assert batcher.stats == {
+        "messages": 2,
+        "batch_calls": attempts,
+        "retried": attempts - 1,
+        "failed": 1,
+    }
+
+
+def test_call_that_raises_fails_every_entry():
+    sqs = FakeSqs(raise_error)
+    batcher = send(sqs, [str(n) for n in range(4)])
+    assert sqs.calls == [["0", "1", "2", "3"]] * 2
+    assert batcher.failed == []
+    assert batcher.stats["retried"] == 4
+
+    # Two batches, each raising on every attempt
+    sqs = FakeSqs(*[raise_error] * 2 * filings_ingest.SqsBatcher.MAX_ATTEMPTS)
+    batcher = send(sqs, [str(n) for n in range(12)])
+    assert len(sqs.calls) == 2 * filings_ingest.SqsBatcher.MAX_ATTEMPTS
+    assert sorted(batcher.failed) == sorted(
+        (f"key-{n}", "connection reset") for n in range(12)
+    )
+    assert batcher.stats["failed"] == 12
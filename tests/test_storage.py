@@ -0,0 +1,29 @@
+import pytest
+
+import tests._support  # noqa: F401  puts src on sys.path
+from common import backfill, storage
+
+
+@pytest.mark.parametrize(
+    "form, key",
+    [
+        ("10-K", "filings/320193/10-K_0000320193-24-000123.txt"),
+        ("10-K/A", "filings/320193/10-K%2FA_0000320193-24-000123.txt"),
+        ("8-K12B", "filings/320193/8-K12B_0000320193-24-000123.txt"),
+    ],
+)
+def test_filing_key_round_trip(form, key):
+    assert storage.filing_key("320193", form, "0000320193-24-000123") == key
+    assert storage.filing_of(key) == ("320193", form, "0000320193-24-000123")
+
+
+def test_key_with_raw_slash_in_form():
+    key = "filings/320193/10-Q/A_0000320193-24-000123.txt"
+    assert storage.filing_of(key) == ("320193", "10-Q/A", "0000320193-24-000123")
+
+
+def test_amended_forms_in_backfill():
+    options = backfill.options({"forms": ["10-K", "10-K/A"]})
+    keys = [storage.filing_key("1", form, "acc") for form in options["forms"]]
+    assert [storage.filing_of(key)[1] for key in keys] == ["10-K", "10-K/A"]
+    assert all(key.count("/") == 2 for key in keys)
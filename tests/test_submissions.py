@@ -0,0 +1,95 @@
+import json
+import random
+
+import pytest
+
+import tests._support  # noqa: F401  puts src on sys.path
+from common import submissions
+
+
+def make_document(rows, wanted_at, primary_doc="doc{}.htm"):
+    forms = ["4"] * rows
+    for index, form in zip(wanted_at, ["10-Q", "8-K", "10-K", "10-Q"]):
+        forms[index] = form
+    return {
+        "cik": "320193",
+        "entityType": "operating",
+        "sic": "3571",
+        "sicDescription": "Electronic Computers",
+        "name": "Apple Inc.",
+        "tickers": ["AAPL"],
+        "exchanges": ["Nasdaq"],
+        "ein": "942404110",
+        "description": "",
+        "category": "Large accelerated filer",
+        "stateOfIncorporation": "CA",
+        "addresses": {"business": {"city": "CUPERTINO"}},
+        "filings": {
+            "recent": {
+                "accessionNumber": [f"0000320193-24-{i:06d}" for i in range(rows)],
+                "filingDate": [f"2024-01-{i % 28 + 1:02d}" for i in range(rows)],
+                "items": ["" for _ in range(rows)],
+                "form": forms,
+                "primaryDocument": [primary_doc.format(i) for i in range(rows)],
+            },
+            "files": [],
+        },
+    }
+
+
+def parse_with_json(text):
+    company_data = json.loads(text)
+    return (
+        submissions.get_company_facts(company_data),
+        submissions.get_recent_filings(company_data),
+    )
+
+
+@pytest.mark.parametrize(
+    "rows, wanted_at",
+    [
+        (10, [0, 3]),
+        (10, [9]),
+        (10, []),
+        # Spread over several of the blocks quotes are counted in
+        (20000, [5, 4000, 4001, 19999]),
+    ],
+)
+@pytest.mark.parametrize("indent", [None, 2])
+def test_matches_json_loads(rows, wanted_at, indent):
+    text = json.dumps(make_document(rows, wanted_at), indent=indent)
+    assert submissions.parse_submissions(text) == parse_with_json(text)
+
+
+@pytest.mark.parametrize(
+    "primary_doc", ["a\\b{}.htm", "café-{}.htm", 'q"{}".htm', "d/{}.htm"]
+)
+def test_matches_json_loads_with_escapes(primary_doc):
+    text = json.dumps(make_document(50, [2, 40], primary_doc))
+    assert submissions.parse_submissions(text) == parse_with_json(text)
+
+
+def test_matches_json_loads_on_random_documents():
+    rng = random.Random(7)
+    for _ in range(50):
+        rows = rng.randrange(1, 200)
+        wanted_at = rng.sample(range(rows), min(rows, rng.randrange(4)))
+        text = json.dumps(make_document(rows, wanted_at))
+        assert submissions.parse_submissions(text) == parse_with_json(text)
+
+
+@pytest.mark.parametrize(
+    "filings", [{}, {"recent": {}}, {"recent": {"form": []}}, {"files": []}]
+)
+def test_missing_columns(filings):
+    document = make_document(1, [0])
+    document["filings"] = filings
+    text = json.dumps(document)
+    assert submissions.parse_submissions(text) == parse_with_json(text)
+
+
+def test_document_without_filings():
+    document = make_document(1, [0])
+    del document["filings"]
+    text = json.dumps(document)
+    assert submissions.parse_submissions(text) == parse_with_json(text)
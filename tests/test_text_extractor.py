@@ -0,0 +1,50 @@
+import pytest
+
+from tests._support import load_handler
+
+filings_ingest = load_handler("filings-ingest")
+
+DOCUMENT = (
+    "<html><head><title>10-K</title><style>p { color: red }</style></head>"
+    "<body><ix:header><ix:hidden>dei:Fact 2024</ix:hidden></ix:header>"
+    "<p>Net revenue increased&nbsp;12%</p><!-- <p>draft</p> --><!-- note -->"
+    "<div style='display: none'>hidden <div>nested</div> text</div>"
+    "<script>var x = '<p>not text</p>';</script>"
+    "<table><tr><td>Café &amp; Co</td><td>R&amp;D</td></tr></table>"
+    "<p>Risk<b>factors</b> &#8212; liquidity</p><br/>end"
+    "</body></html>"
+).encode("utf-8")
+
+
+def extract(chunks):
+    return filings_ingest.extract_text(chunks)
+
+
+def test_extracts_content_text_only():
+    assert extract([DOCUMENT]) == (
+        "Net revenue increased 12%\n\nCafé & Co R&D\n\nRiskfactors — liquidity\n\nend"
+    )
+
+
+def test_same_text_at_every_split_point():
+    expected = extract([DOCUMENT])
+    for split in range(1, len(DOCUMENT)):
+        assert extract([DOCUMENT[:split], DOCUMENT[split:]]) == expected, split
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1000])
+def test_same_text_for_any_chunk_size(size):
+    assert extract(filings_ingest.iter_chunks(DOCUMENT, size)) == extract([DOCUMENT])
+
+
+@pytest.mark.parametrize("offset", range(-1, 4))
+def test_comment_end_across_64k_chunks(offset):
+    # The "-->" straddles the default chunk boundary
+    prefix = b"<p>before</p><!--" + b"x" * (65536 - 17 - 3 + offset)
+    document = prefix + b"-->after <p>kept</p>"
+    assert extract(filings_ingest.iter_chunks(document)) == "before\n\nafter\n\nkept"
+
+
+def test_paragraphs_survive_and_other_whitespace_collapses():
+    document = b"<div>\n  Item 1A.\n</div>\n<div>Risk\n\n factors<br>apply</div>\x00x"
+    assert extract([document]) == "Item 1A.\n\nRisk factors apply\n\nx"
@@ -0,0 +1,80 @@
+import pytest
+
+import tests._support  # noqa: F401  puts src on sys.path
+from common import workqueue
+from tests._support import connect
+
+FILING = ("320193", "0000320193-24-000123")
+
+
+@pytest.fixture(scope="module")
+def conn():
+    conn = connect()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def cur(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO company_filings (cik, form, accession_number, archive_url)
+            VALUES (%s, '10-K', %s, 'https://example.com/doc.htm')
+            """,
+            FILING,
+        )
+        yield cur
+    conn.rollback()
+
+
+def claim(cur, stage, owner, **kwargs):
+    return [row[:2] for row in workqueue.claim(cur, stage, owner, 10, 600, **kwargs)]
+
+
+def test_leased_filing_is_claimed_once(cur):
+    assert claim(cur, "ingest", "run-1") == [FILING]
+    assert claim(cur, "ingest", "run-2") == []
+
+
+def test_stored_filing_is_left_to_later_stages(cur):
+    claim(cur, "ingest", "run-1")
+    workqueue.finish(cur, "ingest", [FILING], owner="run-1")
+    # Not fetched again while it is being embedded and scored
+    assert claim(cur, "ingest", "run-2") == []
+    assert claim(cur, "embedding", "worker-1", filings=[FILING]) == [FILING]
+    # The workflow's lease keeps backlog workers off it
+    assert claim(cur, "embedding", "worker-2") == []
+
+
+@pytest.mark.parametrize("stage", ["embedding", "sentiment"])
+def test_failed_later_stage_is_ingested_again(cur, stage):
+    claim(cur, "ingest", "run-1")
+    workqueue.finish(cur, "ingest", [FILING], owner="run-1")
+    workqueue.finish(cur, stage, [FILING], workqueue.FAILED)
+    assert claim(cur, "ingest", "run-2") == [FILING]
+
+
+def test_finished_filing_is_not_claimed(cur):
+    for stage in ("ingest", "embedding", "sentiment"):
+        workqueue.finish(cur, stage, [FILING])
+    assert claim(cur, "ingest", "run-1") == []
+    assert claim(cur, "embedding", "worker-1", filings=[FILING]) == []
+
+
+def test_claim_restricted_to_filings(cur):
+    workqueue.finish(cur, "ingest", [FILING])
+    assert claim(cur, "embedding", "worker-1", filings=[]) == []
+    assert claim(cur, "embedding", "worker-1", filings=[("1", "2")]) == []
+    assert claim(cur, "embedding", "worker-1", filings=[FILING]) == [FILING]
+
+
+def test_attempts_count_failures_only(cur):
+    claim(cur, "ingest", "run-1")
+    workqueue.finish(cur, "ingest", [FILING], owner="run-1")
+    cur.execute("SELECT attempts, lease_owner FROM company_filings")
+    assert cur.fetchone() == (0, None)
+    claim(cur, "embedding", "worker-1")
+    workqueue.finish(cur, "embedding", [FILING], workqueue.FAILED, "worker-1")
+    cur.execute("SELECT attempts, lease_owner FROM company_filings")
+    assert cur.fetchone() == (1, None)
@@ -0,0 +1,122 @@
+import io
+import random
+import zipfile
+
+import pytest
+
+import tests._support  # noqa: F401  puts src on sys.path
+from common import zipstream
+
+rng = random.Random(3)
+CONTENTS = {
+    "empty.json": b"",
+    "small.json": b'{"cik": "320193"}',
+    # Incompressible, so deflated data spans several reads
+    "random.json": rng.randbytes(300_000),
+    "repeated.json": b'{"form": "10-K"}, ' * 50_000,
+}
+
+
+class Unseekable(io.RawIOBase):
+    """Write-only stream without seek, so zipfile adds data descriptors."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+class Trickle:
+    """Raw stream handing out at most `step` bytes per read."""
+
+    def __init__(self, data, step):
+        self.data = io.BytesIO(data)
+        self.step = step
+
+    def read(self, size):
+        return self.data.read(min(size, self.step))
+
+
+def make_zip(compression, seekable=True, **kwargs):
+    out = io.BytesIO() if seekable else Unseekable()
+    with zipfile.ZipFile(out, "w", compression) as archive:
+        for name, content in CONTENTS.items():
+            with archive.open(name, "w", **kwargs) as member:
+                member.write(content)
+    return bytes(out.getvalue() if seekable else out.data)
+
+
+ARCHIVES = {
+    "stored": make_zip(zipfile.ZIP_STORED),
+    "deflated": make_zip(zipfile.ZIP_DEFLATED),
+    "descriptor": make_zip(zipfile.ZIP_DEFLATED, seekable=False),
+    "zip64": make_zip(zipfile.ZIP_DEFLATED, force_zip64=True),
+    "zip64 descriptor": make_zip(
+        zipfile.ZIP_DEFLATED, seekable=False, force_zip64=True
+    ),
+}
+
+
+@pytest.mark.parametrize("kind", ARCHIVES)
+@pytest.mark.parametrize("step", [1 << 20, 4096, 7])
+def test_reads_every_member(kind, step):
+    raw = Trickle(ARCHIVES[kind], step)
+    read = {member.name: member.read() for member in zipstream.members(raw, 1000)}
+    assert read == CONTENTS
+
+
+@pytest.mark.parametrize("kind", ARCHIVES)
+def test_skips_members_not_read(kind):
+    read = {}
+    for member in zipstream.members(io.BytesIO(ARCHIVES[kind])):
+        if member.name in ("small.json", "repeated.json"):
+            read[member.name] = b"".join(member.chunks())
+    assert read == {name: CONTENTS[name] for name in ("small.json", "repeated.json")}
+
+
+def test_descriptor_without_signature():
+    # The descriptor signature is optional; without it the CRC comes first
+    archive = ARCHIVES["descriptor"]
+    assert archive.count(b"PK\x07\x08") == len(CONTENTS)
+    stripped = archive.replace(b"PK\x07\x08", b"")
+    read = {m.name: m.read() for m in zipstream.members(io.BytesIO(stripped))}
+    assert read == CONTENTS
+
+
+def test_member_read_twice():
+    member = next(zipstream.members(io.BytesIO(ARCHIVES["deflated"])))
+    member.read()
+    with pytest.raises(ValueError, match="already read"):
+        member.read()
+
+
+def test_crc_mismatch():
+    archive = bytearray(ARCHIVES["stored"])
+    start = archive.index(CONTENTS["small.json"])
+    archive[start] ^= 0xFF
+    with pytest.raises(ValueError, match="CRC mismatch in ZIP member small.json"):
+        for member in zipstream.members(io.BytesIO(bytes(archive))):
+            member.read()
+
+
+def test_truncated_archive():
+    archive = ARCHIVES["deflated"][:100_000]
+    with pytest.raises(ValueError, match="truncated"):
+        for member in zipstream.members(io.BytesIO(archive)):
+            member.read()
+
+
+def test_stored_member_with_descriptor():
+    archive = make_zip(zipfile.ZIP_STORED, seekable=False)
+    with pytest.raises(ValueError, match="stored without a size"):
+        next(zipstream.members(io.BytesIO(archive)))
+
+
+def test_not_a_zip():
+    with pytest.raises(ValueError, match="Not a ZIP local file header at offset 0"):
+        next(zipstream.members(io.BytesIO(b"<html>not found</html>")))
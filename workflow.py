@@ -0,0 +1,261 @@
+"""The Step Functions workflow, as a plain dict.
+
+Kept out of __main__.py so it can be built without Pulumi: the deployment
+serializes it with the deployed Lambda ARNs, and benchmarks/bench_pipeline.py
+runs it in-process against local stand-ins.
+"""
+
+RETRY = [
+    {
+        "ErrorEquals": ["States.TaskFailed"],
+        "IntervalSeconds": 30,
+        "MaxAttempts": 2,
+        "BackoffRate": 2.0,
+    }
+]
+
+
+def shard_states(arns):
+    """The states one shard runs through inside the Map state.
+
+    Each task's result goes under its own key, so the shard descriptor and
+    earlier results stay available to later states. In bulk mode the
+    companies are already loaded, so the shard starts at FilingsIngest. With
+    `backfill` set, the shard first loads its companies' filing history,
+    invoking Backfill again until it reports the shard complete. The shard
+    ends at ShardReport, which stores its stats under `shards/<run_id>/` for
+    the report. A failure ends only this shard, recorded by ShardFailed.
+    """
+    catch = [
+        {"ErrorEquals": ["States.ALL"], "ResultPath": "$.error", "Next": "ShardFailed"}
+    ]
+    return {
+        "StartAt": "ShardIngestMode",
+        "States": {
+            "ShardIngestMode": {
+                "Type": "Choice",
+                "Choices": [
+                    {
+                        "Variable": "$.mode",
+                        "StringEquals": "bulk",
+                        "Next": "CompaniesLoaded",
+                    }
+                ],
+                "Default": "CompanyIngest",
+            },
+            "CompaniesLoaded": {
+                "Type": "Pass",
+                "Result": {"mode": "bulk"},
+                "ResultPath": "$.company",
+                "Next": "ShardBackfill",
+            },
+            "CompanyIngest": {
+                "Type": "Task",
+                "Resource": arns["company-ingest"],
+                "Parameters": {"shard.$": "$.shard"},
+                "ResultPath": "$.company.ingest",
+                "Next": "CompanyProc",
+                "Retry": RETRY,
+                "Catch": catch,
+            },
+            "CompanyProc": {
+                "Type": "Task",
+                "Resource": arns["company-proc"],
+                # Only the shard's companies whose submissions changed
+                "Parameters": {"cik_list.$": "$.company.ingest.cik_list"},
+                "ResultPath": "$.company.proc",
+                "Next": "ShardBackfill",
+                "Retry": RETRY,
+                "Catch": catch,
+            },
+            "ShardBackfill": {
+                "Type": "Choice",
+                "Choices": [
+                    {"Variable": "$.backfill", "IsNull": False, "Next": "Backfill"}
+                ],
+                "Default": "FilingsIngest",
+            },
+            # Resumes from backfill_progress under the run's id, so each
+            # invocation carries on where the last one ran out of time
+            "Backfill": {
+                "Type": "Task",
+                "Resource": arns["backfill"],
+                "Parameters": {
+                    "shard.$": "$.shard",
+                    "backfill_id.$": "$.shard.run_id",
+                    "options.$": "$.backfill",
+                },
+                "ResultPath": "$.company.backfill",
+                "Next": "BackfillDone",
+                "Retry": RETRY,
+                "Catch": catch,
+            },
+            "BackfillDone": {
+                "Type": "Choice",
+                "Choices": [
+                    {
+                        "Variable": "$.company.backfill.complete",
+                        "BooleanEquals": False,
+                        "Next": "Backfill",
+                    }
+                ],
+                "Default": "FilingsIngest",
+            },
+            "FilingsIngest": {
+                "Type": "Task",
+                "Resource": arns["filings-ingest"],
+                "Parameters": {"shard.$": "$.shard"},
+                "ResultPath": "$.filings",
+                "Next": "ParallelProcessing",
+                "Retry": RETRY,
+                "Catch": catch,
+            },
+            "ParallelProcessing": {
+                "Type": "Parallel",
+                "Branches": [
+                    {
+                        "StartAt": "Embeddings",
+                        "States": {
+                            "Embeddings": {
+                                "Type": "Task",
+                                "Resource": arns["embeddings"],
+                                "Parameters": {"file_names.$": "$.filings.file_names"},
+                                "End": True,
+                                "Retry": RETRY,
+                            }
+                        },
+                    },
+                    {
+                        "StartAt": "FilingsQueue",
+                        "States": {
+                            "FilingsQueue": {
+                                "Type": "Task",
+                                "Resource": "arn:aws:states:::lambda:invoke.waitForTaskToken",
+                                "Parameters": {
+                                    "FunctionName": arns["filings-queue"],
+                                    "Payload": {
+                                        "batch_id.$": "$.filings.batch_id",
+                                        "task_token.$": "$$.Task.Token",
+                                    },
+                                },
+                                # The sentiment Lambda sends task success
+                                # when the batch's last message is scored;
+                                # this only bounds a batch that never does
+                                "TimeoutSeconds": 6 * 3600,
+                                "End": True,
+                                "Retry": RETRY,
+                            }
+                        },
+                    },
+                ],
+                "ResultPath": "$.results",
+                "Next": "ShardReport",
+                "Catch": catch,
+            },
+            # Stage stats and failed files go to S3 beside the shard's CIK
+            # list; only counts come back, so the Map's combined output
+            # does not grow with them
+            "ShardReport": {
+                "Type": "Task",
+                "Resource": arns["shard-report"],
+                "Parameters": {
+                    "shard.$": "$.shard",
+                    "company.$": "$.company",
+                    "filings": {
+                        "batch_id.$": "$.filings.batch_id",
+                        "file_count.$": "$.filings.file_count",
+                        "failed_files.$": "$.filings.failed_files",
+                        "stats.$": "$.filings.stats",
+                    },
+                    "results.$": "$.results",
+                },
+                "End": True,
+                "Retry": RETRY,
+                "Catch": catch,
+            },
+            "ShardFailed": {
+                "Type": "Pass",
+                "Parameters": {"shard.$": "$.shard.shard", "error.$": "$.error"},
+                "End": True,
+            },
+        },
+    }
+
+
+def definition(arns, max_concurrency):
+    """Amazon States Language for the pipeline.
+
+    `arns` maps each Lambda's directory name under src/ to its ARN. The
+    execution input may set `universe_key`, `shard_size`, `mode` ("per-cik"
+    or "bulk"), `force` and `backfill`; at most `max_concurrency` shards run
+    at once.
+    """
+    return {
+        "Comment": "SEC Filings Workflow",
+        "StartAt": "PlanShards",
+        "States": {
+            "PlanShards": {
+                "Type": "Task",
+                "Resource": arns["shard-planner"],
+                "Parameters": {
+                    "input.$": "$",
+                    "run_id.$": "$$.Execution.Name",
+                },
+                "Next": "IngestMode",
+                "Retry": RETRY,
+                "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "ErrorHandler"}],
+            },
+            "IngestMode": {
+                "Type": "Choice",
+                "Choices": [
+                    {
+                        "Variable": "$.mode",
+                        "StringEquals": "bulk",
+                        "Next": "CompanyBulk",
+                    }
+                ],
+                "Default": "ProcessShards",
+            },
+            # One pass over EDGAR's nightly submissions.zip loads the whole
+            # universe before the shards fan out
+            "CompanyBulk": {
+                "Type": "Task",
+                "Resource": arns["company-bulk"],
+                "Parameters": {"universe_key.$": "$.universe_key"},
+                "ResultPath": "$.bulk",
+                "Next": "ProcessShards",
+                "Retry": RETRY,
+                "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "ErrorHandler"}],
+            },
+            "ProcessShards": {
+                "Type": "Map",
+                "ItemsPath": "$.shards",
+                "ItemSelector": {
+                    "shard.$": "$$.Map.Item.Value",
+                    "mode.$": "$.mode",
+                    "backfill.$": "$.backfill",
+                },
+                "MaxConcurrency": max_concurrency,
+                "ItemProcessor": {
+                    "ProcessorConfig": {"Mode": "INLINE"},
+                    **shard_states(arns),
+                },
+                # Replaces the descriptors with each shard's result
+                "ResultPath": "$.shards",
+                "Next": "FinalReport",
+                "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "ErrorHandler"}],
+            },
+            "FinalReport": {
+                "Type": "Task",
+                "Resource": arns["final-report"],
+                "End": True,
+                "Retry": RETRY,
+                "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "ErrorHandler"}],
+            },
+            "ErrorHandler": {
+                "Type": "Task",
+                "Resource": arns["error-handler"],
+                "End": True,
+            },
+        },
+    }